@@ -0,0 +1,154 @@
+"""Benchmark of the requests per second /now and /epochs sustain under the development server 
+    (Flask debug server) and the production server (gunicorn). The tracker is pointed at a 
+    synthetic OEM served from a local HTTP server and uses the offline geocoder, so nothing 
+    leaves the machine. 
+
+    python bench/serving.py --seconds 10 --concurrency 16
+"""
+import argparse
+import functools
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_STATE_VECTORS = 5400  # as many as NASA's 15 day file, 4 minutes apart
+
+sys.path.insert(0, os.path.join(ROOT, 'test'))
+from synthetic_orbit import orbitXML  # noqa: E402
+
+def freePort() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def serveFixture(directory:str) -> ThreadingHTTPServer:
+    """Function serves a directory over HTTP on a background thread. 
+    Args:
+        directory (str): Directory to serve
+    Returns:
+        ThreadingHTTPServer: Running server, its port is server.server_port
+    """
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def startTracker(mode:str, source:str, port:int, workers:int, threads:int) -> subprocess.Popen:
+    """Function starts the tracker in a serving mode and waits until it answers requests. 
+    Args:
+        mode (str): 'development' or 'production'
+        source (str): URL of the OEM
+        port (int): Port to listen on
+        workers (int): Production worker processes
+        threads (int): Request threads per production worker
+    Returns:
+        subprocess.Popen: Tracker process, leader of its own process group
+    """
+    env = dict(os.environ, ISS_SERVER=mode, ISS_PORT=str(port), ISS_DATA_SOURCE=source, ISS_GEOCODER='local', 
+               ISS_WORKERS=str(workers), ISS_THREADS=str(threads))
+    for name in ('ISS_SNAPSHOT_DIR', 'ISS_ARCHIVE_DIR', 'ISS_GEOCODE_CACHE_FILE'):
+        env.pop(name, None)
+    process = subprocess.Popen([sys.executable, 'iss_tracker.py'], cwd=ROOT, env=env, start_new_session=True, 
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/now/time', timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    stopTracker(process)
+    raise RuntimeError(f"The {mode} server did not start")
+
+def stopTracker(process:subprocess.Popen) -> None:
+    # The debug reloader and gunicorn both fork, so the whole process group is stopped
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+def measure(url:str, seconds:float, concurrency:int) -> dict:
+    """Function requests a URL from concurrent clients for a fixed time. 
+    Args:
+        url (str): URL to request
+        seconds (float): Duration of the measurement
+        concurrency (int): Number of clients, each sending one request at a time
+    Returns:
+        dict: Requests per second, request count, error count, and latency percentiles of the successful requests
+    """
+    counts = [[0, 0] for _ in range(concurrency)]
+    latencies = [[] for _ in range(concurrency)]
+    deadline = time.monotonic() + seconds
+
+    def client(count, latency):
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            sent = time.perf_counter()
+            try:
+                ok = session.get(url, timeout=10).status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                latency.append(time.perf_counter() - sent)
+            count[0 if ok else 1] += 1
+
+    started = time.monotonic()
+    clients = [threading.Thread(target=client, args=(count, latency)) for count, latency in zip(counts, latencies)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.monotonic() - started
+    requests_done = sum(count[0] for count in counts)
+    latency = sorted(value for client_latency in latencies for value in client_latency)
+
+    def percentile(fraction):
+        return 1000 * latency[min(len(latency) - 1, int(fraction * len(latency)))] if latency else None
+    return {'requests/s': requests_done / elapsed, 'requests': requests_done, 'errors': sum(count[1] for count in counts), 
+            'p50_ms': percentile(0.5), 'p95_ms': percentile(0.95), 'p99_ms': percentile(0.99)}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--seconds', type=float, default=10.0, help="duration of each measurement")
+    parser.add_argument('--concurrency', type=int, default=16, help="concurrent clients")
+    parser.add_argument('--workers', type=int, default=2*(os.cpu_count() or 1) + 1, help="production worker processes")
+    parser.add_argument('--threads', type=int, default=4, help="request threads per production worker")
+    parser.add_argument('--modes', default='development,production', help="comma separated serving modes")
+    parser.add_argument('--routes', default='/now,/epochs', help="comma separated routes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'ISS.OEM_J2K_EPH.xml'), 'w') as f:
+            # Centered on the current time, so /now is inside the data set
+            f.write(orbitXML(FIXTURE_STATE_VECTORS, start=time.time() - FIXTURE_STATE_VECTORS*240/2))
+        fixture = serveFixture(directory)
+        source = f'http://127.0.0.1:{fixture.server_port}/ISS.OEM_J2K_EPH.xml'
+
+        print(f"{'mode':<12} {'route':<10} {'requests/s':>11} {'requests':>9} {'errors':>7}")
+        for mode in args.modes.split(','):
+            port = freePort()
+            process = startTracker(mode, source, port, args.workers, args.threads)
+            try:
+                for route in args.routes.split(','):
+                    result = measure(f'http://127.0.0.1:{port}{route}', args.seconds, args.concurrency)
+                    print(f"{mode:<12} {route:<10} {result['requests/s']:>11.1f} {result['requests']:>9} {result['errors']:>7}")
+            finally:
+                stopTracker(process)
+        fixture.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Benchmark suite of the tracker's hot paths: parsing the OEM, looking up state vectors, computing
+    locations, the Flask routes end to end, and requests per second under concurrent load on a
+    local server. Everything runs against the same synthetic 15 day OEM (byte for byte, its SHA-256
+    is recorded) or a recorded OEM given with --fixture, and a stub geocoder, so nothing leaves the
+    machine. Results are written as JSON that --compare lines up against an earlier run.
+
+    python bench/suite.py --output bench-$(git rev-parse --short HEAD).json
+    python bench/suite.py --compare bench-old.json --no-load
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+
+from serving import FIXTURE_STATE_VECTORS, ROOT, freePort, measure, serveFixture, startTracker, stopTracker
+from synthetic_orbit import ORBIT_START, orbitXML
+
+ROUND_TIME = 0.05  # seconds each timed round of a benchmark lasts at least
+REGRESSION = 1.10  # median slowdown --compare flags
+
+# The tracker reads its configuration at import, so it is pointed away from NASA and any saved state first
+os.environ.update(ISS_DATA_SOURCE='http://127.0.0.1:9/unused.xml', ISS_GEOCODE_CACHE_SIZE='0')
+for name in ('ISS_SNAPSHOT_DIR', 'ISS_ARCHIVE_DIR', 'ISS_GEOCODE_CACHE_FILE'):
+    os.environ.pop(name, None)
+sys.path.insert(0, ROOT)
+import iss_tracker  # noqa: E402
+
+class StubGeocoder:
+    """Reverse geocoder that answers every position with the same address, optionally after a
+        fixed delay standing in for the round trip to a geocoding service.
+    """
+    land_coverage = True
+
+    def __init__(self, latency:float=0.0):
+        self.latency = latency
+
+    def reverse(self, latitude:float, longitude:float) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        return {'city': 'Houston', 'state': 'Texas', 'country': 'United States', 'country_code': 'us'}
+
+def timeCall(function, rounds:int) -> dict:
+    """Function times a callable over several rounds, each calling it often enough to last ROUND_TIME.
+    Args:
+        function (callable): Callable taking no arguments
+        rounds (int): Number of timed rounds
+    Returns:
+        dict: Milliseconds per call (min, median, mean, p95, stdev over the rounds) and the calls per round
+    """
+    timer = timeit.Timer(function)
+    function()  # warm up caches the first call fills
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * ROUND_TIME / max(elapsed, 1e-9)))
+    per_call = sorted(1000 * elapsed / number for elapsed in timer.repeat(repeat=rounds, number=number))
+    return {'min_ms': per_call[0], 'median_ms': statistics.median(per_call), 'mean_ms': statistics.fmean(per_call),
+            'p95_ms': per_call[min(rounds - 1, int(0.95 * rounds))],
+            'stdev_ms': statistics.stdev(per_call) if rounds > 1 else 0.0, 'rounds': rounds, 'calls': number}
+
+def inProcess(document:bytes, rounds:int, geocode_latency:float) -> dict:
+    """Function benchmarks the parser, the lookups, and the routes through the Flask test client.
+    Args:
+        document (bytes): OEM XML document
+        rounds (int): Number of timed rounds per benchmark
+        geocode_latency (float): Seconds the stub geocoder takes per lookup
+    Returns:
+        dict: Timings keyed by benchmark name
+    """
+    snapshot = iss_tracker.parseEphemeris(document)
+    iss_tracker.ephemeris.snapshot = snapshot
+    iss_tracker.ephemeris.fetched_at = time.monotonic()
+    iss_tracker.ephemeris.ttl = float('inf')
+    iss_tracker.geocoder = StubGeocoder(geocode_latency)
+
+    middle = len(snapshot) // 2
+    epoch = snapshot.epochs[middle].decode()
+    at = float(snapshot.times[middle]) + 100.0  # between two state vectors, so /now interpolates
+    x, y, z = (float(value) for value in snapshot.positions[middle])
+    chunks = [document[start:start + iss_tracker.DOWNLOAD_CHUNK_SIZE]
+              for start in range(0, len(document), iss_tracker.DOWNLOAD_CHUNK_SIZE)]
+    client = iss_tracker.app.test_client()
+    benchmarks = {
+        'parse': lambda: iss_tracker.parseEphemeris(document),
+        'parse_chunked': lambda: iss_tracker.parseEphemeris(chunks),
+        'lookup_epoch': lambda: iss_tracker.findEpoch(snapshot, epoch),
+        'lookup_now_epoch': lambda: iss_tracker.getNowEpoch(snapshot, at),
+        'lookup_page': lambda: iss_tracker.getStateVectorData(100, middle),
+        'calculate_location': lambda: iss_tracker.calculateLocation(x, y, z, epoch),
+        'route_epoch': lambda: client.get(f'/epochs/{epoch}').get_data(),
+        'route_epochs_page': lambda: client.get(f'/epochs?limit=100&offset={middle}').get_data(),
+        'route_epochs_all': lambda: client.get('/epochs').get_data(),
+        'route_now': lambda: client.get(f'/now?at={iss_tracker.formatEpoch(at)}').get_data(),
+    }
+    results = {}
+    for name, function in benchmarks.items():
+        results[name] = timeCall(function, rounds)
+        print(f"{name:<22} {results[name]['median_ms']:>10.4f} ms", file=sys.stderr)
+    iss_tracker.ephemeris.clear()
+    return results
+
+def underLoad(document:bytes, seconds:float, concurrency:int, mode:str, workers:int, threads:int) -> dict:
+    """Function measures requests per second and latency of /now and /epochs/<epoch> on a local server.
+    Args:
+        document (bytes): OEM XML document the server downloads from a local HTTP server
+        seconds (float): Duration of each measurement
+        concurrency (int): Concurrent clients
+        mode (str): 'development' or 'production' server
+        workers (int): Production worker processes
+        threads (int): Request threads per production worker
+    Returns:
+        dict: Throughput and latency keyed by route
+    """
+    snapshot = iss_tracker.parseEphemeris(document)
+    middle = len(snapshot) // 2
+    routes = {'load_now': f'/now?at={iss_tracker.formatEpoch(float(snapshot.times[middle]) + 100.0)}',
+              'load_epoch': f'/epochs/{snapshot.epochs[middle].decode()}'}
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'ISS.OEM_J2K_EPH.xml'), 'wb') as f:
+            f.write(document)
+        fixture = serveFixture(directory)
+        port = freePort()
+        process = startTracker(mode, f'http://127.0.0.1:{fixture.server_port}/ISS.OEM_J2K_EPH.xml', port, workers, threads)
+        try:
+            for name, route in routes.items():
+                results[name] = dict(measure(f'http://127.0.0.1:{port}{route}', seconds, concurrency),
+                                     mode=mode, concurrency=concurrency)
+                print(f"{name:<22} {results[name]['requests/s']:>10.1f} requests/s", file=sys.stderr)
+        finally:
+            stopTracker(process)
+            fixture.shutdown()
+    return results
+
+def environment(document:bytes) -> dict:
+    """Function describes what a run measured, so runs on different commits or machines can be told apart.
+    Args:
+        document (bytes): OEM XML document
+    Returns:
+        dict: Commit, interpreter, library versions, machine, and fixture identity
+    """
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'numpy': iss_tracker.np.__version__, 'orjson': iss_tracker.orjson is not None,
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'fixture': {'bytes': len(document), 'state_vectors': document.count(b'<stateVector>'),
+                        'sha256': hashlib.sha256(document).hexdigest()}}
+
+def compare(baseline:dict, results:dict) -> None:
+    """Function prints each benchmark next to the same benchmark of an earlier run.
+    Args:
+        baseline (dict): Output of an earlier run
+        results (dict): Output of this run
+    """
+    if baseline['environment']['fixture']['sha256'] != results['environment']['fixture']['sha256']:
+        print("warning: the runs used different fixtures", file=sys.stderr)
+    print(f"{'benchmark':<22} {'before':>12} {'after':>12} {'change':>8}")
+    for name, after in results['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if before is None:
+            continue
+        # Lower is better for latencies, higher for throughput
+        key, unit, lower_is_better = ('median_ms', 'ms', True) if 'median_ms' in after else ('requests/s', 'req/s', False)
+        ratio = after[key] / before[key] if before[key] else float('nan')
+        slower = ratio > REGRESSION if lower_is_better else ratio < 1 / REGRESSION
+        print(f"{name:<22} {before[key]:>9.3f} {unit:<2} {after[key]:>9.3f} {unit:<2} {ratio - 1:>+7.1%}{'  slower' if slower else ''}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--fixture', help="recorded OEM file to use instead of the synthetic one")
+    parser.add_argument('--write-fixture', help="write the synthetic OEM to this file and exit")
+    parser.add_argument('--rounds', type=int, default=20, help="timed rounds per benchmark")
+    parser.add_argument('--geocode-latency', type=float, default=0.0, help="seconds the stub geocoder takes per lookup")
+    parser.add_argument('--no-load', action='store_true', help="skip the concurrent load benchmarks")
+    parser.add_argument('--seconds', type=float, default=10.0, help="duration of each load measurement")
+    parser.add_argument('--concurrency', type=int, default=16, help="concurrent clients of the load benchmarks")
+    parser.add_argument('--mode', default='production', help="server of the load benchmarks: development or production")
+    parser.add_argument('--workers', type=int, default=2*(os.cpu_count() or 1) + 1, help="production worker processes")
+    parser.add_argument('--threads', type=int, default=4, help="request threads per production worker")
+    parser.add_argument('--output', help="file the JSON results are written to, standard output by default")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture, 'rb') as f:
+            document = f.read()
+    else:
+        # A fixed start, so every run parses the same document
+        document = orbitXML(FIXTURE_STATE_VECTORS, start=ORBIT_START).encode()
+    if args.write_fixture:
+        with open(args.write_fixture, 'wb') as f:
+            f.write(document)
+        return
+
+    results = {'environment': environment(document), 'benchmarks': inProcess(document, args.rounds, args.geocode_latency)}
+    if not args.no_load:
+        results['benchmarks'].update(underLoad(document, args.seconds, args.concurrency, args.mode, args.workers, args.threads))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
@@ -1,220 +1,2248 @@
 #!/usr/bin/env python3
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
+from geopy.exc import GeocoderTimedOut, GeopyError
 from geopy.geocoders import Nominatim
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import List
+from functools import cached_property, lru_cache
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+import atexit
+import bisect
+import calendar
+import cProfile
+import fcntl
+import gzip
+import hashlib
+import hmac
+import io
 import json
 import logging
+import marshal
 import math
 import numpy as np
+import os
+import pstats
+import re
 import requests
-import xmltodict
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
 
-DATA_SOURCE = 'https://nasa-public-data.s3.amazonaws.com/iss-coords/current/ISS_OEM/ISS.OEM_J2K_EPH.xml'
+# Optional accelerators, the standard library is used when they are not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Optional binary wire formats, requests for them are answered with 406 when they are not installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+DATA_SOURCE = os.environ.get('ISS_DATA_SOURCE', 'https://nasa-public-data.s3.amazonaws.com/iss-coords/current/ISS_OEM/ISS.OEM_J2K_EPH.xml')
 EARTH_RADIUS = 6371.0  # km
+WGS84_A = 6378.137  # km, equatorial radius
+WGS84_F = 1 / 298.257223563  # flattening
+J2000_EPOCH = 946728000.0  # 2000-01-01T12:00:00Z in seconds since the Unix epoch
+INTERPOLATION_MAX_GAP = 2.0  # samples further apart than this many typical spacings are not interpolated between
+GROUNDTRACK_MAX_POINTS = 100000 # most points one /groundtrack request may interpolate
+BATCH_MAX_EPOCHS = 100000  # most epochs one /epochs/batch request may ask for
+BATCH_MAX_GEOPOSITIONS = 1000  # most epochs one /epochs/batch request may reverse geocode
+PASS_STEP = 30.0  # seconds between the elevations sampled to find passes before they are refined
+PASS_REFINEMENTS = 16  # bisection / golden section steps refining rise, culmination, and set times
+PASS_MIN_ELEVATION = 10.0  # degrees, default elevation a pass has to reach above the horizon
+PASS_MAX_OBSERVERS = 100  # most observers one /passes request may ask for
+STREAM_MAX_RATE = 10.0  # Hz, most positions per second a /now/stream subscriber may ask for
+STREAM_HEARTBEAT = 15.0  # seconds between keep-alive comments on a stream without positions
+STREAM_BATCH_ROWS = 500  # state vectors serialized per chunk of a streamed /epochs response
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # bytes of the OEM fed to the parser at a time
+DOWNLOAD_RETRY = 5.0  # seconds requests are answered without data after the first download failed, before it is retried
+BROTLI_QUALITY = 5  # cached payloads are recompressed on every refresh, so favor speed over ratio
+CACHE_TTL = float(os.environ.get('ISS_CACHE_TTL', 600))  # seconds before the OEM is revalidated with NASA
+CONNECT_TIMEOUT = float(os.environ.get('ISS_CONNECT_TIMEOUT', 5))  # seconds to connect to NASA
+READ_TIMEOUT = float(os.environ.get('ISS_READ_TIMEOUT', 30))  # seconds without data before the download is abandoned
+SNAPSHOT_DIR = os.environ.get('ISS_SNAPSHOT_DIR')  # optional directory the parsed snapshot is persisted to
+SNAPSHOT_KEEP = 2  # snapshot versions kept on disk, older ones may still be mapped by other workers
+SNAPSHOT_POLL = 5.0  # seconds between checks for a snapshot published by the process that downloads the OEM
+ARCHIVE_DIR = os.environ.get('ISS_ARCHIVE_DIR')  # optional directory every downloaded OEM revision is archived in
+ARCHIVE_CHUNK = 86400  # seconds of state vectors per archive file
+ARCHIVE_MARGIN = 3600  # seconds of neighbouring samples loaded around an archive query for interpolation
+ARCHIVE_CACHED_CHUNKS = 120  # archive files whose parsed columns are kept in memory between queries
+SERVER = os.environ.get('ISS_SERVER', 'development')  # 'development' (Flask debug server) or 'production' (gunicorn)
+PORT = int(os.environ.get('ISS_PORT', 5000))
+WORKERS = int(os.environ.get('ISS_WORKERS', 2*(os.cpu_count() or 1) + 1))  # production worker processes
+THREADS = int(os.environ.get('ISS_THREADS', 4))  # request threads per production worker
+# Every open /now/stream holds a request thread, so by default half of them are left for the other routes
+STREAM_MAX_SUBSCRIBERS = int(os.environ.get('ISS_STREAM_SUBSCRIBERS', max(1, THREADS // 2)))  # open streams per worker
+GRACEFUL_TIMEOUT = int(os.environ.get('ISS_GRACEFUL_TIMEOUT', 30))  # seconds workers get to finish requests on reload or stop
+
+GEOCODER = os.environ.get('ISS_GEOCODER', 'nominatim')  # 'nominatim' or 'local'
+GEOCODER_DATA = os.environ.get('ISS_GEOCODER_DATA')  # GeoJSON polygons used by the local geocoder
+GEOCODER_CELL = 1.0  # degrees, grid size of the local geocoder's spatial index
+GEOCODE_PRECISION = int(os.environ.get('ISS_GEOCODE_PRECISION', 5))  # geohash characters per cache cell
+GEOCODE_CACHE_SIZE = int(os.environ.get('ISS_GEOCODE_CACHE_SIZE', 100000))  # cells kept, 0 disables the cache
+GEOCODE_CACHE_TTL = float(os.environ.get('ISS_GEOCODE_CACHE_TTL', 30*86400))  # seconds a cached address is trusted
+GEOCODE_CACHE_FILE = os.environ.get('ISS_GEOCODE_CACHE_FILE')  # optional JSON file the cache is saved to
+GEOCODE_CACHE_SAVE_EVERY = 100  # new entries between saves, the cache is also saved at exit
+GEOCODE_TIMEOUT = float(os.environ.get('ISS_GEOCODE_TIMEOUT', 5))  # seconds a request waits on the geocoding service
+GEOCODE_CONCURRENCY = int(os.environ.get('ISS_GEOCODE_CONCURRENCY', 1))  # requests in flight to the geocoding service
+
+PROFILE_TOKEN = os.environ.get('ISS_PROFILE_TOKEN')  # enables ?profile=1 for requests sending it as X-Profile-Token
+PROFILE_DIR = os.environ.get('ISS_PROFILE_DIR')  # optional directory every profile is also saved to
+PROFILE_LINES = 40  # functions listed in a text profile
+PROFILE_MAX_SECONDS = 10.0  # a streamed body (/now/stream) is profiled for at most this long
 
 # Initialize Nominatim API 
-geolocator = Nominatim(user_agent="ISS_TRACKER")
+geolocator = Nominatim(user_agent="ISS_TRACKER", timeout=GEOCODE_TIMEOUT)
+
+app = Flask(__name__)
+
+STATE_FIELDS = ('X', 'Y', 'Z', 'X_DOT', 'Y_DOT', 'Z_DOT')
+EPOCH_PATTERN = re.compile(r'(\d{4})-(\d{1,3})T(\d{1,2}):(\d{1,2}):(\d{1,2}(?:\.\d*)?)Z?$')
+
+@lru_cache(maxsize=None)
+def _yearStart(year:int) -> int:
+    return calendar.timegm((year, 1, 1, 0, 0, 0))
+
+def parseEpoch(epoch:str) -> float:
+    """Function converts an OEM epoch string (YYYY-DDDTHH:MM:SS.fffZ) to seconds since the Unix epoch. 
+    Args:
+        epoch (str): Epoch in the day-of-year format used by the OEM
+    Returns:
+        float: Seconds since 1970-01-01T00:00:00Z
+    """
+    match = EPOCH_PATTERN.match(epoch)
+    if match is None:
+        raise ValueError(f"Invalid epoch {epoch!r}")
+    year, day, hour, minute, second = match.groups()
+    day, hour, minute, second = int(day), int(hour), int(minute), float(second)
+    if not (1 <= day <= 366 and hour < 24 and minute < 60 and second < 61):
+        raise ValueError(f"Invalid epoch {epoch!r}")
+    return _yearStart(int(year)) + (day - 1)*86400 + hour*3600 + minute*60 + second
+
+def epochKey(timestamp:float) -> int:
+    """Function converts a timestamp to the whole number of milliseconds used to index epochs."""
+    return int(round(timestamp * 1000))
+
+def formatEpoch(timestamp:float) -> str:
+    """Function formats seconds since the Unix epoch as an OEM epoch string with millisecond precision. 
+    Args:
+        timestamp (float): Seconds since 1970-01-01T00:00:00Z
+    Returns:
+        str: Epoch string in the YYYY-DDDTHH:MM:SS.fffZ format
+    """
+    dt_object = datetime.fromtimestamp(round(float(timestamp), 3), timezone.utc)
+    return dt_object.strftime('%Y-%jT%H:%M:%S.%f')[:-3] + 'Z'
+
+@dataclass(frozen=True)
+class Ephemeris:
+    """Immutable columnar snapshot of one parsed OEM file. A new snapshot is built in full 
+        before it replaces the old one, so readers never observe a half-built data set. 
+        Numbers are kept in float64 arrays for computation, next to the original text so 
+        state vectors serialize exactly as NASA published them. 
+    """
+    header: dict
+    metadata: dict
+    comments: list
+    epochs: np.ndarray      # (n,) OEM epoch strings as bytes
+    times: np.ndarray       # (n,) seconds since the Unix epoch
+    positions: np.ndarray   # (n, 3) X, Y, Z in km
+    velocities: np.ndarray  # (n, 3) X_DOT, Y_DOT, Z_DOT in km/s
+    text: np.ndarray        # (n, 6) original text of X, Y, Z, X_DOT, Y_DOT, Z_DOT as bytes
+    units: tuple            # units attribute of each STATE_FIELDS column
+    altitudes: np.ndarray   # (n,) WGS-84 altitude in km
+    latitudes: np.ndarray   # (n,) geodetic latitude in degrees
+    longitudes: np.ndarray  # (n,) longitude in degrees
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    responses: dict = field(default_factory=dict, compare=False, repr=False)  # name -> CachedResponse
+
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+    @cached_property
+    def index(self) -> dict:
+        """epochKey() of each epoch -> row of its first occurrence, built on first use"""
+        return _epochIndex(self.times)
+
+    @cached_property
+    def spacing(self) -> float:
+        """Typical seconds between consecutive samples, the median so gaps between archived revisions do not count"""
+        steps = np.diff(self.times)
+        steps = steps[steps > 0]
+        return float(np.median(steps)) if len(steps) else 0.0
+
+    def find(self, epoch:str) -> Optional[int]:
+        """Function finds the row of an epoch in constant time. Equivalent spellings of the 
+            same instant (e.g. 2024-62 and 2024-062) resolve to the same row. 
+        Args:
+            epoch (str): Datetime string for specific state vectors
+        Returns:
+            int: Row of the state vector, or None if the epoch is not available
+        """
+        try:
+            return self.index.get(epochKey(parseEpoch(epoch)))
+        except ValueError:
+            return None
+
+    def window(self, start:Optional[float]=None, end:Optional[float]=None, after:Optional[float]=None) -> range:
+        """Function binary searches the rows inside a time range without copying any data. 
+        Args:
+            start (float): Earliest time to include, in seconds since the Unix epoch
+            end (float): Latest time to include, in seconds since the Unix epoch
+            after (float): Only include rows strictly after this time (paging cursor)
+        Returns:
+            range: Row numbers inside the range
+        """
+        first, last = 0, len(self.times)
+        if start is not None:
+            first = max(first, int(np.searchsorted(self.times, start, side='left')))
+        if after is not None:
+            first = max(first, int(np.searchsorted(self.times, after, side='right')))
+        if end is not None:
+            last = int(np.searchsorted(self.times, end, side='right'))
+        return range(first, max(first, last))
+
+    def stateVector(self, index:int, fields:tuple=STATE_FIELDS) -> dict:
+        """Function serializes a single row in the same shape as the OEM state vector. 
+        Args:
+            index (int): Row of the state vector
+            fields (tuple): State vector fields to include besides the EPOCH
+        Returns:
+            dict: State vector dictionary with the EPOCH and '#text'/'@units' values
+        """
+        state_dict = {'EPOCH': self.epochs[index].decode()}
+        row_text = self.text[index]
+        for column, (name, units) in enumerate(zip(STATE_FIELDS, self.units)):
+            if name not in fields:
+                continue
+            value = row_text[column].decode()
+            state_dict[name] = value if units is None else {'@units': units, '#text': value}
+        return state_dict
+
+def _epochIndex(times:np.ndarray) -> dict:
+    # Iterating backwards leaves each key pointing at the first row with that epoch
+    keys = np.rint(times * 1000).astype(np.int64).tolist()
+    return dict(zip(reversed(keys), range(len(keys) - 1, -1, -1)))
+
+def buildEphemeris(header:dict, metadata:dict, comments:list, epochs:list, text:list, units:tuple, 
+                   etag:Optional[str]=None, last_modified:Optional[str]=None) -> Ephemeris:
+    """Function converts parsed OEM columns into an Ephemeris snapshot. 
+    Args:
+        header (dict): OEM header
+        metadata (dict): OEM segment metadata
+        comments (list): OEM data comments
+        epochs (list): Epoch string of every state vector
+        text (list): Text of X, Y, Z, X_DOT, Y_DOT, Z_DOT for every state vector
+        units (tuple): Units of X, Y, Z, X_DOT, Y_DOT, Z_DOT
+        etag (str): ETag header the document was served with
+        last_modified (str): Last-Modified header the document was served with
+    Returns:
+        Ephemeris: Snapshot of the data set
+    """
+    epochs = np.array(epochs, dtype=np.bytes_).reshape(-1)
+    text = np.array(text, dtype=np.bytes_).reshape(-1, len(STATE_FIELDS))
+    values = text.astype(np.float64)
+    times = np.fromiter((parseEpoch(epoch.decode()) for epoch in epochs), dtype=np.float64, count=len(epochs))
+
+    # Keep rows in time order so lookups by time can binary search
+    if np.any(np.diff(times) < 0):
+        order = np.argsort(times, kind='stable')
+        epochs, text, values, times = epochs[order], text[order], values[order], times[order]
+    for array in (epochs, text, values, times):
+        array.flags.writeable = False
+
+    # Ground positions are computed once per snapshot so location lookups are free
+    altitudes, latitudes, longitudes = calculateLocations(values[:, :3], times)
+    for array in (altitudes, latitudes, longitudes):
+        array.flags.writeable = False
+
+    snapshot = Ephemeris(header=header, metadata=metadata, comments=comments, epochs=epochs, times=times, 
+                         positions=values[:, :3], velocities=values[:, 3:], text=text, units=tuple(units), 
+                         altitudes=altitudes, latitudes=latitudes, longitudes=longitudes, 
+                         etag=etag, last_modified=last_modified)
+    snapshot.index  # built up front, so the first epoch lookup does not pay for it
+    return snapshot
+
+def _localName(tag:str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+def _elementText(elem:ET.Element) -> Optional[str]:
+    text = (elem.text or '').strip()
+    return text or None
+
+def _elementToDict(elem:ET.Element) -> dict:
+    """Function converts a small element (header, metadata) into the dictionary shape the API has 
+        always returned: leaf text as strings, attributes as '@name' keys next to '#text', and 
+        repeated children as lists. 
+    """
+    result = {}
+    for child in elem:
+        if len(child):
+            value = _elementToDict(child)
+        elif child.attrib:
+            value = {f'@{key}': attribute for key, attribute in child.attrib.items()}
+            value['#text'] = _elementText(child)
+        else:
+            value = _elementText(child)
+        name = _localName(child.tag)
+        if name not in result:
+            result[name] = value
+        elif isinstance(result[name], list):
+            result[name].append(value)
+        else:
+            result[name] = [result[name], value]
+    return result
+
+def parseEphemeris(source, etag:Optional[str]=None, last_modified:Optional[str]=None) -> Ephemeris:
+    """Function parses an OEM XML document into an Ephemeris snapshot in a single streaming pass. 
+        State vectors go straight into columns and their elements are discarded as soon as they 
+        are read, so the full document tree is never held in memory. 
+    Args:
+        source (str | bytes | Iterable[bytes]): OEM XML document, or the chunks of it as they are downloaded
+        etag (str): ETag header the document was served with
+        last_modified (str): Last-Modified header the document was served with
+    Returns:
+        Ephemeris: Snapshot containing the header, metadata, comments, and state vectors
+    Raises:
+        ValueError: If the document is not a well formed OEM
+    """
+    chunks = [source] if isinstance(source, (str, bytes)) else source
+    parser = ET.XMLPullParser(events=('end',))
+    header, metadata, comments = {}, {}, []
+    epochs, rows = [], []
+    units = None
+    in_data = False
+
+    def handle(elem:ET.Element) -> None:
+        nonlocal header, metadata, units, in_data
+        name = _localName(elem.tag) if '}' in elem.tag else elem.tag
+
+        # Each state vector lists the time in UTC; position X, Y, and Z in km; and velocity X, Y, and Z in km/s.
+        if name == 'stateVector':
+            vector = {(_localName(child.tag) if '}' in child.tag else child.tag): child for child in elem}
+            epochs.append(vector['EPOCH'].text.strip())
+            rows.append([vector[name].text.strip() for name in STATE_FIELDS])
+            if units is None:
+                units = tuple(vector[name].get('units') for name in STATE_FIELDS)
+            elem.clear()
+        elif name == 'COMMENT' and in_data:
+            # Comments after the segment metadata belong to the data section
+            comments.append(_elementText(elem))
+            elem.clear()
+        elif name == 'header':
+            header = _elementToDict(elem)
+            elem.clear()
+        elif name == 'metadata':
+            metadata = _elementToDict(elem)
+            in_data = True
+            elem.clear()
+
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            for _, elem in parser.read_events():
+                handle(elem)
+        parser.close()
+        for _, elem in parser.read_events():
+            handle(elem)
+    except (ET.ParseError, KeyError, AttributeError) as error:
+        raise ValueError(f"Malformed OEM document: {error}") from error
+
+    units = units or (None,) * len(STATE_FIELDS)
+    return buildEphemeris(header, metadata, comments, epochs, rows, units, etag, last_modified)
+
+@contextmanager
+def fileLock(path:str):
+    """Function holds an exclusive flock on a lock file for the body of a with statement, which 
+        serializes processes (and threads) writing to a directory they share. 
+    Args:
+        path (str): Lock file, created if missing
+    """
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def writeAtomic(path:str, write) -> None:
+    """Function writes a file through a uniquely named staging file in the same directory and renames 
+        it into place, so readers only see complete files and concurrent writers never share a staging file. 
+    Args:
+        path (str): File to write
+        write (callable): Called with the binary staging file to fill it
+    """
+    descriptor, staging = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        os.fchmod(descriptor, 0o644)  # mkstemp creates the file readable by its owner only
+        with os.fdopen(descriptor, 'wb') as f:
+            write(f)
+        os.replace(staging, path)
+    except BaseException:
+        try:
+            os.remove(staging)
+        except FileNotFoundError:
+            pass
+        raise
+
+SNAPSHOT_COLUMNS = ('epochs', 'times', 'positions', 'velocities', 'text', 'altitudes', 'latitudes', 'longitudes')
+
+def saveSnapshot(snapshot:Ephemeris, directory:str) -> str:
+    """Function persists a snapshot as one .npy file per column plus a JSON file of the small 
+        fields. Each snapshot is written to its own version directory, which is published by 
+        atomically replacing the CURRENT pointer, so readers never see a partial write. Processes 
+        sharing the directory publish one at a time, and the published version is never pruned. 
+    Args:
+        snapshot (Ephemeris): Snapshot to persist
+        directory (str): Directory holding the snapshot versions
+    Returns:
+        str: Name of the version directory the snapshot was written to
+    """
+    digest = hashlib.sha1(snapshot.epochs.tobytes())
+    digest.update(snapshot.text.tobytes())
+    version = f"{time.time_ns()}-{digest.hexdigest()[:12]}"
+    target = os.path.join(directory, version)
+    staging = target + '.tmp'
+    os.makedirs(staging)
+    for name in SNAPSHOT_COLUMNS:
+        np.save(os.path.join(staging, name + '.npy'), np.ascontiguousarray(getattr(snapshot, name)))
+    meta = {'header': snapshot.header, 'metadata': snapshot.metadata, 'comments': snapshot.comments, 
+            'units': list(snapshot.units), 'etag': snapshot.etag, 'last_modified': snapshot.last_modified, 
+            'saved_at': time.time()}
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    # Publishing and pruning are serialized across the processes sharing the directory, so a 
+    # version is never pruned between being moved into place and CURRENT pointing at it
+    with fileLock(os.path.join(directory, '.lock')):
+        os.rename(staging, target)
+        writeAtomic(os.path.join(directory, 'CURRENT'), lambda f: f.write(version.encode()))
+
+        # Unlinking a version another worker still maps is safe, the mapping stays valid until it is dropped
+        versions = sorted(name for name in os.listdir(directory) 
+                          if os.path.isdir(os.path.join(directory, name)) and not name.endswith('.tmp'))
+        keep = {version, currentSnapshotVersion(directory)}
+        for name in versions[:-SNAPSHOT_KEEP]:
+            if name not in keep:
+                for file in os.listdir(os.path.join(directory, name)):
+                    os.remove(os.path.join(directory, name, file))
+                os.rmdir(os.path.join(directory, name))
+    return version
+
+def currentSnapshotVersion(directory:str) -> Optional[str]:
+    """Function reads the CURRENT pointer of a snapshot directory. 
+    Args:
+        directory (str): Directory holding the snapshot versions
+    Returns:
+        str: Name of the published version, or None if nothing has been saved yet
+    """
+    try:
+        with open(os.path.join(directory, 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def loadSnapshot(directory:str, version:Optional[str]=None) -> Tuple[Ephemeris, float]:
+    """Function loads a persisted snapshot. The columns are memory mapped read-only, so loading 
+        is independent of the data set size and worker processes share the same pages. 
+    Args:
+        directory (str): Directory holding the snapshot versions
+        version (str): Version to load, defaults to the one CURRENT points at
+    Returns:
+        Tuple[Ephemeris, float]: The snapshot and the Unix time it was saved at
+    """
+    version = version or currentSnapshotVersion(directory)
+    if version is None:
+        raise FileNotFoundError(f"No snapshot saved in {directory}")
+    path = os.path.join(directory, version)
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    columns = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in SNAPSHOT_COLUMNS}
+    snapshot = Ephemeris(header=meta['header'], metadata=meta['metadata'], comments=meta['comments'], 
+                         units=tuple(meta['units']), etag=meta['etag'], last_modified=meta['last_modified'], **columns)
+    snapshot.index  # built up front, so the first epoch lookup does not pay for it
+    return snapshot, meta['saved_at']
+
+class EphemerisArchive:
+    """Retains the state vectors of every downloaded OEM revision so epochs stay available after 
+        they roll off NASA's current file. Rows are partitioned into one file per ARCHIVE_CHUNK of 
+        time, and index.json records the time bounds of each file, so a query only reads the 
+        files overlapping it. An epoch present in several revisions keeps the newest revision's values. 
+        Processes sharing the directory serialize their updates with a lock file in it. 
+    """
+    def __init__(self, directory:str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._index = {'units': None, 'chunks': {}}
+        self._index_stat = None
+        self._columns = OrderedDict()  # file name -> ((inode, mtime) of the file, snapshot columns of its rows)
+
+    def _path(self, name:str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _readIndex(self, reload:bool=False) -> dict:
+        # Another process sharing the directory may have archived a revision since the last read. Every 
+        # write replaces the file, so the inode tells writes apart that share a timestamp. Writers reload 
+        # unconditionally under the lock file.
+        try:
+            stat = os.stat(self._path('index.json'))
+        except FileNotFoundError:
+            return self._index
+        if reload or (stat.st_ino, stat.st_mtime_ns) != self._index_stat:
+            with open(self._path('index.json')) as f:
+                self._index = json.load(f)
+            self._index_stat = (stat.st_ino, stat.st_mtime_ns)
+        return self._index
+
+    def _loadChunk(self, name:str) -> dict:
+        with np.load(self._path(name + '.npz')) as chunk:
+            return {column: chunk[column] for column in ('epochs', 'text', 'times', 'revisions')}
+
+    def _chunkColumns(self, name:str) -> dict:
+        # The snapshot columns of a file are built once per version of it: the stored times are used as 
+        # they are, and the ground positions are computed once instead of on every query
+        stat = os.stat(self._path(name + '.npz'))
+        cached = self._columns.get(name)
+        if cached is not None and cached[0] == (stat.st_ino, stat.st_mtime_ns):
+            self._columns.move_to_end(name)
+            return cached[1]
+        chunk = self._loadChunk(name)
+        values = chunk['text'].astype(np.float64)
+        altitudes, latitudes, longitudes = calculateLocations(values[:, :3], chunk['times'])
+        columns = {'epochs': chunk['epochs'], 'text': chunk['text'], 'times': chunk['times'], 
+                   'positions': values[:, :3], 'velocities': values[:, 3:], 
+                   'altitudes': altitudes, 'latitudes': latitudes, 'longitudes': longitudes}
+        self._columns[name] = ((stat.st_ino, stat.st_mtime_ns), columns)
+        while len(self._columns) > ARCHIVE_CACHED_CHUNKS:
+            self._columns.popitem(last=False)
+        return columns
+
+    def add(self, snapshot:Ephemeris) -> int:
+        """Function merges the rows of a snapshot into the archive. 
+        Args:
+            snapshot (Ephemeris): Snapshot of one OEM revision
+        Returns:
+            int: Number of archive files written
+        """
+        if len(snapshot) == 0:
+            return 0
+        try:
+            revision = parseEpoch(snapshot.header['CREATION_DATE'])
+        except (KeyError, TypeError, ValueError):
+            revision = time.time()
+
+        os.makedirs(self.directory, exist_ok=True)
+        # The chunks and the index are read, merged, and written back as one update, so no other 
+        # process may archive in between or one of the two revisions would be lost
+        with self._lock, fileLock(self._path('.lock')):
+            index = self._readIndex(reload=True)
+            chunks = dict(index['chunks'])
+            partitions = np.floor(snapshot.times / ARCHIVE_CHUNK).astype(np.int64)
+            for partition in np.unique(partitions).tolist():
+                rows = partitions == partition
+                name = formatEpoch(partition * ARCHIVE_CHUNK)[:8]
+                epochs, text, times = snapshot.epochs[rows], snapshot.text[rows], snapshot.times[rows]
+                revisions = np.full(len(times), revision)
+                if name in chunks:
+                    old = self._loadChunk(name)
+                    epochs, text = np.concatenate((epochs, old['epochs'])), np.concatenate((text, old['text']))
+                    times, revisions = np.concatenate((times, old['times'])), np.concatenate((revisions, old['revisions']))
+
+                # Keep the newest revision of every epoch, the incoming rows win ties because they come first
+                keys = np.rint(times * 1000).astype(np.int64)
+                order = np.lexsort((np.arange(len(keys)), -revisions, keys))
+                _, first = np.unique(keys[order], return_index=True)
+                keep = order[first]
+                epochs, text, times, revisions = epochs[keep], text[keep], times[keep], revisions[keep]
+
+                writeAtomic(self._path(name + '.npz'), lambda f: np.savez(f, epochs=epochs, text=text, times=times, revisions=revisions))
+                chunks[name] = {'start': float(times[0]), 'end': float(times[-1]), 'count': len(times)}
+
+            index = {'units': list(snapshot.units), 'chunks': chunks}
+            writeAtomic(self._path('index.json'), lambda f: f.write(json.dumps(index, sort_keys=True).encode()))
+            stat = os.stat(self._path('index.json'))
+            self._index, self._index_stat = index, (stat.st_ino, stat.st_mtime_ns)
+        return len(np.unique(partitions))
+
+    def bounds(self) -> Optional[Tuple[float, float]]:
+        """Function returns the time span of the archive. 
+        Returns:
+            Tuple[float, float]: First and last archived epoch times, or None if the archive is empty
+        """
+        with self._lock:
+            chunks = self._readIndex()['chunks'].values()
+        if not chunks:
+            return None
+        return min(chunk['start'] for chunk in chunks), max(chunk['end'] for chunk in chunks)
+
+    def countWithin(self, start:float, end:float) -> int:
+        """Function counts the archived rows of the files lying entirely between two times, a lower 
+            bound on the rows query() would return, without reading any of the files. 
+        Args:
+            start (float): Earliest time in seconds since the Unix epoch
+            end (float): Latest time in seconds since the Unix epoch
+        Returns:
+            int: Number of rows
+        """
+        with self._lock:
+            chunks = self._readIndex()['chunks'].values()
+        return sum(chunk['count'] for chunk in chunks if start <= chunk['start'] and chunk['end'] <= end)
+
+    def query(self, start:Optional[float]=None, end:Optional[float]=None) -> Optional[Ephemeris]:
+        """Function builds a snapshot of the archived state vectors between two times. 
+        Args:
+            start (float): Earliest epoch to include in seconds since the Unix epoch, defaults to the first one
+            end (float): Latest epoch to include in seconds since the Unix epoch, defaults to the last one
+        Returns:
+            Ephemeris: Snapshot of the archived rows, or None if none are in range
+        """
+        with self._lock:
+            index = self._readIndex()
+            start = -math.inf if start is None else start
+            end = math.inf if end is None else end
+            names = sorted(name for name, chunk in index['chunks'].items() if chunk['start'] <= end and chunk['end'] >= start)
+            chunks = [self._chunkColumns(name) for name in names]
+        if not chunks:
+            return None
+
+        # Files cover consecutive days and their rows are in time order, so the rows in range are one slice
+        times = np.concatenate([chunk['times'] for chunk in chunks])
+        rows = slice(int(np.searchsorted(times, start, side='left')), int(np.searchsorted(times, end, side='right')))
+        if rows.start >= rows.stop:
+            return None
+        columns = {column: np.concatenate([chunk[column] for chunk in chunks])[rows] for column in chunks[0]}
+        for array in columns.values():
+            array.flags.writeable = False
+        return Ephemeris(header={}, metadata={}, comments=[], units=tuple(index['units']), **columns)
+
+    def find(self, epoch:str) -> Tuple[Optional[Ephemeris], Optional[int]]:
+        """Function finds an archived epoch. 
+        Args:
+            epoch (str): Datetime string for specific state vectors
+        Returns:
+            Tuple[Ephemeris, int]: Snapshot of the archive file holding the epoch and its row, or (None, None)
+        """
+        try:
+            timestamp = parseEpoch(epoch)
+        except ValueError:
+            return None, None
+        snapshot = self.query(timestamp, timestamp)
+        index = findEpoch(snapshot, epoch)
+        return (snapshot, index) if index is not None else (None, None)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+SIZE_BUCKETS = (1e4, 1e5, 5e5, 1e6, 2e6, 5e6, 1e7, 5e7)  # bytes
+
+def _labelText(names:tuple, values:tuple) -> str:
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+def _sampleLine(name:str, labels:str, value:float) -> str:
+    return f'{name}{{{labels}}} {value!r}' if labels else f'{name} {value!r}'
+
+def metricLines(name:str, documentation:str, kind:str, samples:list, labels:tuple=()) -> List[str]:
+    """Function formats one metric in the Prometheus text format. 
+    Args:
+        name (str): Metric name
+        documentation (str): HELP text
+        kind (str): 'counter' or 'gauge'
+        samples (list): (label values, value) pairs
+        labels (tuple): Label names
+    Returns:
+        List[str]: Lines of the metric
+    """
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+    return lines + [_sampleLine(name, _labelText(labels, values), float(value)) for values, value in samples]
+
+class Counter:
+    """Prometheus counter, one running total per combination of label values."""
+    def __init__(self, name:str, documentation:str, labels:tuple=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount:float=1.0) -> None:
+        with self._lock:
+            self._values[values] = self._values.get(values, 0.0) + amount
+
+    def value(self, *values) -> float:
+        return self._values.get(values, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return metricLines(self.name, self.documentation, 'counter', values, self.labels)
+
+class Histogram:
+    """Prometheus histogram, bucket counts, sum, and count per combination of label values."""
+    def __init__(self, name:str, documentation:str, labels:tuple=(), buckets:tuple=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [count per bucket (the last one is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value:float, *values) -> None:
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *values):
+        """Function observes the seconds the body of a with statement takes, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *values)
+
+    def count(self, *values) -> int:
+        series = self._series.get(values)
+        return 0 if series is None else sum(series[0])
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, counts, total in series:
+            labels = _labelText(self.labels, key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{labels + "," if labels else ""}le="{le}"}} {cumulative}')
+            lines.append(_sampleLine(self.name + '_sum', labels, total))
+            lines.append(_sampleLine(self.name + '_count', labels, cumulative))
+        return lines
+
+REQUEST_SECONDS = Histogram('iss_request_duration_seconds', 'Seconds until the response of a route is ready to send.', 
+                            ('route', 'method', 'status'))
+STAGE_SECONDS = Histogram('iss_stage_duration_seconds', 'Seconds spent in each stage of the data pipeline.', ('stage',))
+UPSTREAM_RESPONSES = Counter('iss_upstream_responses_total', 'OEM downloads by HTTP status, "error" when no response was read.', 
+                             ('status',))
+UPSTREAM_BYTES = Histogram('iss_upstream_response_bytes', 'Bytes of the OEM files downloaded.', buckets=SIZE_BUCKETS)
+EPHEMERIS_LOOKUPS = Counter('iss_ephemeris_cache_lookups_total', 
+                            'Snapshot lookups: hit (fresh), stale (expired but served), or miss (revalidated inline).', 
+                            ('result',))
+
+class EphemerisCache:
+    """Keeps the latest Ephemeris snapshot in memory so every route shares a single download. 
+        The snapshot is revalidated with a conditional GET (ETag / Last-Modified) once it is 
+        older than the TTL, so an unchanged file only costs a 304 response. When the background 
+        refresher is running, revalidation happens on its thread and requests never wait on NASA. 
+        With a snapshot directory, every downloaded snapshot is persisted there and a fresh 
+        process starts from the saved one, so it serves data without waiting on the network 
+        and keeps working when NASA is unreachable. Of the background refreshers sharing the 
+        directory, only the one holding its refresher lock talks to NASA; the others load what 
+        it publishes, all from the same memory-mapped files. With an archive, every downloaded 
+        revision is also merged into it. 
+    """
+    def __init__(self, source:str, ttl:float, snapshot_dir:Optional[str]=None, 
+                 archive:Optional[EphemerisArchive]=None):
+        self.source = source
+        self.ttl = ttl
+        self.snapshot_dir = snapshot_dir
+        self.archive = archive
+        self.snapshot = None
+        self.version = None
+        self.fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._leader = None  # open lock file while this process is the one refreshing the shared directory
+        self._attempts = 0  # completed load attempts, see get()
+        self._failed_at = None  # monotonic time the last attempt ended without any snapshot
+
+    def get(self) -> Optional[Ephemeris]:
+        """Function returns the current snapshot, loading it first if nothing has been loaded yet. 
+            Without a background refresher an expired snapshot is revalidated inline. 
+        Returns:
+            Ephemeris: Current snapshot, or None if the OEM has never been downloaded successfully
+        """
+        snapshot = self.snapshot
+        if snapshot is not None and (self.running() or (time.monotonic() - self.fetched_at) < self.ttl):
+            EPHEMERIS_LOOKUPS.inc('hit')
+            return snapshot
+        # Without any snapshot, a download that just failed is not retried by every request
+        failed_at = self._failed_at
+        if snapshot is None and failed_at is not None and (time.monotonic() - failed_at) < DOWNLOAD_RETRY:
+            EPHEMERIS_LOOKUPS.inc('miss')
+            return None
+        # Only one request revalidates, the others keep serving the expired snapshot instead of waiting
+        # on NASA. Without any snapshot they wait for that single download rather than starting their own.
+        attempts = self._attempts
+        if not self._lock.acquire(blocking=snapshot is None):
+            EPHEMERIS_LOOKUPS.inc('stale')
+            return snapshot
+        EPHEMERIS_LOOKUPS.inc('miss')
+        try:
+            # A download finished while this request waited on the lock, its outcome is shared even if it failed
+            if snapshot is None and self._attempts != attempts:
+                return self.snapshot
+            # Another request may have refreshed the snapshot while this one waited on the lock
+            if self.snapshot is None or (not self.running() and (time.monotonic() - self.fetched_at) >= self.ttl):
+                self._attempt()
+            return self.snapshot
+        finally:
+            self._lock.release()
+
+    def refresh(self) -> bool:
+        """Function revalidates the snapshot with NASA and swaps in a new one if the file changed. 
+            On failure the previous snapshot keeps being served. 
+        Returns:
+            bool: True if the snapshot is current, False if the download or parse failed
+        """
+        with self._lock:
+            return self._refresh()
+
+    def _loadSaved(self) -> bool:
+        """Function swaps in the saved snapshot if another process (or a previous run) published 
+            a different version than the one in memory. 
+        Returns:
+            bool: True if a saved snapshot was loaded
+        """
+        version = currentSnapshotVersion(self.snapshot_dir)
+        if version is None:
+            return False
+        # The TTL carries over from when the snapshot was last downloaded or revalidated, not when it was 
+        # loaded. The refresher touches CURRENT whenever NASA confirms the file has not changed.
+        try:
+            revalidated = os.stat(os.path.join(self.snapshot_dir, 'CURRENT')).st_mtime
+        except OSError:
+            revalidated = 0.0
+        if version == self.version:
+            self.fetched_at = max(self.fetched_at, time.monotonic() - max(0.0, time.time() - revalidated))
+            return False
+        try:
+            snapshot, saved_at = loadSnapshot(self.snapshot_dir, version)
+        except (OSError, ValueError, KeyError):
+            logging.exception(f"Failed to load the saved snapshot {version}")
+            return False
+        prepareResponses(snapshot)
+        self.snapshot, self.version = snapshot, version
+        self.fetched_at = time.monotonic() - max(0.0, time.time() - max(saved_at, revalidated))
+        logging.info(f"Loaded saved snapshot {version}")
+        return True
+
+    def _lead(self) -> bool:
+        """Function tries to become the process that refreshes the shared snapshot directory. The 
+            flock is released by the kernel when the process exits, so another one takes over. 
+        Returns:
+            bool: True if this process holds the refresher lock
+        """
+        if self._leader is None:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            lock = open(os.path.join(self.snapshot_dir, '.refresher.lock'), 'a')
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                return False
+            self._leader = lock
+            logging.info("Refreshing the shared snapshot directory from this process")
+        return True
+
+    def _attempt(self) -> bool:
+        # Counted so the requests that waited on the lock share the outcome instead of retrying
+        updated = self._update()
+        self._attempts += 1
+        self._failed_at = None if self.snapshot is not None else time.monotonic()
+        return updated
+
+    def _update(self) -> bool:
+        # A fresh saved snapshot makes the download unnecessary
+        if self.snapshot_dir is not None:
+            self._loadSaved()
+            if self.snapshot is not None and (time.monotonic() - self.fetched_at) < self.ttl:
+                return True
+            # Another background refresher downloads for every process sharing the directory
+            if self.running() and not self._lead():
+                return self.snapshot is not None
+        elif self.snapshot is not None and (time.monotonic() - self.fetched_at) < self.ttl:
+            # A snapshot inherited from the process that forked this one is revalidated once its TTL is up
+            return True
+        return self._refresh()
+
+    def _refresh(self) -> bool:
+        snapshot = self.snapshot
+        headers = {}
+        if snapshot is not None:
+            if snapshot.etag:
+                headers['If-None-Match'] = snapshot.etag
+            if snapshot.last_modified:
+                headers['If-Modified-Since'] = snapshot.last_modified
+
+        try:
+            with STAGE_SECONDS.time('download'):
+                r = requests.get(self.source, headers=headers, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        except Exception:
+            UPSTREAM_RESPONSES.inc('error')
+            logging.exception("Failed to refresh the OEM, serving the previous data set")
+            return False
+        UPSTREAM_RESPONSES.inc(str(r.status_code))
+
+        try:
+            if (r.status_code == 304):
+                logging.info("OEM not modified since last download")
+                if self.snapshot_dir is not None:
+                    self._touchSaved()
+            elif (r.status_code == 200):
+                logging.info("HTTP Request Successful")
+                received = [0]
+
+                def chunks():
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        received[0] += len(chunk)
+                        yield chunk
+                # The body is parsed while it downloads instead of being buffered as one string, 
+                # so the parse stage includes the transfer of the body
+                with STAGE_SECONDS.time('parse'):
+                    snapshot = parseEphemeris(chunks(), r.headers.get('ETag'), r.headers.get('Last-Modified'))
+                UPSTREAM_BYTES.observe(received[0])
+                if self.snapshot_dir is not None:
+                    with STAGE_SECONDS.time('save'):
+                        version = self._save(snapshot)
+                    if version is not None:
+                        # The memory-mapped copy is served, so this process shares its pages with the others
+                        snapshot = self._mapSaved(snapshot, version)
+                    # If saving fails, the older saved version must not replace this one later
+                    self.version = version or currentSnapshotVersion(self.snapshot_dir)
+                with STAGE_SECONDS.time('prepare'):
+                    prepareResponses(snapshot)
+                self.snapshot = snapshot
+                if self.archive is not None:
+                    with STAGE_SECONDS.time('archive'):
+                        self._archive(snapshot)
+            else:
+                logging.error(f"Bad HHTP Request {r.status_code}")
+                return False
+        except Exception:
+            logging.exception("Failed to refresh the OEM, serving the previous data set")
+            return False
+        finally:
+            r.close()
+
+        self.fetched_at = time.monotonic()
+        return True
+
+    def _save(self, snapshot:Ephemeris) -> Optional[str]:
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            return saveSnapshot(snapshot, self.snapshot_dir)
+        except OSError:
+            logging.exception("Failed to save the snapshot, it is only kept in memory")
+            return None
+
+    def _mapSaved(self, snapshot:Ephemeris, version:str) -> Ephemeris:
+        try:
+            return loadSnapshot(self.snapshot_dir, version)[0]
+        except (OSError, ValueError, KeyError):
+            logging.exception(f"Failed to map the saved snapshot {version}, serving it from memory")
+            return snapshot
+
+    def _touchSaved(self) -> None:
+        # Followers read the revalidation time from CURRENT, see _loadSaved
+        try:
+            os.utime(os.path.join(self.snapshot_dir, 'CURRENT'))
+        except OSError:
+            pass
+
+    def _archive(self, snapshot:Ephemeris) -> None:
+        try:
+            self.archive.add(snapshot)
+        except (OSError, ValueError):
+            logging.exception("Failed to archive the OEM revision")
+
+    def running(self) -> bool:
+        """Function reports whether the background refresher thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Function starts the background refresher, which loads the OEM immediately and then 
+            revalidates it every TTL seconds off the request path. 
+        """
+        if self.running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ephemeris-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Function stops the background refresher and waits for it to exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+        if self._leader is not None:
+            self._leader.close()
+            self._leader = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                self._attempt()
+            if self.snapshot_dir is not None and self._leader is None:
+                # Following the refresher of another process, whose downloads show up in CURRENT
+                self._stop.wait(min(SNAPSHOT_POLL, self.ttl))
+                continue
+            # A saved snapshot expires sooner than the TTL, a failed refresh is retried after a full TTL
+            remaining = self.fetched_at + self.ttl - time.monotonic()
+            self._stop.wait(remaining if remaining > 0 else self.ttl)
+
+    def clear(self) -> None:
+        """Function drops the cached snapshot so the next access downloads it again."""
+        with self._lock:
+            self.snapshot = None
+            self.version = None
+            self.fetched_at = 0.0
+            self._failed_at = None
+
+archive = EphemerisArchive(ARCHIVE_DIR) if ARCHIVE_DIR else None
+ephemeris = EphemerisCache(DATA_SOURCE, CACHE_TTL, SNAPSHOT_DIR, archive)
+
+def selectStateVectors(limit=None, offset=None, start=None, end=None, after=None) -> Tuple[Optional[Ephemeris], Optional[range]]:
+    """Function selects the rows of the cached ISS epochs with the specified limit and offset. 
+    Args:
+        limit (int): The number of epochs the API should return no more than. 
+        offset (int): The number of data points offset from the beginning. 
+        start (float): Earliest epoch to include, in seconds since the Unix epoch
+        end (float): Latest epoch to include, in seconds since the Unix epoch
+        after (float): Only include epochs after this one (cursor from the previous page)
+    Returns:
+        Tuple[Ephemeris, range]: Snapshot and the selected rows of it. The rows are None when the 
+            limit is not positive, and the snapshot is None when there is no data. 
+    """
+    snapshot = ephemeris.get()
+    if start is not None or end is not None:
+        snapshot = ephemerisCovering(snapshot, start, end)
+    if snapshot is None:
+        return None, None
+
+    # Slicing a range of row numbers keeps the list slicing semantics without building every row
+    data = snapshot.window(start, end, after)
+
+    # If limit is provided, the function takes a slice of state_vectors from offset to offset+limit. 
+    # If only offset is provided, it takes a slice starting from offset to the end of the list. 
+    # If neither limit nor offset is provided, it processes all state_vectors as before.
+
+    if (limit is not None) and (str(limit).isnumeric()) and (int(limit) > len(data)):
+        limit = None 
+
+    if limit is None and offset is None: 
+        # return entire data set
+        rows = data
+    
+    elif limit is None and offset is not None: 
+        # return offset to end of data
+        # last data point is inclusive
+        rows = data[offset:]
+    
+    elif limit > 0 and offset is None: 
+        rows = data[0:limit]
+
+    elif limit > 0 and offset is not None: 
+        rows = data[offset:offset + limit]
+    else:
+        rows = None
+    return snapshot, rows
+
+def getStateVectorData(limit=None, offset=None, start=None, end=None, after=None, fields=STATE_FIELDS) -> List[dict]:
+    """Function returns the cached ISS epochs with the specified limit and offset. Only the 
+        rows of the requested page are serialized. 
+    Args:
+        limit (int): The number of epochs the API should return no more than. 
+        offset (int): The number of data points offset from the beginning. 
+        start (float): Earliest epoch to include, in seconds since the Unix epoch
+        end (float): Latest epoch to include, in seconds since the Unix epoch
+        after (float): Only include epochs after this one (cursor from the previous page)
+        fields (tuple): State vector fields to include besides the EPOCH
+    Returns:
+        List[dict]: List of state vector dictionaries that are filtered based on the provied limit and offset
+    """
+    snapshot, rows = selectStateVectors(limit, offset, start, end, after)
+    if snapshot is None:
+        return None
+    if rows is None:
+        # return empty data set if limit is negative 
+        return [{}] if limit is not None and limit < 0 else None
+    return [snapshot.stateVector(index, fields) for index in rows]
+
+def findEpoch(snapshot:Optional[Ephemeris], epoch:str) -> Optional[int]:
+    """Function finds the row of a specific epoch in the data set. 
+    Args:
+        snapshot (Ephemeris): Snapshot to search
+        epoch (str): Datetime string for specific state vectors
+    Returns:
+        int: Row of the first matching state vector, or None if the epoch is not available
+    """
+    if snapshot is None:
+        return None
+    return snapshot.find(epoch)
+
+def locateEpoch(epoch:str) -> Tuple[Optional[Ephemeris], Optional[int]]:
+    """Function finds an epoch in the current snapshot, or in the archive once it has rolled off. 
+    Args:
+        epoch (str): Datetime string for specific state vectors
+    Returns:
+        Tuple[Ephemeris, int]: Snapshot holding the epoch and its row, the row is None if the epoch is not available
+    """
+    snapshot = ephemeris.get()
+    index = findEpoch(snapshot, epoch)
+    if index is None and archive is not None:
+        return archive.find(epoch)
+    return snapshot, index
+
+def ephemerisCovering(snapshot:Optional[Ephemeris], start:Optional[float], end:Optional[float]) -> Optional[Ephemeris]:
+    """Function picks the data set answering a query between two times: the current snapshot when 
+        it covers them, otherwise the archived state vectors around them (if there is an archive). 
+    Args:
+        snapshot (Ephemeris): Current snapshot
+        start (float): Earliest time of interest in seconds since the Unix epoch, None for no bound
+        end (float): Latest time of interest in seconds since the Unix epoch, None for no bound
+    Returns:
+        Ephemeris: Snapshot to answer the query from
+    """
+    if archive is None:
+        return snapshot
+    # An open bound stands for the edge of the current snapshot, so only a bound past it reads the archive
+    if snapshot is not None and len(snapshot) > 0 and (start is None or snapshot.times[0] <= start) \
+            and (end is None or end <= snapshot.times[-1]):
+        return snapshot
+    # The margin keeps the samples on either side of the range for interpolation
+    history = archive.query(None if start is None else start - ARCHIVE_MARGIN, None if end is None else end + ARCHIVE_MARGIN)
+    return history if history is not None else snapshot
+
+TIME_RANGE = (datetime(1, 1, 1, tzinfo=timezone.utc).timestamp(), 
+              datetime(9999, 12, 31, 23, 59, 59, tzinfo=timezone.utc).timestamp())  # times formatEpoch can represent
+
+def parseTime(value:str) -> float:
+    """Function converts a user supplied time to seconds since the Unix epoch. Accepts OEM epochs 
+        (2024-049T12:00:00.000Z), ISO-8601 datetimes (2024-02-18T12:00:00Z, assumed UTC without an 
+        offset), and plain Unix timestamps. 
+    Args:
+        value (str): Time to convert
+    Returns:
+        float: Seconds since 1970-01-01T00:00:00Z
+    Raises:
+        ValueError: If the value is not a time, or not a finite one between the years 1 and 9999
+    """
+    value = value.strip()
+    try:
+        timestamp = float(value)
+    except ValueError:
+        if EPOCH_PATTERN.match(value):
+            timestamp = parseEpoch(value)
+        else:
+            dt_object = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+            if dt_object.tzinfo is None:
+                dt_object = dt_object.replace(tzinfo=timezone.utc)
+            timestamp = dt_object.timestamp()
+    # Also rejects nan, which fails every comparison
+    if not (TIME_RANGE[0] <= timestamp <= TIME_RANGE[1]):
+        raise ValueError(f"Time {value!r} is outside the supported range")
+    return timestamp
+
+def nearestEpochIndex(times:np.ndarray, timestamp:float, past_only:bool=True) -> Optional[int]:
+    """Function binary searches the sorted epoch times for the epoch nearest to a timestamp. 
+    Args:
+        times (np.ndarray): Sorted epoch times in seconds since the Unix epoch
+        timestamp (float): Time of interest in seconds since the Unix epoch
+        past_only (bool): Only consider epochs strictly before the timestamp
+    Returns:
+        int: Row of the nearest epoch, or None if there is no such epoch
+    """
+    index = int(np.searchsorted(times, timestamp, side='left'))
+    if past_only or index == len(times):
+        return index - 1 if index > 0 else None
+    if index > 0 and (timestamp - times[index - 1]) <= (times[index] - timestamp):
+        return index - 1
+    return index
+
+def getNowEpoch(data, at:Optional[float]=None) -> dict:
+    """Function finds the most up to date epoch compared to execution of program (or a given time). 
+    Args:
+        data (Ephemeris | List[dict]): Snapshot or list of state vector dictionaries sorted by epoch
+        at (float): Time of interest in seconds since the Unix epoch, defaults to now
+    Returns:
+        dict: Dictionary containing the latest epoch before the time of interest
+    """
+    timestamp = time.time() if at is None else at
+    if isinstance(data, Ephemeris):
+        index = nearestEpochIndex(data.times, timestamp)
+        return {} if index is None else data.stateVector(index)
+
+    # Each epoch is parsed once and the latest past epoch is found by bisection
+    times = [parseEpoch(epoch['EPOCH']) for epoch in data]
+    index = bisect.bisect_left(times, timestamp) - 1
+    return data[index] if index >= 0 else {}
+
+def interpolateStateVectors(snapshot:Ephemeris, timestamps) -> Tuple[np.ndarray, np.ndarray]:
+    """Function interpolates position and velocity between the 4 minute OEM samples with a cubic 
+        Hermite spline, which uses both the positions and velocities of the neighbouring samples. 
+        All timestamps are interpolated at once. 
+    Args:
+        snapshot (Ephemeris): Snapshot to interpolate
+        timestamps (array_like): Times of interest in seconds since the Unix epoch
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (m, 3) positions in km and (m, 3) velocities in km/s
+    Raises:
+        ValueError: If a timestamp is outside of the ephemeris window, or inside a gap in it (between 
+            archived revisions) longer than INTERPOLATION_MAX_GAP typical sample spacings
+    """
+    timestamps = np.atleast_1d(np.asarray(timestamps, dtype=np.float64))
+    times = snapshot.times
+    if len(times) < 2 or np.any(timestamps < times[0]) or np.any(timestamps > times[-1]):
+        raise ValueError("Time outside of the ephemeris window")
+
+    index = np.clip(np.searchsorted(times, timestamps, side='right') - 1, 0, len(times) - 2)
+    t0, t1 = times[index], times[index + 1]
+    # The spline is only valid over one sample interval, across a gap it runs off to any distance
+    if np.any((t1 - t0 > INTERPOLATION_MAX_GAP * snapshot.spacing) & (timestamps > t0) & (timestamps < t1)):
+        raise ValueError("Time outside of the ephemeris window")
+    p0, p1 = snapshot.positions[index], snapshot.positions[index + 1]
+    v0, v1 = snapshot.velocities[index], snapshot.velocities[index + 1]
+
+    # Duplicate epochs give a zero length interval; those rows collapse onto the first sample
+    h = t1 - t0
+    safe_h = np.where(h > 0, h, 1.0)
+    s = np.where(h > 0, (timestamps - t0) / safe_h, 0.0)
+    h, safe_h, s = h[:, None], safe_h[:, None], s[:, None]
+    s2, s3 = s*s, s*s*s
+
+    positions = (2*s3 - 3*s2 + 1)*p0 + (s3 - 2*s2 + s)*h*v0 + (-2*s3 + 3*s2)*p1 + (s3 - s2)*h*v1
+    velocities = (6*s2 - 6*s)/safe_h*p0 + (3*s2 - 4*s + 1)*v0 + (-6*s2 + 6*s)/safe_h*p1 + (3*s2 - 2*s)*v1
+    velocities = np.where(h > 0, velocities, v0)
+    return positions, velocities
+
+def calculateSpeed(x_dot:float, y_dot: float, z_dot: float) -> float:
+    """Function computes speed from cartesian velocity vectors
+    Args:
+        x_dot (float): Cartesian velocity vector in the x direction
+        y_dot (float): Cartesian velocity vector in the y direction
+        z_dot (float): Cartesian velocity vector in the z direction
+    Returns:
+        float: Vector speed
+    """
+    speed = math.sqrt(x_dot**2 + y_dot**2 + z_dot**2)
+    return speed
+
+def calculateSpeeds(velocities:np.ndarray) -> np.ndarray:
+    """Function computes the speed of many cartesian velocity vectors at once. 
+    Args:
+        velocities (np.ndarray): (n, 3) X_DOT, Y_DOT, Z_DOT velocity vectors
+    Returns:
+        np.ndarray: (n,) vector speeds
+    """
+    velocities = np.asarray(velocities, dtype=np.float64).reshape(-1, 3)
+    return np.sqrt(np.einsum('ij,ij->i', velocities, velocities))
+
+def greenwichSiderealTime(times:np.ndarray) -> np.ndarray:
+    """Function computes Greenwich mean sidereal time (IAU 1982), treating UTC as UT1. 
+    Args:
+        times (np.ndarray): Times in seconds since the Unix epoch
+    Returns:
+        np.ndarray: Sidereal angle in radians
+    """
+    days = (np.asarray(times, dtype=np.float64) - J2000_EPOCH) / 86400.0
+    centuries = days / 36525.0
+    degrees = 280.46061837 + 360.98564736629*days + 0.000387933*centuries**2 - centuries**3/38710000.0
+    return np.radians(np.mod(degrees, 360.0))
+
+def precessionMatrices(times:np.ndarray) -> np.ndarray:
+    """Function computes the IAU 1976 precession from the J2000 frame to the mean equator of date. 
+    Args:
+        times (np.ndarray): (n,) times in seconds since the Unix epoch
+    Returns:
+        np.ndarray: (n, 3, 3) rotation matrices
+    """
+    centuries = (np.asarray(times, dtype=np.float64) - J2000_EPOCH) / (86400.0*36525.0)
+    arcseconds = np.radians(1/3600.0)
+    zeta = (2306.2181*centuries + 0.30188*centuries**2 + 0.017998*centuries**3) * arcseconds
+    z = (2306.2181*centuries + 1.09468*centuries**2 + 0.018203*centuries**3) * arcseconds
+    theta = (2004.3109*centuries - 0.42665*centuries**2 - 0.041833*centuries**3) * arcseconds
+
+    cos_zeta, sin_zeta = np.cos(zeta), np.sin(zeta)
+    cos_z, sin_z = np.cos(z), np.sin(z)
+    cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+    return np.stack([
+        np.stack([cos_z*cos_theta*cos_zeta - sin_z*sin_zeta, -cos_z*cos_theta*sin_zeta - sin_z*cos_zeta, -cos_z*sin_theta], axis=-1), 
+        np.stack([sin_z*cos_theta*cos_zeta + cos_z*sin_zeta, -sin_z*cos_theta*sin_zeta + cos_z*cos_zeta, -sin_z*sin_theta], axis=-1), 
+        np.stack([sin_theta*cos_zeta, -sin_theta*sin_zeta, cos_theta], axis=-1)
+    ], axis=-2)
+
+def eciToEcef(positions:np.ndarray, times:np.ndarray) -> np.ndarray:
+    """Function rotates J2000 (EME2000) positions into the Earth-fixed frame. Precession and 
+        Earth's sidereal rotation are applied; nutation and polar motion (well under 1 km at 
+        the ISS altitude) are neglected. 
+    Args:
+        positions (np.ndarray): (n, 3) J2000 positions in km
+        times (np.ndarray): (n,) times of the positions in seconds since the Unix epoch
+    Returns:
+        np.ndarray: (n, 3) Earth-fixed positions in km
+    """
+    mean_of_date = np.einsum('nij,nj->ni', precessionMatrices(times), positions)
+    gmst = greenwichSiderealTime(times)
+    cos_gmst, sin_gmst = np.cos(gmst), np.sin(gmst)
+    x, y, z = mean_of_date[:, 0], mean_of_date[:, 1], mean_of_date[:, 2]
+    return np.stack([cos_gmst*x + sin_gmst*y, -sin_gmst*x + cos_gmst*y, z], axis=-1)
+
+def ecefToGeodetic(ecef:np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Function converts Earth-fixed positions to WGS-84 geodetic coordinates (Bowring's method). 
+    Args:
+        ecef (np.ndarray): (n, 3) Earth-fixed positions in km
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Altitude in km, latitude and longitude in degrees
+    """
+    x, y, z = ecef[:, 0], ecef[:, 1], ecef[:, 2]
+    b = WGS84_A * (1 - WGS84_F)
+    e2 = WGS84_F * (2 - WGS84_F)
+    ep2 = e2 / (1 - e2)
+
+    p = np.hypot(x, y)
+    beta = np.arctan2(z * WGS84_A, p * b)
+    latitude = np.arctan2(z + ep2*b*np.sin(beta)**3, p - e2*WGS84_A*np.cos(beta)**3)
+    sin_lat = np.sin(latitude)
+    altitude = p*np.cos(latitude) + z*sin_lat - WGS84_A*np.sqrt(1 - e2*sin_lat**2)
+    longitude = np.arctan2(y, x)
+    return altitude, np.degrees(latitude), np.degrees(longitude)
+
+def calculateLocations(positions:np.ndarray, times:np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Function calculates geodetic altitude, latitude, and longitude for many positions at once. 
+    Args:
+        positions (np.ndarray): (n, 3) J2000 X/Y/Z coordinates of the ISS measured with respect to the center of the earth
+        times (np.ndarray): (n,) times of the positions in seconds since the Unix epoch
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Altitude in km, latitude and longitude in degrees
+    """
+    return ecefToGeodetic(eciToEcef(np.asarray(positions, dtype=np.float64).reshape(-1, 3), np.atleast_1d(times)))
+
+def geodeticToEcef(altitude:np.ndarray, latitude:np.ndarray, longitude:np.ndarray) -> np.ndarray:
+    """Function converts WGS-84 geodetic coordinates to Earth-fixed positions. 
+    Args:
+        altitude (np.ndarray): (m,) altitudes above the ellipsoid in km
+        latitude (np.ndarray): (m,) geodetic latitudes in degrees
+        longitude (np.ndarray): (m,) longitudes in degrees
+    Returns:
+        np.ndarray: (m, 3) Earth-fixed positions in km
+    """
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    e2 = WGS84_F * (2 - WGS84_F)
+    normal = WGS84_A / np.sqrt(1 - e2*np.sin(latitude)**2)
+    return np.stack([(normal + altitude)*np.cos(latitude)*np.cos(longitude), 
+                     (normal + altitude)*np.cos(latitude)*np.sin(longitude), 
+                     (normal*(1 - e2) + altitude)*np.sin(latitude)], axis=-1)
+
+def topocentricFrames(latitude:np.ndarray, longitude:np.ndarray) -> np.ndarray:
+    """Function computes the local east/north/up axes of observers. 
+    Args:
+        latitude (np.ndarray): (m,) geodetic latitudes in degrees
+        longitude (np.ndarray): (m,) longitudes in degrees
+    Returns:
+        np.ndarray: (m, 3, 3) rotation matrices whose rows are the east, north, and up unit vectors
+    """
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    sin_lat, cos_lat, sin_lon, cos_lon = np.sin(latitude), np.cos(latitude), np.sin(longitude), np.cos(longitude)
+    zero = np.zeros_like(latitude)
+    return np.stack([np.stack([-sin_lon, cos_lon, zero], axis=-1), 
+                     np.stack([-sin_lat*cos_lon, -sin_lat*sin_lon, cos_lat], axis=-1), 
+                     np.stack([cos_lat*cos_lon, cos_lat*sin_lon, sin_lat], axis=-1)], axis=-2)
+
+def lookAngles(ecef:np.ndarray, observers:np.ndarray, frames:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Function computes the elevation and azimuth of the ISS seen by observers. 
+    Args:
+        ecef (np.ndarray): (n, 3) Earth-fixed positions of the ISS in km
+        observers (np.ndarray): (n, 3) or (3,) Earth-fixed positions of the observers in km
+        frames (np.ndarray): (n, 3, 3) or (3, 3) east/north/up axes of the observers
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (n,) elevations and azimuths (clockwise from north) in degrees
+    """
+    enu = np.einsum('...ij,...j->...i', frames, ecef - observers)
+    elevation = np.degrees(np.arcsin(enu[..., 2] / np.linalg.norm(enu, axis=-1)))
+    azimuth = np.mod(np.degrees(np.arctan2(enu[..., 0], enu[..., 1])), 360.0)
+    return elevation, azimuth
+
+def predictPasses(snapshot:Ephemeris, observers:List[Tuple[float, float, float]], min_elevation:float=PASS_MIN_ELEVATION, 
+                  start:Optional[float]=None, end:Optional[float]=None) -> List[List[dict]]:
+    """Function predicts the passes of the ISS above observers: the times it rises above and sets 
+        below the minimum elevation, and the time and elevation of its culmination. Elevations are 
+        sampled every PASS_STEP seconds of the interpolated trajectory (shared by all observers), 
+        then every rise, set, and culmination of every observer is refined together. 
+    Args:
+        snapshot (Ephemeris): Snapshot to predict from
+        observers (List[Tuple[float, float, float]]): Latitude and longitude in degrees and altitude in km of each observer
+        min_elevation (float): Elevation in degrees a pass has to reach
+        start (float): Start of the prediction in seconds since the Unix epoch, defaults to the start of the data set
+        end (float): End of the prediction in seconds since the Unix epoch, defaults to the end of the data set
+    Returns:
+        List[List[dict]]: Passes of each observer in time order. Passes already in progress at the start 
+            (or still in progress at the end) have no rise (or set) time. 
+    """
+    if len(snapshot) < 2:
+        return [[] for _ in observers]
+    start = float(snapshot.times[0]) if start is None else max(start, float(snapshot.times[0]))
+    end = float(snapshot.times[-1]) if end is None else min(end, float(snapshot.times[-1]))
+    if end <= start:
+        return [[] for _ in observers]
+
+    # Nothing is interpolated across a gap in the data set, the stretches on either side are predicted separately
+    times = snapshot.times
+    gaps = np.nonzero((np.diff(times) > INTERPOLATION_MAX_GAP * snapshot.spacing) & (times[:-1] < end) & (times[1:] > start))[0]
+    if len(gaps):
+        results = [[] for _ in observers]
+        for first, last in zip([start] + times[gaps + 1].tolist(), times[gaps].tolist() + [end]):
+            for observer_passes, passes in zip(results, predictPasses(snapshot, observers, min_elevation, first, last)):
+                observer_passes.extend(passes)
+        return results
+
+    latitude, longitude, altitude = (np.array(column, dtype=np.float64) for column in zip(*observers))
+    positions, frames = geodeticToEcef(altitude, latitude, longitude), topocentricFrames(latitude, longitude)
+    times = np.append(np.arange(start, end, PASS_STEP), end)
+    iss = eciToEcef(interpolateStateVectors(snapshot, times)[0], times)
+
+    def angles(when, owner):
+        ecef = eciToEcef(interpolateStateVectors(snapshot, when)[0], when)
+        return lookAngles(ecef, positions[owner], frames[owner])
+
+    # Coarse pass for all observers at once: the sine of the elevation is the component of the 
+    # line of sight along the observer's up axis, which two matrix products give for every sample
+    ups = frames[:, 2]
+    height = iss @ ups.T - np.einsum('ij,ij->i', positions, ups)
+    distance = np.sqrt(np.maximum(np.einsum('ij,ij->i', iss, iss)[:, None] - 2 * iss @ positions.T 
+                                  + np.einsum('ij,ij->i', positions, positions), 1e-9))
+    sine = (height / distance).T  # (observers, samples)
+
+    # Runs of samples above the minimum elevation, in time order for each observer
+    above = np.pad(sine >= math.sin(math.radians(min_elevation)), ((0, 0), (1, 1))).astype(np.int8)
+    owner, firsts = np.nonzero(np.diff(above, axis=1) == 1)
+    lasts = np.nonzero(np.diff(above, axis=1) == -1)[1] - 1
+    if len(owner) == 0:
+        return [[] for _ in observers]
+    last_sample = len(times) - 1
+    window = firsts[:, None] + np.arange(int(np.max(lasts - firsts)) + 1)
+    peaks = firsts + np.argmax(np.where(window <= lasts[:, None], sine[owner[:, None], np.minimum(window, last_sample)], -2.0), axis=1)
+
+    # Bisection between the samples on either side of every rise and set, all of them together
+    count = len(owner)
+    both = np.concatenate((owner, owner))
+    rising = np.arange(2 * count) < count
+    low = times[np.concatenate((np.maximum(firsts - 1, 0), lasts))]
+    high = times[np.concatenate((firsts, np.minimum(lasts + 1, last_sample)))]
+    for _ in range(PASS_REFINEMENTS):
+        middle = (low + high) / 2
+        moved = (angles(middle, both)[0] >= min_elevation) == rising
+        high, low = np.where(moved, middle, high), np.where(moved, low, middle)
+    rise, set_ = np.split((low + high) / 2, 2)
+
+    # Golden section search for the highest elevation around the highest sample
+    low, high = times[np.maximum(peaks - 1, 0)], times[np.minimum(peaks + 1, last_sample)]
+    ratio = (math.sqrt(5) - 1) / 2
+    for _ in range(PASS_REFINEMENTS):
+        left, right = high - ratio*(high - low), low + ratio*(high - low)
+        elevation = angles(np.concatenate((left, right)), both)[0]
+        climbing = elevation[:count] < elevation[count:]
+        low, high = np.where(climbing, left, low), np.where(climbing, high, right)
+    culmination = (low + high) / 2
+
+    rise_azimuth = angles(rise, owner)[1]
+    max_elevation, culmination_azimuth = angles(culmination, owner)
+    set_azimuth = angles(set_, owner)[1]
+
+    passes = [[] for _ in observers]
+    for row in range(len(owner)):
+        has_rise, has_set = firsts[row] > 0, lasts[row] < last_sample
+        passes[owner[row]].append({
+            "Rise Time": formatEpoch(rise[row]) if has_rise else None, 
+            "Rise Azimuth [degrees]": round(float(rise_azimuth[row]), 1) if has_rise else None, 
+            "Culmination Time": formatEpoch(culmination[row]), 
+            "Max Elevation [degrees]": round(float(max_elevation[row]), 1), 
+            "Culmination Azimuth [degrees]": round(float(culmination_azimuth[row]), 1), 
+            "Set Time": formatEpoch(set_[row]) if has_set else None, 
+            "Set Azimuth [degrees]": round(float(set_azimuth[row]), 1) if has_set else None, 
+            "Duration [s]": round(float(set_[row] - rise[row]), 1) if has_rise and has_set else None
+        })
+    return passes
+
+def calculateLocation(x:float, y:float, z:float, epoch:str) -> dict:
+    """Function calculates the geolocation of the ISS from 
+        the x/y/z coordinates recorded with respect to the center of the earth. 
+    Args:
+        x (float): X coordinate of the ISS measured with respect to the center of the earth
+        y (float): Y coordinate of the ISS measured with respect to the center of the earth
+        z (float): Z coordinate of the ISS measured with respect to the center of the earth
+        epoch (str): The current datetime in which the x/y/z coordinates were extracted from
+    Returns:
+        dict: Dcictionary containing geolocation details of the ISS
+    """
+
+    altitudes, latitudes, longitudes = calculateLocations(np.array([[x, y, z]]), np.array([parseEpoch(epoch)]))
+    return describeLocation(float(altitudes[0]), float(latitudes[0]), float(longitudes[0]), epoch)
 
-app = Flask(__name__)
+# Seas are listed before the oceans that contain them; boxes are (west, south, east, north) in degrees
+WATER_REGIONS = [
+    ("Mediterranean Sea", (-6.0, 30.0, 36.5, 46.0)), 
+    ("Black Sea", (27.4, 40.9, 41.8, 46.8)), 
+    ("Caspian Sea", (46.6, 36.5, 54.9, 47.2)), 
+    ("Red Sea", (32.3, 12.5, 43.5, 30.0)), 
+    ("Persian Gulf", (47.6, 23.9, 56.5, 30.5)), 
+    ("Arabian Sea", (51.0, 5.0, 77.0, 25.5)), 
+    ("Bay of Bengal", (79.8, 5.0, 95.0, 23.0)), 
+    ("Andaman Sea", (92.0, 5.0, 99.0, 16.5)), 
+    ("South China Sea", (99.0, 0.0, 121.0, 23.0)), 
+    ("Java Sea", (105.0, -7.0, 118.0, -3.0)), 
+    ("East China Sea", (117.0, 23.0, 131.0, 33.5)), 
+    ("Yellow Sea", (117.5, 33.5, 127.0, 41.0)), 
+    ("Sea of Japan", (127.0, 33.5, 142.5, 52.0)), 
+    ("Sea of Okhotsk", (135.0, 44.0, 163.0, 62.0)), 
+    ("Philippine Sea", (121.0, 5.0, 145.0, 33.5)), 
+    ("Bering Sea", (162.0, 52.0, 180.0, 66.5)), 
+    ("Bering Sea", (-180.0, 52.0, -157.0, 66.5)), 
+    ("Gulf of Alaska", (-160.0, 50.0, -130.0, 61.0)), 
+    ("Hudson Bay", (-95.0, 51.0, -76.0, 64.0)), 
+    ("Gulf of Mexico", (-98.0, 18.0, -80.5, 31.0)), 
+    ("Caribbean Sea", (-89.0, 9.0, -60.0, 22.0)), 
+    ("Baltic Sea", (9.5, 53.0, 30.5, 66.0)), 
+    ("North Sea", (-4.0, 51.0, 9.5, 61.0)), 
+    ("Coral Sea", (145.0, -30.0, 165.0, -9.0)), 
+    ("Tasman Sea", (147.0, -47.0, 175.0, -30.0)), 
+]
 
-def getStateVectorData(limit=None, offset=None) -> List[dict]:
-    """Function GETS ISS data from NASA Website and returns a list of epochs with the specified limit and offset. 
+def bodyOfWater(latitude:float, longitude:float) -> str:
+    """Function names the sea or ocean at a position already known not to be on land. 
     Args:
-        limit (int): The number of epochs the API should return no more than. 
-        offset (int): The number of data points offset from the beginning. 
+        latitude (float): Latitude in degrees
+        longitude (float): Longitude in degrees
     Returns:
-        List[dict]: List of state vector dictionaries that are filtered based on the provied limit and offset
+        str: Name of the body of water
     """
-    r = requests.get(DATA_SOURCE)
-    if (r.status_code == 200):
-        logging.info("HTTP Request Successful")
+    for name, (west, south, east, north) in WATER_REGIONS:
+        if west <= longitude <= east and south <= latitude <= north:
+            return name
+    if latitude >= 66.5:
+        return "Arctic Ocean"
+    if latitude <= -60.0:
+        return "Southern Ocean"
+    hemisphere = "North" if latitude >= 0 else "South"
+    if latitude >= 0:
+        if -83.0 <= longitude < 20.0:
+            return f"{hemisphere} Atlantic Ocean"
+        if 20.0 <= longitude < 100.0:
+            return "Indian Ocean"
+    else:
+        if -70.0 <= longitude < 20.0:
+            return f"{hemisphere} Atlantic Ocean"
+        if 20.0 <= longitude < 147.0:
+            return "Indian Ocean"
+    return f"{hemisphere} Pacific Ocean"
 
-        # Store XML data into a list of dictionaries
-        xml_data = xmltodict.parse(r.text)
-        state_vectors:list = xml_data['ndm']['oem']['body']['segment']['data']['stateVector']
-        data = []
+class NominatimGeocoder:
+    """Reverse geocoder backed by the public Nominatim service (one network request per lookup). 
+        At most `concurrency` lookups are in flight; the others wait up to `timeout` seconds for 
+        a slot and then give up, so a slow service cannot hold on to every request thread. 
+    """
+    land_coverage = True
 
-        # Each state vector lists the time in UTC; position X, Y, and Z in km; and velocity X, Y, and Z in km/s.
-        for state_vector in state_vectors:           
-            state_dict = {
-                'EPOCH': state_vector['EPOCH'],
-                'X': state_vector['X'],
-                'Y': state_vector['Y'],
-                'Z': state_vector['Z'],
-                'X_DOT': state_vector['X_DOT'],
-                'Y_DOT': state_vector['Y_DOT'],
-                'Z_DOT': state_vector['Z_DOT'],
-            }
-            data.append(state_dict)
-
-        # If limit is provided, the function takes a slice of state_vectors from offset to offset+limit. 
-        # If only offset is provided, it takes a slice starting from offset to the end of the list. 
-        # If neither limit nor offset is provided, it processes all state_vectors as before.
-
-        if (limit is not None) and (str(limit).isnumeric()) and (int(limit) > len(data)):
-            limit = None 
-
-        if limit is None and offset is None: 
-            # return entire data set
-            return data
-        
-        if limit is None and offset is not None: 
-            # return offset to end of data
-            # last data point is inclusive
-            return data[offset:]
-        
-        if limit > 0 and offset is None: 
-            return data[0:limit]
+    def __init__(self, concurrency:int=GEOCODE_CONCURRENCY, timeout:float=GEOCODE_TIMEOUT):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(concurrency)
+
+    def reverse(self, latitude:float, longitude:float) -> Optional[dict]:
+        """Function returns the Nominatim address of a position. 
+        Args:
+            latitude (float): Latitude in degrees
+            longitude (float): Longitude in degrees
+        Returns:
+            dict: Address with city, state, country, and country_code keys, or None when not on land
+        Raises:
+            GeopyError: If the service fails, times out, or is busy with other lookups
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise GeocoderTimedOut("Too many reverse geocoding requests in flight")
+        try:
+            geoposition = geolocator.reverse(f"{latitude}, {longitude}", zoom=18, language='en')
+        finally:
+            self._slots.release()
+        if geoposition is None:
+            return None
+        return geoposition.raw['address']
+
+class LocalGeocoder:
+    """Offline reverse geocoder over a GeoJSON file of country or state/province polygons 
+        (for example Natural Earth admin-0 or admin-1). Polygons are bucketed into a grid of 
+        GEOCODER_CELL degree cells so a lookup only tests the few polygons covering its cell. 
+    """
+    def __init__(self, path:Optional[str]):
+        self.path = path
+        self.features = []
+        self.cells = {}
+        if path:
+            try:
+                self.load(path)
+            except (OSError, ValueError, KeyError):
+                logging.exception(f"Failed to load geocoder data from {path}")
+        if not self.features:
+            logging.warning("Local geocoder has no land polygons, locations will not be resolved")
+
+    @property
+    def land_coverage(self) -> bool:
+        return bool(self.features)
 
-        if limit > 0 and offset is not None: 
-            return data[offset:offset + limit]
+    def load(self, path:str) -> None:
+        """Function reads the GeoJSON features and builds the grid index. 
+        Args:
+            path (str): Path to a GeoJSON FeatureCollection
+        """
+        with open(path, encoding='utf-8') as f:
+            collection = json.load(f)
+
+        for feature in collection['features']:
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') == 'Polygon':
+                polygons = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiPolygon':
+                polygons = geometry['coordinates']
+            else:
+                continue
+
+            address = self.address(feature.get('properties') or {})
+            for polygon in polygons:
+                rings = [self.ring(ring) for ring in polygon if len(ring) >= 3]
+                if not rings:
+                    continue
+                xs = np.array(polygon[0], dtype=np.float64)
+                bbox = (xs[:, 0].min(), xs[:, 1].min(), xs[:, 0].max(), xs[:, 1].max())
+                self.features.append((address, bbox, rings))
+                entry = len(self.features) - 1
+                for cell_x in range(self.cell(bbox[0]), self.cell(bbox[2]) + 1):
+                    for cell_y in range(self.cell(bbox[1]), self.cell(bbox[3]) + 1):
+                        self.cells.setdefault((cell_x, cell_y), []).append(entry)
+
+    @staticmethod
+    def cell(degrees:float) -> int:
+        return int(math.floor(degrees / GEOCODER_CELL))
+
+    @staticmethod
+    def ring(coordinates:list) -> tuple:
+        xs = np.array(coordinates, dtype=np.float64)
+        x1, y1 = xs[:, 0], xs[:, 1]
+        return (x1, y1, np.roll(x1, -1), np.roll(y1, -1))
+
+    @staticmethod
+    def address(properties:dict) -> dict:
+        """Function maps GeoJSON properties (Natural Earth naming) onto Nominatim style address keys."""
+        def first(*keys):
+            for key in keys:
+                value = properties.get(key)
+                if value not in (None, '', '-99'):
+                    return value
+            return None
+
+        country = first('admin', 'ADMIN', 'NAME_LONG', 'NAME', 'name')
+        # Only admin-1 (state/province) files carry a region name next to the country name
+        name = first('name', 'NAME_1')
+        state = name if ('admin' in properties or 'NAME_1' in properties) and name != country else None
+        code = first('iso_a2', 'ISO_A2', 'ISO_A2_EH')
+        return {'city': '', 'state': state or '', 'country': country or '', 'country_code': code.lower() if code else None}
+
+    @staticmethod
+    def contains(rings:list, longitude:float, latitude:float) -> bool:
+        """Function tests a point against a polygon and its holes with vectorized ray casting."""
+        inside = False
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for x1, y1, x2, y2 in rings:
+                crosses = ((y1 > latitude) != (y2 > latitude)) & (longitude < (x2 - x1) * (latitude - y1) / (y2 - y1) + x1)
+                if np.count_nonzero(crosses) % 2 == 1:
+                    inside = not inside
+        return inside
 
-        if limit < 0:
-            # return empty data set if limit is negative 
-            return [{}]
-    else:       
-        logging.error(f"Bad HHTP Request {r.status_code}")
+    def reverse(self, latitude:float, longitude:float) -> Optional[dict]:
+        """Function returns the address of the polygon containing a position. 
+        Args:
+            latitude (float): Latitude in degrees
+            longitude (float): Longitude in degrees
+        Returns:
+            dict: Address with city, state, country, and country_code keys, or None when not on land
+        """
+        for entry in self.cells.get((self.cell(longitude), self.cell(latitude)), ()):
+            address, (west, south, east, north), rings = self.features[entry]
+            if west <= longitude <= east and south <= latitude <= north and self.contains(rings, longitude, latitude):
+                return address
         return None
 
-def getNowEpoch(data:List[dict]) -> dict:
-    """Function finds the most up to date epoch compared to execution of program and prints data.
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+def geohash(latitude:float, longitude:float, precision:int) -> str:
+    """Function encodes a position as a geohash, naming the grid cell that contains it. 
     Args:
-        data (List[dict]): List of state vectore dictionaries
+        latitude (float): Latitude in degrees
+        longitude (float): Longitude in degrees
+        precision (int): Number of characters, each one shrinks the cell (5 is about 5 km x 5 km)
     Returns:
-        dict: Dictionary containing epoch information closest to the time of the program's execution
+        str: Geohash of the cell
     """
-    now_utc = datetime.now(timezone.utc)
-    formatted_now = now_utc.strftime("%Y-%jT%H:%M:%S.%fZ")
-    min_diff = float('inf')
-    stored_epoch = {}
-    # Parse through data and find the epoch containing the data closest to current time
-    for epoch in data: 
-        epochTime = epoch['EPOCH']
-        timestamp1 = datetime.strptime(formatted_now, "%Y-%jT%H:%M:%S.%fZ")
-        timestamp2 = datetime.strptime(epochTime, "%Y-%jT%H:%M:%S.%fZ")
-        time_diff = (timestamp1 - timestamp2).total_seconds()
-        if (time_diff <= 0):
-            break
+    south, north, west, east = -90.0, 90.0, -180.0, 180.0
+    characters = []
+    bits, value, even = 0, 0, True
+    while len(characters) < precision:
+        if even:
+            middle = (west + east) / 2
+            value = value*2 + (longitude >= middle)
+            west, east = (middle, east) if longitude >= middle else (west, middle)
         else:
-            if(time_diff < min_diff):
-                min_diff = time_diff
-                stored_epoch = epoch
-    return stored_epoch
+            middle = (south + north) / 2
+            value = value*2 + (latitude >= middle)
+            south, north = (middle, north) if latitude >= middle else (south, middle)
+        even = not even
+        bits += 1
+        if bits == 5:
+            characters.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(characters)
 
-def calculateSpeed(x_dot:float, y_dot: float, z_dot: float) -> float:
-    """Function computes speed from cartesian velocity vectors
-    Args:
-        x_dot (float): Cartesian velocity vector in the x direction
-        y_dot (float): Cartesian velocity vector in the y direction
-        z_dot (float): Cartesian velocity vector in the z direction
+@dataclass
+class _Flight:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: object = None
+    error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key: the first caller runs the call and the 
+        callers arriving while it runs wait for its result instead of repeating it. 
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> _Flight
+
+    def do(self, key, function, timeout:Optional[float]=None) -> Tuple[object, bool]:
+        """Function runs function() unless a call for the same key is already running. 
+        Args:
+            key: Identity of the call
+            function (callable): Call to run
+            timeout (float): Seconds a waiting caller waits for the running call, None to wait for it
+        Returns:
+            Tuple[object, bool]: Result of the call, and whether this caller ran it
+        Raises:
+            TimeoutError: If the running call did not finish in time
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            if not flight.done.wait(timeout):
+                raise TimeoutError(f"Timed out waiting for the call in flight for {key!r}")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, False
+
+        try:
+            flight.result = function()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, True
+
+class GeocodeCache:
+    """Bounded LRU cache in front of a reverse geocoder. Positions are bucketed by geohash so 
+        nearby lookups share one entry, and misses over water are cached too. Entries expire 
+        after the TTL, and the cache can be saved to a JSON file so a restart starts warm. 
+    """
+    def __init__(self, backend, precision:int, size:int, ttl:float, path:Optional[str]=None):
+        self.backend = backend
+        self.precision = precision
+        self.size = size
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # geohash -> (time stored, address)
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._unsaved = 0
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    @property
+    def land_coverage(self) -> bool:
+        return self.backend.land_coverage
+
+    def reverse(self, latitude:float, longitude:float) -> Optional[dict]:
+        """Function returns the cached address of the cell containing a position, asking the backend on a miss. 
+        Args:
+            latitude (float): Latitude in degrees
+            longitude (float): Longitude in degrees
+        Returns:
+            dict: Address with city, state, country, and country_code keys, or None when not on land
+        """
+        key = geohash(latitude, longitude, self.precision)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (time.time() - entry[0]) < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        # Concurrent misses on the same cell share one backend lookup
+        address, looked_up = self._flights.do(key, lambda: self.backend.reverse(latitude, longitude), GEOCODE_TIMEOUT)
+        with self._lock:
+            if not looked_up:
+                self.hits += 1
+                return address
+            self.misses += 1
+            self._entries[key] = (time.time(), address)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+            self._unsaved += 1
+            save = self.path is not None and self._unsaved >= GEOCODE_CACHE_SAVE_EVERY
+        if save:
+            self.save()
+        return address
+
+    def stats(self) -> dict:
+        """Function reports the cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, 
+                    "hit ratio": self.hits / lookups if lookups else 0.0}
+
+    def load(self) -> None:
+        """Function restores unexpired entries saved by a previous run."""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logging.exception(f"Failed to load the geocode cache from {self.path}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, (stored, address) in sorted(saved.items(), key=lambda item: item[1][0]):
+                if now - stored < self.ttl:
+                    self._entries[key] = (stored, address)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def save(self) -> None:
+        """Function writes the cache to disk, replacing the previous file atomically. Processes sharing 
+            the file save one at a time, and the unexpired entries they saved are merged in, the newer 
+            entry winning when both have the same cell. 
+        """
+        with self._lock:
+            saved = dict(self._entries)
+            self._unsaved = 0
+        try:
+            with fileLock(f"{self.path}.lock"):
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        previous = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    previous = {}
+                now = time.time()
+                for key, (stored, address) in previous.items():
+                    if now - stored < self.ttl and (key not in saved or saved[key][0] < stored):
+                        saved[key] = (stored, address)
+                if len(saved) > self.size:
+                    saved = dict(sorted(saved.items(), key=lambda item: item[1][0])[-self.size:])
+                writeAtomic(self.path, lambda f: f.write(json.dumps(saved).encode()))
+        except OSError:
+            logging.exception(f"Failed to save the geocode cache to {self.path}")
+
+def createGeocoder():
+    """Function builds the reverse geocoder selected by the ISS_GEOCODER environment variable. 
     Returns:
-        float: Vector speed
+        GeocodeCache | NominatimGeocoder | LocalGeocoder: Reverse geocoder, cached unless ISS_GEOCODE_CACHE_SIZE is 0
     """
-    speed = math.sqrt(x_dot**2 + y_dot**2 + z_dot**2)
-    return speed
+    if GEOCODER == 'local':
+        backend = LocalGeocoder(GEOCODER_DATA)
+    else:
+        if GEOCODER != 'nominatim':
+            logging.warning(f"Unknown geocoder {GEOCODER!r}, using Nominatim")
+        backend = NominatimGeocoder()
+    if GEOCODE_CACHE_SIZE <= 0:
+        return backend
+    return GeocodeCache(backend, GEOCODE_PRECISION, GEOCODE_CACHE_SIZE, GEOCODE_CACHE_TTL, GEOCODE_CACHE_FILE)
 
-def calculateLocation(x:float, y:float, z:float, epoch:str) -> dict:
-    """Function calculates the geolocation of the ISS from 
-        the x/y/z coordinates recorded with respect to the center of the earth. 
+geocoder = createGeocoder()
+
+def describeLocation(altitude:float, latitude:float, longitude:float, epoch:str) -> dict:
+    """Function reverse geocodes a ground position and formats the location response. 
     Args:
-        x (float): X coordinate of the ISS measured with respect to the center of the earth
-        y (float): Y coordinate of the ISS measured with respect to the center of the earth
-        z (float): Z coordinate of the ISS measured with respect to the center of the earth
-        epoch (str): The current datetime in which the x/y/z coordinates were extracted from
+        altitude (float): Altitude of the ISS in km
+        latitude (float): Geodetic latitude of the ISS in degrees
+        longitude (float): Longitude of the ISS in degrees
+        epoch (str): The datetime of the position
     Returns:
         dict: Dcictionary containing geolocation details of the ISS
     """
-
-    # Parse the string into a datetime object
-    dt_object = datetime.strptime(epoch, '%Y-%jT%H:%M:%S.%fZ')
-
-    # Extract hours and minutes
-    hours = dt_object.hour
-    minutes = dt_object.minute
-
-    altitude = math.sqrt(x**2 + y**2 + z**2) - EARTH_RADIUS # km
-    latitude = math.degrees(math.atan2(z, math.sqrt(x**2 + y**2))) 
-    longitude = math.degrees(math.atan2(y, x)) - ((hours - 12) + (minutes/60))*(360/24) + 19
-    if longitude > 180: 
-        longitude = -180 + (longitude - 180)
-    if longitude < -180: 
-        longitude = 180 + (longitude + 180)
-    
-    location_tuple_string = f"{latitude}, {longitude}"
-    geoposition = geolocator.reverse(location_tuple_string, zoom=18, language='en')
+    try:
+        with STAGE_SECONDS.time('geocode'):
+            address = geocoder.reverse(latitude, longitude)
+        reachable = True
+    except (GeopyError, TimeoutError):
+        logging.warning("Reverse geocoding failed", exc_info=True)
+        address, reachable = None, False
 
     now_utc = datetime.now(timezone.utc)
     formatted_now = now_utc.strftime('%Y-%jT%H:%M:%S.%f')[:-3] + 'Z'
 
-    if geoposition is not None: 
-        address = geoposition.raw['address']
+    if address is not None: 
         city = address.get('city', '')
         state = address.get('state', '')
         country = address.get('country', '')
         code = address.get('country_code')
-
-        iss_location = {
-            "Epoch Time": epoch, 
-            "Current Time": formatted_now, 
-            "Altitude [km]": round(altitude,3), 
-            "Longitude [degrees]": round(longitude,3), 
-            "Latitude [degrees]": round(latitude,3), 
-            "Geoposition": {"City": city, "State": state, "Country": country, "Country Code": code}
-        }
-        
-        return iss_location
-    
-    # TODO - Find a geodecoder that wll determine what body of water
+        geoposition = {"City": city, "State": state, "Country": country, "Country Code": code}
+    elif reachable and geocoder.land_coverage:
+        geoposition = {"Body of Water": bodyOfWater(latitude, longitude)}
     else:
-        iss_location = {
+        geoposition = "No Location Data for the ISS at the moment"
+
+    iss_location = {
         "Epoch Time": epoch, 
         "Current Time": formatted_now, 
         "Altitude [km]": round(altitude,3), 
         "Longitude [degrees]": round(longitude,3), 
         "Latitude [degrees]": round(latitude,3), 
-        "Geoposition": "No Location Data for the ISS at the moment"
+        "Geoposition": geoposition
     }
-        
-        return iss_location
+    return iss_location
+
+def dumpJSON(value) -> bytes:
+    """Function serializes a value to compact JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode()
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """JSON payload serialized and compressed once per snapshot."""
+    body: bytes
+    gzip: bytes
+    brotli: Optional[bytes]
+    etag: str
+
+# Payloads that only change with the snapshot, by name
+CACHED_PAYLOADS = {
+    'epochs': lambda snapshot: [snapshot.stateVector(index) for index in range(len(snapshot))], 
+    'header': lambda snapshot: snapshot.header, 
+    'metadata': lambda snapshot: snapshot.metadata, 
+    'comment': lambda snapshot: snapshot.comments, 
+}
+_responses_lock = threading.Lock()
+
+def cachedResponse(snapshot:Ephemeris, name:str) -> CachedResponse:
+    """Function returns a snapshot's serialized and compressed payload, building it on first use. 
+    Args:
+        snapshot (Ephemeris): Snapshot the payload is built from
+        name (str): Key of CACHED_PAYLOADS
+    Returns:
+        CachedResponse: Payload with its gzip/brotli variants and strong ETag
+    """
+    cached = snapshot.responses.get(name)
+    if cached is not None:
+        return cached
+    with _responses_lock:
+        cached = snapshot.responses.get(name)
+        if cached is None:
+            body = dumpJSON(CACHED_PAYLOADS[name](snapshot))
+            cached = CachedResponse(
+                body=body, 
+                gzip=gzip.compress(body, compresslevel=6, mtime=0), 
+                brotli=brotli.compress(body, quality=BROTLI_QUALITY) if brotli is not None else None, 
+                etag=hashlib.sha1(body).hexdigest())
+            snapshot.responses[name] = cached
+    return cached
+
+def prepareResponses(snapshot:Ephemeris) -> None:
+    """Function builds every cached payload of a snapshot before it starts serving requests."""
+    for name in CACHED_PAYLOADS:
+        cachedResponse(snapshot, name)
+
+def serveCached(snapshot:Ephemeris, name:str) -> Response:
+    """Function answers a request with a cached payload, picking the compressed variant the client 
+        accepts and replying 304 Not Modified when the client already has it. 
+    Args:
+        snapshot (Ephemeris): Snapshot the payload is built from
+        name (str): Key of CACHED_PAYLOADS
+    Returns:
+        Response: JSON, gzip or brotli encoded response
+    """
+    cached = cachedResponse(snapshot, name)
+    if cached.brotli is not None and request.accept_encodings['br'] > 0:
+        body, encoding, etag = cached.brotli, 'br', f'"{cached.etag}-br"'
+    elif request.accept_encodings['gzip'] > 0:
+        body, encoding, etag = cached.gzip, 'gzip', f'"{cached.etag}-gz"'
+    else:
+        body, encoding, etag = cached.body, None, f'"{cached.etag}"'
+
+    headers = {'ETag': etag, 'Vary': 'Accept-Encoding'}
+    if request.if_none_match.contains_weak(etag.strip('"')):
+        return Response(status=304, headers=headers)
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype='application/json', headers=headers)
+
+WIRE_FORMATS = {  # ?format= name -> media type
+    'json': 'application/json', 
+    'csv': 'text/csv', 
+    'npy': 'application/x-npy', 
+    'msgpack': 'application/msgpack', 
+    'arrow': 'application/vnd.apache.arrow.stream', 
+    'ndjson': 'application/x-ndjson', 
+}
+COLUMN_FORMATS = ('json', 'csv', 'npy', 'msgpack', 'arrow')  # formats of routes that return columns rather than rows
+
+def requestedFormat(formats=tuple(WIRE_FORMATS)) -> str:
+    """Function negotiates the response format from ?format= or else the Accept header, 
+        defaulting to JSON. 
+    Args:
+        formats (tuple): Names of the formats the route supports, JSON first
+    Returns:
+        str: Name of the format, a key of WIRE_FORMATS
+    Raises:
+        ValueError: If ?format= names an unknown format
+    """
+    name = request.args.get('format')
+    if name is not None:
+        if name not in formats:
+            raise ValueError(f"Format must be one of {', '.join(formats)}")
+        return name
+    # JSON is listed first so it wins for */* and equally weighted types
+    media_types = {WIRE_FORMATS[name]: name for name in formats}
+    if 'msgpack' in formats:
+        media_types['application/x-msgpack'] = 'msgpack'
+    return media_types[request.accept_mimetypes.best_match(list(media_types), default='application/json')]
+
+def wireResponse(wire:str, time_name:str, times:np.ndarray, columns:dict, units:dict, 
+                 epochs:Optional[list]=None, text:Optional[dict]=None) -> Response:
+    """Function encodes columns in a binary or CSV wire format straight from the arrays, without 
+        building a dictionary per row. 
+    Args:
+        wire (str): 'csv', 'npy', 'msgpack', or 'arrow'
+        time_name (str): Name of the time column
+        times (np.ndarray): (n,) times in seconds since the Unix epoch
+        columns (dict): Column name -> (n,) float64 array
+        units (dict): Column name -> units, kept in the msgpack and Arrow metadata
+        epochs (list): Epoch strings of the times (str or bytes), formatted from the times when not given
+        text (dict): Column name -> (n,) bytes array with the original text, used for CSV instead of the floats
+    Returns:
+        Response: Encoded columns, or 406 when the package the format needs is not installed
+    """
+    missing = {'msgpack': 'msgpack' if msgpack is None else None, 'arrow': 'pyarrow' if pyarrow is None else None}.get(wire)
+    if missing is not None:
+        return Response(f"Error: The {wire} format requires the {missing} package \n", status=406, mimetype='text/plain')
+    milliseconds = np.rint(np.asarray(times, dtype=np.float64) * 1000).astype(np.int64)
+
+    if wire == 'csv':
+        if epochs is None:
+            epochs = [formatEpoch(timestamp) for timestamp in times.tolist()]
+        cells = [[epoch if isinstance(epoch, bytes) else epoch.encode() for epoch in epochs]]
+        for name, values in columns.items():
+            cells.append(text[name].tolist() if text and name in text else [repr(value).encode() for value in values.tolist()])
+        lines = [b','.join([time_name.encode()] + [name.encode() for name in columns])]
+        lines.extend(b','.join(row) for row in zip(*cells))
+        body = b'\n'.join(lines) + b'\n'
+    elif wire == 'npy':
+        table = np.empty(len(milliseconds), dtype=[(time_name, 'M8[ms]')] + [(name, 'f8') for name in columns])
+        table[time_name] = milliseconds.view('M8[ms]')
+        for name, values in columns.items():
+            table[name] = values
+        buffer = io.BytesIO()
+        np.save(buffer, table, allow_pickle=False)
+        body = buffer.getvalue()
+    elif wire == 'msgpack':
+        if epochs is None:
+            epochs = [formatEpoch(timestamp) for timestamp in times.tolist()]
+        table = {time_name: [epoch.decode() if isinstance(epoch, bytes) else epoch for epoch in epochs]}
+        table.update((name, values.tolist()) for name, values in columns.items())
+        table['units'] = units
+        body = msgpack.packb(table)
+    else:
+        arrays = [pyarrow.array(milliseconds, type=pyarrow.timestamp('ms', tz='UTC'))]
+        arrays.extend(pyarrow.array(np.ascontiguousarray(values, dtype=np.float64)) for values in columns.values())
+        table = pyarrow.Table.from_arrays(arrays, names=[time_name] + list(columns), 
+                                          metadata={'units': json.dumps(units)})
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        body = sink.getvalue().to_pybytes()
+    return Response(body, mimetype=WIRE_FORMATS[wire])
+
+def epochFilters() -> dict:
+    """Function reads the ?start=, ?end=, ?after= and ?fields= query parameters of /epochs. 
+    Returns:
+        dict: Keyword arguments for getStateVectorData
+    Raises:
+        ValueError: If a parameter is invalid, with the message to show the user
+    """
+    filters = {}
+    for name in ('start', 'end', 'after'):
+        if name in request.args:
+            try:
+                filters[name] = parseTime(request.args[name])
+            except ValueError:
+                raise ValueError(f"{name.capitalize()} must be a valid time")
+    if 'fields' in request.args:
+        fields = tuple(name.strip().upper() for name in request.args['fields'].split(',') if name.strip())
+        if not all(name in STATE_FIELDS for name in fields):
+            raise ValueError(f"Fields must be a comma separated list of {', '.join(STATE_FIELDS)}")
+        filters['fields'] = fields
+    return filters
+
+def epochColumns(wire:str, filters:dict) -> Response:
+    """Function returns the /epochs rows selected by the query parameters as columns in a binary or 
+        CSV wire format. CSV keeps the numbers exactly as NASA published them. 
+    Args:
+        wire (str): 'csv', 'npy', 'msgpack', or 'arrow'
+        filters (dict): Keyword arguments returned by epochFilters
+    Returns:
+        Response: Encoded EPOCH column and state vector columns
+    """
+    try:
+        limit = None if request.args.get('limit') is None else int(request.args['limit'])
+    except ValueError:
+        return "Error: Limit must be an integer \n"
+    try:
+        offset = None if request.args.get('offset') is None else int(request.args['offset'])
+    except ValueError:
+        return "Error: Offset must be an integer \n"
+    requested = filters.pop('fields', STATE_FIELDS)
+    fields = [name for name in STATE_FIELDS if name in requested]
+
+    snapshot, rows = selectStateVectors(limit, offset, **filters)
+    if snapshot is None:
+        return "Epoch not available \n"
+    rows = slice(0, 0) if rows is None else slice(rows.start, rows.stop, rows.step)
+    columns, text, units = {}, {}, {}
+    for name in fields:
+        column = STATE_FIELDS.index(name)
+        values = snapshot.positions if column < 3 else snapshot.velocities
+        columns[name] = values[rows, column % 3]
+        text[name] = snapshot.text[rows, column]
+        units[name] = snapshot.units[column]
+    return wireResponse(wire, 'EPOCH', snapshot.times[rows], columns, units, snapshot.epochs[rows].tolist(), text)
+
+def streamStateVectors(wire:str, limit=None, offset=None, start=None, end=None, after=None, fields=STATE_FIELDS) -> Response:
+    """Function streams the cached ISS epochs with the specified limit and offset as a JSON array or as 
+        NDJSON (one state vector per line). Rows are serialized STREAM_BATCH_ROWS at a time while the 
+        response is sent, so the first byte does not wait for the last row and the page is never held in memory. 
+    Args:
+        wire (str): 'json' or 'ndjson'
+        limit (int): The number of epochs the API should return no more than. 
+        offset (int): The number of data points offset from the beginning. 
+        start (float): Earliest epoch to include, in seconds since the Unix epoch
+        end (float): Latest epoch to include, in seconds since the Unix epoch
+        after (float): Only include epochs after this one (cursor from the previous page)
+        fields (tuple): State vector fields to include besides the EPOCH
+    Returns:
+        Response: Streamed state vector dictionaries
+    """
+    if limit == 0:
+        # No rows are asked for, so the answer does not depend on any data having been loaded
+        return jsonify([]) if wire == 'json' else Response(b'', mimetype=WIRE_FORMATS[wire])
+    snapshot, rows = selectStateVectors(limit, offset, start, end, after)
+    if snapshot is None:
+        return "Epoch not available \n"
+    if rows is None:
+        # return empty data set if limit is negative, and no rows if it is zero
+        payload = [{}] if limit < 0 else []
+        if wire == 'json':
+            return jsonify(payload)
+        return Response(b''.join(dumpJSON(row) + b'\n' for row in payload), mimetype=WIRE_FORMATS[wire])
+    
+    # The generator keeps its own reference to the snapshot, so a refresh mid-stream cannot mix data sets
+    def generate():
+        separator = b'\n' if wire == 'ndjson' else b','
+        if wire == 'json':
+            yield b'['
+        for first in range(0, len(rows), STREAM_BATCH_ROWS):
+            chunk = separator.join(dumpJSON(snapshot.stateVector(index, fields)) 
+                                   for index in rows[first:first + STREAM_BATCH_ROWS])
+            yield chunk if first == 0 else separator + chunk
+        if wire == 'json':
+            yield b']'
+        elif len(rows):
+            yield b'\n'
+    return Response(generate(), mimetype=WIRE_FORMATS[wire])
 
 # curl http://127.0.0.1:5000/epochs
 # curl -X GET http://127.0.0.1:5000/epochs
 # curl 'http://127.0.0.1:5000/epochs?limit=int&offset=int' (Must surround with quotes becuase & behaves strange on Linux CL)
+# curl 'http://127.0.0.1:5000/epochs?limit=100&after=2024-049T12:00:00.000Z&fields=X,Y,Z'
+# curl 'http://127.0.0.1:5000/epochs?start=2024-049T12:00:00.000Z&end=2024-049T13:00:00.000Z'
+# curl 'http://127.0.0.1:5000/epochs?format=csv' or curl -H 'Accept: application/vnd.apache.arrow.stream' http://127.0.0.1:5000/epochs
 @app.route("/epochs", methods=['GET'])
 def epochs() -> List[dict]:
     """Function calls the StateVector() method to return the data given the limit and offset query parameters. 
+        The rows can also be narrowed to a time range (start/end), continued from the last epoch of 
+        a previous page (after), and projected to some of the state vector fields (fields). 
     Returns:
         List[dict]: List of state vector dictionaries that are filtered based on the provied limit and offset
     """
+    try:
+        filters = epochFilters()
+        wire = requestedFormat()
+    except ValueError as error:
+        return f"Error: {error} \n"
+    if wire not in ('json', 'ndjson'):
+        return epochColumns(wire, filters)
+
     # Limit and Offset return None if nothing is passed 
     limit = request.args.get('limit', )
     offset = request.args.get('offset', )
     
     # limit = None, offset = None
     if limit is None and offset is None:
-        return (getStateVectorData(limit, offset))
+        snapshot = ephemeris.get()
+        if not filters and snapshot is not None and wire == 'json':
+            # The whole data set is identical until the next snapshot, so it is served pre-serialized
+            return serveCached(snapshot, 'epochs')
+        return streamStateVectors(wire, limit, offset, **filters)
     
     # limit != None, offset = None
     if offset is None and limit is not None: 
         try:
             limit = int(limit)
-            if limit == 0:
-                return ([])
-            return getStateVectorData(limit, offset)
+            return streamStateVectors(wire, limit, offset, **filters)
         except ValueError: 
             return "Error: Limit must be an integer \n"
         
     if limit is None and offset is not None: 
         try:
             offset = int(offset)
-            return getStateVectorData(limit, offset)
+            return streamStateVectors(wire, limit, offset, **filters)
         except ValueError: 
             return "Error: Offset must be an integer \n"
     try:
         limit = int(limit)
-        if limit == 0:
-            return ([])
     except ValueError: 
         return "Error: Limit must be an integer \n"
     try:
@@ -222,7 +2250,7 @@ def epochs() -> List[dict]:
     except ValueError: 
         return "Error: Offset must be an integer \n"
  
-    return (getStateVectorData(limit, offset))
+    return streamStateVectors(wire, limit, offset, **filters)
 
 # curl http://127.0.0.1:5000/epochs/<epoch>
 @app.route("/epochs/<epoch>", methods=['GET'])
@@ -233,10 +2261,9 @@ def epoch(epoch:str) -> dict:
     Returns:
         dict: State vector data of specific epoch
     """
-    data = getStateVectorData()
-    for entry in data:
-        if (entry["EPOCH"] == epoch):
-            return entry
+    snapshot, index = locateEpoch(epoch)
+    if index is not None:
+        return snapshot.stateVector(index)
     return "Epoch not available \n"
 
 # curl http://127.0.0.1:5000/epochs/<epoch>/speed
@@ -248,13 +2275,164 @@ def speed(epoch:str) -> dict:
     Returns:
         dict: Dictionary containing instantaneous speed information
     """
-    data = getStateVectorData()
-    for entry in data:
-        if (entry["EPOCH"] == epoch):
-            instantaneous_speed = round(calculateSpeed(float(entry['X_DOT']['#text']), float(entry['Y_DOT']['#text']), float(entry['Z_DOT']['#text'])),3)
-            return({"INSTANTANEOUS SPEED": {"#text": instantaneous_speed, "@units": "km/s"}})       
+    snapshot, index = locateEpoch(epoch)
+    if index is not None:
+        x_dot, y_dot, z_dot = snapshot.velocities[index]
+        instantaneous_speed = round(calculateSpeed(float(x_dot), float(y_dot), float(z_dot)),3)
+        return({"INSTANTANEOUS SPEED": {"#text": instantaneous_speed, "@units": "km/s"}})       
     return "Epoch not available \n"
 
+def batchEpochs() -> dict:
+    """Function reads the JSON body of the /epochs/batch routes, either a list of epochs 
+        ({"epochs": [...]}) or a time range ({"start": time, "end": time}), and gathers the 
+        columns of the requested state vectors. Epochs that rolled off the current data set 
+        are looked up in the archive. 
+    Returns:
+        dict: Epoch strings, a mask of the epochs found, and their velocities, altitudes, latitudes, and 
+            longitudes (NaN where not found); plus the "geoposition" flag of the request
+    Raises:
+        ValueError: If the body is invalid, with the message to show the user
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not ('epochs' in body or 'start' in body or 'end' in body):
+        raise ValueError('The body must be a JSON object with a list of "epochs" or a "start" and "end" time')
+    geoposition = body.get('geoposition', False)
+    if not isinstance(geoposition, bool):
+        raise ValueError('"geoposition" must be true or false')
+    snapshot = ephemeris.get()
+    if snapshot is None:
+        raise ValueError("Epoch not available")
+
+    if 'epochs' in body:
+        epochs = body['epochs']
+        if not isinstance(epochs, list) or not all(isinstance(epoch, str) for epoch in epochs):
+            raise ValueError('"epochs" must be a list of epoch strings')
+        if len(epochs) > BATCH_MAX_EPOCHS:
+            raise ValueError(f"At most {BATCH_MAX_EPOCHS} epochs can be requested at once")
+        found_rows = [snapshot.find(epoch) for epoch in epochs]
+        rows = np.array([-1 if row is None else row for row in found_rows], dtype=np.int64)
+    else:
+        try:
+            start = None if body.get('start') is None else parseTime(str(body['start']))
+            end = None if body.get('end') is None else parseTime(str(body['end']))
+        except ValueError:
+            raise ValueError('"start" and "end" must be valid times')
+        snapshot = ephemerisCovering(snapshot, start, end)
+        window = snapshot.window(start, end)
+        rows = np.arange(window.start, window.stop, dtype=np.int64)
+        if len(rows) > BATCH_MAX_EPOCHS:
+            raise ValueError(f"At most {BATCH_MAX_EPOCHS} epochs can be requested at once")
+        epochs = [epoch.decode() for epoch in snapshot.epochs[rows]]
+
+    found = rows >= 0
+    selected = rows[found]
+    velocities = np.full((len(rows), 3), np.nan)
+    altitudes, latitudes, longitudes = (np.full(len(rows), np.nan) for _ in range(3))
+    velocities[found] = snapshot.velocities[selected]
+    altitudes[found], latitudes[found], longitudes[found] = snapshot.altitudes[selected], snapshot.latitudes[selected], snapshot.longitudes[selected]
+    epochs = list(epochs)
+    for position in np.flatnonzero(found).tolist():
+        epochs[position] = snapshot.epochs[rows[position]].decode()
+    if archive is not None:
+        missing = {}
+        for position in np.flatnonzero(~found).tolist():
+            try:
+                missing[position] = parseEpoch(epochs[position])
+            except ValueError:
+                pass
+        # One archive read covers every rolled-off epoch instead of rebuilding a snapshot per epoch
+        history = archive.query(min(missing.values()), max(missing.values())) if missing else None
+        for position in missing:
+            row = findEpoch(history, epochs[position])
+            if row is not None:
+                found[position] = True
+                epochs[position] = history.epochs[row].decode()
+                velocities[position] = history.velocities[row]
+                altitudes[position], latitudes[position], longitudes[position] = history.altitudes[row], history.latitudes[row], history.longitudes[row]
+
+    if geoposition and np.count_nonzero(found) > BATCH_MAX_GEOPOSITIONS:
+        raise ValueError(f"At most {BATCH_MAX_GEOPOSITIONS} epochs can be reverse geocoded at once")
+    return {"epochs": epochs, "found": found, "velocities": velocities, "altitudes": altitudes, 
+            "latitudes": latitudes, "longitudes": longitudes, "geoposition": geoposition}
+
+def batchResponse(batch:dict, build) -> Response:
+    """Function serializes one entry per requested epoch, in the order they were requested. 
+    Args:
+        batch (dict): Columns returned by batchEpochs
+        build (callable): Builds the entry of a found epoch from its position in the batch
+    Returns:
+        Response: JSON list, with an "Error" entry for every epoch that is not available
+    """
+    results = [build(position) if found else {"EPOCH": epoch, "Error": "Epoch not available"} 
+               for position, (epoch, found) in enumerate(zip(batch['epochs'], batch['found'].tolist()))]
+    return Response(dumpJSON(results), mimetype='application/json')
+
+# curl -X POST -H 'Content-Type: application/json' -d '{"epochs": ["2024-049T12:00:00.000Z"]}' http://127.0.0.1:5000/epochs/batch
+# curl -X POST -H 'Content-Type: application/json' -d '{"start": "2024-049T12:00:00.000Z", "end": "2024-049T13:00:00.000Z", "geoposition": true}' http://127.0.0.1:5000/epochs/batch
+@app.route("/epochs/batch", methods=['POST'])
+def epochsBatch() -> Response:
+    """Function returns the speed, altitude, latitude, and longitude (and with "geoposition": true 
+        the geoposition) of many epochs in one request. 
+    Returns:
+        Response: JSON list with one entry per epoch
+    """
+    try:
+        batch = batchEpochs()
+    except ValueError as error:
+        return f"Error: {error} \n"
+    speeds = np.round(calculateSpeeds(batch['velocities']), 3).tolist()
+    altitudes = np.round(batch['altitudes'], 3).tolist()
+    latitudes, longitudes = np.round(batch['latitudes'], 3).tolist(), np.round(batch['longitudes'], 3).tolist()
+
+    def build(position):
+        entry = {"EPOCH": batch['epochs'][position], "Instantaneous Speed [km/s]": speeds[position], 
+                 "Altitude [km]": altitudes[position], "Latitude [degrees]": latitudes[position], 
+                 "Longitude [degrees]": longitudes[position]}
+        if batch['geoposition']:
+            entry["Geoposition"] = describeLocation(float(batch['altitudes'][position]), float(batch['latitudes'][position]), 
+                                                    float(batch['longitudes'][position]), batch['epochs'][position])["Geoposition"]
+        return entry
+    return batchResponse(batch, build)
+
+# curl -X POST -H 'Content-Type: application/json' -d '{"epochs": ["2024-049T12:00:00.000Z"]}' http://127.0.0.1:5000/epochs/batch/speed
+@app.route("/epochs/batch/speed", methods=['POST'])
+def speedBatch() -> Response:
+    """Function returns the instantaneous speed of many epochs in one request, each in the shape of /epochs/<epoch>/speed. 
+    Returns:
+        Response: JSON list with one entry per epoch
+    """
+    try:
+        batch = batchEpochs()
+    except ValueError as error:
+        return f"Error: {error} \n"
+    speeds = np.round(calculateSpeeds(batch['velocities']), 3).tolist()
+    return batchResponse(batch, lambda position: {"EPOCH": batch['epochs'][position], 
+                                                  "INSTANTANEOUS SPEED": {"#text": speeds[position], "@units": "km/s"}})
+
+# curl -X POST -H 'Content-Type: application/json' -d '{"epochs": ["2024-049T12:00:00.000Z"], "geoposition": true}' http://127.0.0.1:5000/epochs/batch/location
+@app.route("/epochs/batch/location", methods=['POST'])
+def locationBatch() -> Response:
+    """Function returns the location of many epochs in one request, each in the shape of 
+        /epochs/<epoch>/location. The geoposition is only included with "geoposition": true. 
+    Returns:
+        Response: JSON list with one entry per epoch
+    """
+    try:
+        batch = batchEpochs()
+    except ValueError as error:
+        return f"Error: {error} \n"
+    if batch['geoposition']:
+        return batchResponse(batch, lambda position: describeLocation(
+            float(batch['altitudes'][position]), float(batch['latitudes'][position]), 
+            float(batch['longitudes'][position]), batch['epochs'][position]))
+
+    formatted_now = formatEpoch(time.time())
+    altitudes = np.round(batch['altitudes'], 3).tolist()
+    latitudes, longitudes = np.round(batch['latitudes'], 3).tolist(), np.round(batch['longitudes'], 3).tolist()
+    return batchResponse(batch, lambda position: {"Epoch Time": batch['epochs'][position], "Current Time": formatted_now, 
+                                                  "Altitude [km]": altitudes[position], "Longitude [degrees]": longitudes[position], 
+                                                  "Latitude [degrees]": latitudes[position]})
+
 # curl http://127.0.0.1:5000/comment
 @app.route("/comment", methods=['GET'])
 def comment() -> list:
@@ -262,15 +2440,11 @@ def comment() -> list:
     Returns:
         list: Formatted list of comment data from ISS
     """
-    r = requests.get(DATA_SOURCE)
-    if (r.status_code == 200):
-        logging.info("HTTP Request Successful")
-        xml_data = xmltodict.parse(r.text)
-        comments:list = xml_data['ndm']['oem']['body']['segment']['data']['COMMENT']
-        return(jsonify(comments))
-    else:       
-        logging.error(f"Bad HHTP Request {r.status_code}")
-        return None
+    snapshot = ephemeris.get()
+    if snapshot is not None:
+        return serveCached(snapshot, 'comment')
+    else:
+        return "Epoch not available \n"
 
 # curl http://127.0.0.1:5000/header
 @app.route("/header", methods=['GET'])
@@ -279,15 +2453,11 @@ def header() -> dict:
     Returns:
         dict: Dictionary of header information including information about creation date and originator. 
     """
-    r = requests.get(DATA_SOURCE)
-    if (r.status_code == 200):
-        logging.info("HTTP Request Successful")
-        xml_data = xmltodict.parse(r.text)
-        header:dict = xml_data['ndm']['oem']['header']
-        return header
-    else:       
-        logging.error(f"Bad HHTP Request {r.status_code}")
-        return None
+    snapshot = ephemeris.get()
+    if snapshot is not None:
+        return serveCached(snapshot, 'header')
+    else:
+        return "Epoch not available \n"
 
 # curl http://127.0.0.1:5000/metadata
 @app.route("/metadata", methods=['GET'])
@@ -297,15 +2467,11 @@ def metadata() -> dict:
         dict: Dictionary of metadata containing object name and id, center name, 
             reference frame, time system, etc.  
     """
-    r = requests.get(DATA_SOURCE)
-    if (r.status_code == 200):
-        logging.info("HTTP Request Successful")
-        xml_data = xmltodict.parse(r.text)
-        metadata:dict = xml_data['ndm']['oem']['body']['segment']['metadata']
-        return metadata
-    else:       
-        logging.error(f"Bad HHTP Request {r.status_code}")
-        return None
+    snapshot = ephemeris.get()
+    if snapshot is not None:
+        return serveCached(snapshot, 'metadata')
+    else:
+        return "Epoch not available \n"
 
 # curl http://127.0.0.1:5000/epochs/<epoch>/location
 @app.route("/epochs/<epoch>/location")  
@@ -317,26 +2483,217 @@ def location(epoch:str) -> dict:
         Returns:
             dict:
     """
-    data = getStateVectorData()
-    for entry in data:
-        if (entry["EPOCH"] == epoch):
-            iss_location = calculateLocation(float(entry['X']['#text']), float(entry['Y']['#text']), float(entry['Z']['#text']), epoch)
-            return iss_location
+    snapshot, index = locateEpoch(epoch)
+    if index is not None:
+        iss_location = describeLocation(float(snapshot.altitudes[index]), float(snapshot.latitudes[index]), 
+                                        float(snapshot.longitudes[index]), snapshot.epochs[index].decode())
+        return iss_location
         
     return "Epoch not available \n"
 
+def requestedTime() -> Optional[float]:
+    """Function reads the optional ?at= query parameter. 
+    Returns:
+        float: Requested time in seconds since the Unix epoch, or None when not provided
+    Raises:
+        ValueError: If the parameter is not a recognizable time
+    """
+    at = request.args.get('at')
+    return None if at is None else parseTime(at)
+
+# curl http://127.0.0.1:5000/position
+# curl 'http://127.0.0.1:5000/position?at=2024-049T12:01:30.000Z&at=2024-049T12:02:00.000Z'
+@app.route("/position", methods=['GET'])
+def position():
+    """Function returns the state vector interpolated to any time inside the ephemeris window. 
+        Each ?at= parameter adds one time; without any the current time is used. 
+    Returns:
+        dict | List[dict]: Interpolated state vector, or a list of them when several times are given
+    """
+    try:
+        timestamps = [parseTime(at) for at in request.args.getlist('at')] or [time.time()]
+    except ValueError:
+        return "Error: at must be a valid time \n"
+
+    snapshot = ephemerisCovering(ephemeris.get(), min(timestamps), max(timestamps))
+    if snapshot is None:
+        return "Epoch not available \n"
+    try:
+        positions, velocities = interpolateStateVectors(snapshot, timestamps)
+    except ValueError:
+        return "Error: Time outside of the ephemeris window \n"
+
+    state_vectors = []
+    for timestamp, values in zip(timestamps, np.hstack((positions, velocities)).tolist()):
+        state_dict = {'EPOCH': formatEpoch(timestamp)}
+        for name, units, value in zip(STATE_FIELDS, snapshot.units, values):
+            state_dict[name] = {'#text': value, '@units': units}
+        state_vectors.append(state_dict)
+    return state_vectors[0] if len(request.args.getlist('at')) <= 1 else jsonify(state_vectors)
+
+# curl http://127.0.0.1:5000/groundtrack
+# curl 'http://127.0.0.1:5000/groundtrack?start=2024-049T12:00:00.000Z&end=2024-049T13:30:00.000Z&step=30'
+@app.route("/groundtrack", methods=['GET'])
+def groundtrack() -> dict:
+    """Function returns altitude, latitude, and longitude for a whole time range in one response. 
+        Without ?step= every Epoch between ?start= and ?end= is reported, otherwise positions 
+        are interpolated every step seconds. start and end default to the edges of the data set. 
+        The columns can also be requested as CSV, .npy, MessagePack, or Arrow (see /epochs). 
+    Returns:
+        dict: Dictionary of equally long lists of epoch times, altitudes, latitudes, and longitudes
+    """
+    try:
+        wire = requestedFormat(COLUMN_FORMATS)
+    except ValueError as error:
+        return f"Error: {error} \n"
+    snapshot = ephemeris.get()
+    if snapshot is None:
+        return "Epoch not available \n"
+
+    try:
+        start = parseTime(request.args['start']) if 'start' in request.args else float(snapshot.times[0])
+        end = parseTime(request.args['end']) if 'end' in request.args else float(snapshot.times[-1])
+    except ValueError:
+        return "Error: start and end must be valid times \n"
+    try:
+        step = float(request.args['step']) if 'step' in request.args else None
+    except ValueError:
+        return "Error: step must be a number of seconds \n"
+    if step is not None and not (0 < step < math.inf):
+        return "Error: step must be a number of seconds \n"
+    # Checked before the archive is read, a long range of it could not be answered anyway
+    if step is None and archive is not None and archive.countWithin(start, end) > GROUNDTRACK_MAX_POINTS:
+        return f"Error: A ground track is limited to {GROUNDTRACK_MAX_POINTS} points \n"
+    snapshot = ephemerisCovering(snapshot, start, end)
+
+    if step is None:
+        rows = slice(int(np.searchsorted(snapshot.times, start, side='left')), 
+                     int(np.searchsorted(snapshot.times, end, side='right')))
+        if rows.stop - rows.start > GROUNDTRACK_MAX_POINTS:
+            return f"Error: A ground track is limited to {GROUNDTRACK_MAX_POINTS} points \n"
+        times, epochs = snapshot.times[rows], snapshot.epochs[rows].tolist()
+        altitude, latitude, longitude = snapshot.altitudes[rows], snapshot.latitudes[rows], snapshot.longitudes[rows]
+    else:
+        if (end - start) / step >= GROUNDTRACK_MAX_POINTS:
+            return f"Error: A ground track is limited to {GROUNDTRACK_MAX_POINTS} points \n"
+        times = start + step*np.arange(int(math.floor((end - start) / step)) + 1)
+        try:
+            positions, _ = interpolateStateVectors(snapshot, times)
+        except ValueError:
+            return "Error: Time outside of the ephemeris window \n"
+        epochs = None
+        altitude, latitude, longitude = calculateLocations(positions, times)
+
+    if wire != 'json':
+        return wireResponse(wire, "Epoch Time", times, 
+                            {"Altitude [km]": altitude, "Latitude [degrees]": latitude, "Longitude [degrees]": longitude}, 
+                            {"Altitude [km]": "km", "Latitude [degrees]": "degrees", "Longitude [degrees]": "degrees"}, epochs)
+    return {
+        "Epoch Time": [formatEpoch(timestamp) for timestamp in times] if epochs is None else [epoch.decode() for epoch in epochs], 
+        "Altitude [km]": np.round(altitude, 3).tolist(), 
+        "Latitude [degrees]": np.round(latitude, 3).tolist(), 
+        "Longitude [degrees]": np.round(longitude, 3).tolist()
+    }
+
+# curl 'http://127.0.0.1:5000/passes?lat=29.76&lon=-95.37'
+# curl 'http://127.0.0.1:5000/passes?lat=29.76&lon=-95.37&lat=51.5&lon=-0.13&alt=0.05&min_elevation=20'
+@app.route("/passes", methods=['GET'])
+def passes():
+    """Function predicts when the ISS passes over observers at ?lat= and ?lon= (degrees) and the 
+        optional ?alt= (km above the WGS-84 ellipsoid, default 0). Repeat lat and lon to ask for 
+        several observers at once. A pass is the ISS climbing above ?min_elevation= degrees 
+        (default 10) between ?start= and ?end=, which default to the edges of the data set. 
+    Returns:
+        dict | List[dict]: Observer with its list of passes, or a list of them when several observers are given
+    """
+    try:
+        latitudes = [float(value) for value in request.args.getlist('lat')]
+        longitudes = [float(value) for value in request.args.getlist('lon')]
+        altitudes = [float(value) for value in request.args.getlist('alt')]
+        min_elevation = float(request.args.get('min_elevation', PASS_MIN_ELEVATION))
+    except ValueError:
+        return "Error: lat, lon, alt, and min_elevation must be numbers \n"
+    if not all(math.isfinite(value) for value in latitudes + longitudes + altitudes + [min_elevation]):
+        return "Error: lat, lon, alt, and min_elevation must be numbers \n"
+    if not latitudes or len(latitudes) != len(longitudes):
+        return "Error: Every observer needs a lat and a lon \n"
+    if len(latitudes) > PASS_MAX_OBSERVERS:
+        return f"Error: At most {PASS_MAX_OBSERVERS} observers can be given \n"
+    if len(altitudes) > 1 and len(altitudes) != len(latitudes):
+        return "Error: Give one alt for all observers or one per observer \n"
+    if not all(-90 <= latitude <= 90 for latitude in latitudes) or not all(-180 <= longitude <= 180 for longitude in longitudes):
+        return "Error: lat must be within [-90, 90] and lon within [-180, 180] \n"
+    if not (0 <= min_elevation < 90):
+        return "Error: min_elevation must be within [0, 90) \n"
+    altitudes = altitudes * len(latitudes) if len(altitudes) == 1 else altitudes or [0.0] * len(latitudes)
+    try:
+        start = parseTime(request.args['start']) if 'start' in request.args else None
+        end = parseTime(request.args['end']) if 'end' in request.args else None
+    except ValueError:
+        return "Error: start and end must be valid times \n"
+
+    snapshot = ephemeris.get()
+    if start is not None or end is not None:
+        snapshot = ephemerisCovering(snapshot, start, end)
+    if snapshot is None:
+        return "Epoch not available \n"
+
+    observers = list(zip(latitudes, longitudes, altitudes))
+    results = []
+    for (latitude, longitude, altitude), observer_passes in zip(observers, predictPasses(snapshot, observers, min_elevation, start, end)):
+        results.append({
+            "Latitude [degrees]": latitude, 
+            "Longitude [degrees]": longitude, 
+            "Altitude [km]": altitude, 
+            "Minimum Elevation [degrees]": min_elevation, 
+            "Passes": observer_passes
+        })
+    return results[0] if len(results) == 1 else jsonify(results)
+
 # curl http://127.0.0.1:5000/now
+# curl 'http://127.0.0.1:5000/now?at=2024-049T12:00:00.000Z'
+# curl 'http://127.0.0.1:5000/now?interpolate=false'
 @app.route("/now", methods=['GET'])
 def now() -> dict:
     """Function resturns instantaneous speed, latitude, longitude, altitude, and 
-    geoposition for the Epoch that is nearest in time
+    geoposition of the ISS interpolated to the current time (or the ?at= time). 
+    With ?interpolate=false the latest Epoch before that time is reported instead. 
     Returns:
         dict: Dictionary containing data of ISS geoposition, speed, etc. 
     """
-    data = getStateVectorData()
-    now_epoch = getNowEpoch(data)
-    instantaneous_speed = round(calculateSpeed(float(now_epoch['X_DOT']['#text']), float(now_epoch['Y_DOT']['#text']), float(now_epoch['Z_DOT']['#text'])), 3)
-    iss_location = calculateLocation(float(now_epoch['X']['#text']), float(now_epoch['Y']['#text']), float(now_epoch['Z']['#text']), now_epoch['EPOCH'])
+    try:
+        at = requestedTime()
+    except ValueError:
+        return "Error: at must be a valid time \n"
+    timestamp = time.time() if at is None else at
+
+    snapshot = ephemerisCovering(ephemeris.get(), timestamp, timestamp)
+    if snapshot is None:
+        return "Epoch not available \n"
+
+    if request.args.get('interpolate', 'true').lower() == 'false':
+        with STAGE_SECONDS.time('lookup'):
+            index = nearestEpochIndex(snapshot.times, timestamp)
+        if index is None:
+            return "Epoch not available \n"
+        velocity = snapshot.velocities[index]
+        altitude, latitude, longitude = snapshot.altitudes[index], snapshot.latitudes[index], snapshot.longitudes[index]
+        epoch = snapshot.epochs[index].decode()
+    else:
+        try:
+            with STAGE_SECONDS.time('lookup'):
+                positions, velocities = interpolateStateVectors(snapshot, timestamp)
+        except ValueError:
+            return "Epoch not available \n"
+        velocity = velocities[0]
+        with STAGE_SECONDS.time('locate'):
+            altitudes, latitudes, longitudes = calculateLocations(positions, np.array([timestamp]))
+        altitude, latitude, longitude = altitudes[0], latitudes[0], longitudes[0]
+        epoch = formatEpoch(timestamp)
+
+    x_dot, y_dot, z_dot = velocity
+    instantaneous_speed = round(calculateSpeed(float(x_dot), float(y_dot), float(z_dot)), 3)
+    iss_location = describeLocation(float(altitude), float(latitude), float(longitude), epoch)
     iss_data = iss_location
     iss_data["Instantaneous Speed [km/s]"] = instantaneous_speed
     return iss_data
@@ -344,22 +2701,376 @@ def now() -> dict:
 # curl http://127.0.0.1:5000/now/time
 @app.route("/now/time", methods=['GET'])
 def nowTime() -> dict:
-    """Function returns dictionary of current time and latest epoch time. 
+    """Function returns dictionary of current time, latest epoch time, and nearest epoch time. 
         The time difference between the time stamps should never be greater than 4 minutes. 
     Returns:
         dict: Dictionary of current time and latest epoch time. 
     """
-    now_utc = datetime.now(timezone.utc)
-    formatted_now = now_utc.strftime('%Y-%jT%H:%M:%S.%f')[:-3] + 'Z'
+    try:
+        at = requestedTime()
+    except ValueError:
+        return "Error: at must be a valid time \n"
+
+    timestamp = time.time() if at is None else at
+    formatted_now = formatEpoch(timestamp)
 
-    data = getStateVectorData()
-    now_epoch = getNowEpoch(data)
+    snapshot = ephemeris.get()
+    if snapshot is None:
+        return "Epoch not available \n"
+    latest = nearestEpochIndex(snapshot.times, timestamp)
+    nearest = nearestEpochIndex(snapshot.times, timestamp, past_only=False)
 
     times_dict = {
         "Current Time": formatted_now, 
-        "Latest Epoch Time": now_epoch["EPOCH"]
+        "Latest Epoch Time": None if latest is None else snapshot.epochs[latest].decode(), 
+        "Nearest Epoch Time": None if nearest is None else snapshot.epochs[nearest].decode()
     }
     return times_dict
 
+def positionEvent(sequence:int, timestamp:float) -> bytes:
+    """Function computes the interpolated ISS position at a time and formats it as a server-sent event. 
+    Args:
+        sequence (int): Event id
+        timestamp (float): Time of the position in seconds since the Unix epoch
+    Returns:
+        bytes: 'position' event, or an 'unavailable' event when the time is outside of the data set
+    """
+    snapshot = ephemeris.get()
+    try:
+        positions, velocities = interpolateStateVectors(snapshot, timestamp)
+    except (ValueError, AttributeError):
+        return f"id: {sequence}\nevent: unavailable\ndata: Epoch not available\n\n".encode()
+    altitudes, latitudes, longitudes = calculateLocations(positions, np.array([timestamp]))
+    x_dot, y_dot, z_dot = velocities[0]
+    data = {
+        "Epoch Time": formatEpoch(timestamp), 
+        "Altitude [km]": round(float(altitudes[0]), 3), 
+        "Longitude [degrees]": round(float(longitudes[0]), 3), 
+        "Latitude [degrees]": round(float(latitudes[0]), 3), 
+        "Instantaneous Speed [km/s]": round(calculateSpeed(float(x_dot), float(y_dot), float(z_dot)), 3)
+    }
+    return f"id: {sequence}\nevent: position\ndata: ".encode() + dumpJSON(data) + b"\n\n"
+
+class PositionStream:
+    """Computes the ISS position once per tick on a single producer thread and fans every tick out 
+        to all /now/stream subscribers, so the cost does not grow with the number of clients. 
+        The producer only runs while there are subscribers, at the highest rate one of them asked for, 
+        and at most max_subscribers streams are open at a time since each holds a request thread. 
+    """
+    def __init__(self, max_subscribers:int):
+        self.max_subscribers = max_subscribers
+        self.subscribers = 0
+        self.rates = {}  # rate -> number of subscribers that asked for it
+        self.tick = None  # (sequence, timestamp, event)
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def subscribe(self, rate:float) -> Optional[int]:
+        """Function registers a subscriber, starting the producer if it is not running. 
+        Args:
+            rate (float): Positions per second the subscriber asked for
+        Returns:
+            int: Sequence number of the latest tick, the subscriber waits for the ones after it, 
+                or None when max_subscribers streams are already open
+        """
+        with self._condition:
+            if self.subscribers >= self.max_subscribers:
+                return None
+            self.subscribers += 1
+            self.rates[rate] = self.rates.get(rate, 0) + 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="position-stream", daemon=True)
+                self._thread.start()
+            return self.tick[0] if self.tick is not None else 0
+
+    def unsubscribe(self, rate:float) -> None:
+        """Function removes a subscriber, the producer stops after its last one leaves. 
+        Args:
+            rate (float): Positions per second the subscriber asked for
+        """
+        with self._condition:
+            self.subscribers -= 1
+            self.rates[rate] -= 1
+            if not self.rates[rate]:
+                del self.rates[rate]
+
+    def wait(self, sequence:int, timeout:float) -> Optional[tuple]:
+        """Function waits for a tick newer than the last one a subscriber received. 
+        Args:
+            sequence (int): Sequence number of the last tick received, 0 for none
+            timeout (float): Seconds to wait
+        Returns:
+            tuple: (sequence, timestamp, event) of the latest tick, or None on timeout
+        """
+        with self._condition:
+            if self._condition.wait_for(lambda: self.tick is not None and self.tick[0] > sequence, timeout):
+                return self.tick
+            return None
+
+    def _run(self) -> None:
+        sequence = self.tick[0] if self.tick is not None else 0
+        while True:
+            with self._condition:
+                if self.subscribers <= 0:
+                    self._thread = None
+                    return
+                rate = max(self.rates)
+            # Ticks fall on a fixed grid so every subscriber sees the same times
+            timestamp = (math.floor(time.time() * rate) + 1) / rate
+            time.sleep(max(0.0, timestamp - time.time()))
+            sequence += 1
+            try:
+                event = positionEvent(sequence, timestamp)
+            except Exception:
+                logging.exception("Failed to compute the streamed position")
+                continue
+            with self._condition:
+                self.tick = (sequence, timestamp, event)
+                self._condition.notify_all()
+
+position_stream = PositionStream(STREAM_MAX_SUBSCRIBERS)
+
+def streamEvents(rate:float, sequence:int):
+    """Function yields the server-sent events of one /now/stream subscriber. 
+    Args:
+        rate (float): Positions per second the subscriber asked for, at most STREAM_MAX_RATE
+        sequence (int): Sequence number position_stream.subscribe() returned for the subscriber
+    Yields:
+        bytes: Position events, and keep-alive comments while no position is produced
+    """
+    slot = None
+    while True:
+        tick = position_stream.wait(sequence, STREAM_HEARTBEAT)
+        if tick is None:
+            yield b": keep-alive\n\n"
+            continue
+        sequence, timestamp, event = tick
+        # Forward the first tick of every 1/rate second slot
+        if slot is None or math.floor(timestamp * rate + 1e-6) > slot:
+            slot = math.floor(timestamp * rate + 1e-6)
+            yield event
+
+# curl -N http://127.0.0.1:5000/now/stream
+# curl -N 'http://127.0.0.1:5000/now/stream?rate=10'
+@app.route("/now/stream", methods=['GET'])
+def nowStream() -> Response:
+    """Function streams the interpolated position, altitude, and speed of the ISS as server-sent 
+        events, ?rate= times per second (default 1, at most 10). 
+    Returns:
+        Response: text/event-stream response that lasts until the client disconnects, or 503 
+            when STREAM_MAX_SUBSCRIBERS streams are already open in this worker
+    """
+    try:
+        rate = float(request.args.get('rate', 1))
+    except ValueError:
+        rate = None
+    if rate is None or not (0 < rate <= STREAM_MAX_RATE):
+        return f"Error: rate must be a number of positions per second up to {STREAM_MAX_RATE:g} \n"
+    # Subscribed before the response starts, so the stream counts against the limit right away
+    sequence = position_stream.subscribe(rate)
+    if sequence is None:
+        return Response("Error: Too many open position streams, try again later \n", status=503, 
+                        mimetype='text/plain', headers={'Retry-After': '5'})
+    response = Response(streamEvents(rate, sequence), mimetype='text/event-stream', 
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Closing the response also unsubscribes a client that left before the first event
+    response.call_on_close(lambda: position_stream.unsubscribe(rate))
+    return response
+
+@app.before_request
+def startTimer() -> None:
+    g.started = time.perf_counter()
+
+@app.after_request
+def observeRequest(response:Response) -> Response:
+    """Function records the latency of a request under its route pattern, which keeps the number 
+        of series bounded. Streamed bodies (/now/stream, paged /epochs) are timed until their headers. 
+    Args:
+        response (Response): Response of the route
+    Returns:
+        Response: The same response
+    """
+    started = g.get('started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method, str(response.status_code))
+    return response
+
+# curl http://127.0.0.1:5000/metrics
+@app.route("/metrics", methods=['GET'])
+def metrics() -> Response:
+    """Function reports the request latencies, pipeline stage durations, NASA downloads, cache hit 
+        ratios, and data set age in the Prometheus text format. Each gunicorn worker keeps its own 
+        metrics, so a scrape reports the worker that answered it. 
+    Returns:
+        Response: text/plain Prometheus exposition
+    """
+    lines = []
+    for metric in (REQUEST_SECONDS, STAGE_SECONDS, UPSTREAM_RESPONSES, UPSTREAM_BYTES, EPHEMERIS_LOOKUPS):
+        lines += metric.render()
+    lookups = sum(EPHEMERIS_LOOKUPS.value(result) for result in ('hit', 'stale', 'miss'))
+    if lookups:
+        lines += metricLines('iss_ephemeris_cache_hit_ratio', 'Share of snapshot lookups answered without waiting on NASA.', 
+                             'gauge', [((), (EPHEMERIS_LOOKUPS.value('hit') + EPHEMERIS_LOOKUPS.value('stale')) / lookups)])
+
+    # The snapshot is read directly, a scrape never triggers a download
+    snapshot = ephemeris.snapshot
+    if snapshot is not None:
+        lines += metricLines('iss_dataset_age_seconds', 'Seconds since the OEM was last downloaded or revalidated.', 
+                             'gauge', [((), time.monotonic() - ephemeris.fetched_at)])
+        lines += metricLines('iss_dataset_state_vectors', 'State vectors in the current data set.', 'gauge', [((), len(snapshot))])
+        if len(snapshot):
+            lines += metricLines('iss_dataset_first_epoch_timestamp_seconds', 'Unix time of the first epoch of the data set.', 
+                                 'gauge', [((), snapshot.times[0])])
+            lines += metricLines('iss_dataset_last_epoch_timestamp_seconds', 'Unix time of the last epoch of the data set.', 
+                                 'gauge', [((), snapshot.times[-1])])
+        try:
+            created = parseEpoch(snapshot.header['CREATION_DATE'])
+            lines += metricLines('iss_dataset_created_timestamp_seconds', 'Unix time NASA created the OEM.', 'gauge', [((), created)])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    if isinstance(geocoder, GeocodeCache):
+        stats = geocoder.stats()
+        lines += metricLines('iss_geocode_cache_lookups_total', 'Reverse geocoding lookups by cache result.', 'counter', 
+                             [(('hit',), stats['hits']), (('miss',), stats['misses'])], ('result',))
+        lines += metricLines('iss_geocode_cache_hit_ratio', 'Share of reverse geocoding lookups answered by the cache.', 
+                             'gauge', [((), stats['hit ratio'])])
+        lines += metricLines('iss_geocode_cache_entries', 'Cells held by the reverse geocoding cache.', 'gauge', [((), stats['size'])])
+    return Response('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class RequestProfiler:
+    """WSGI middleware that runs a single request under cProfile when it asks for it with ?profile=1 
+        and the admin token in the X-Profile-Token header. The whole response body is produced inside 
+        the profiler and discarded, and the profile is returned instead: the slowest functions by 
+        cumulative time as text, or with ?profile=pstats the raw pstats data (pstats.Stats, snakeviz). 
+        One request is profiled at a time. The middleware is only installed when ISS_PROFILE_TOKEN 
+        is set, so requests pay nothing for it otherwise. 
+    """
+    def __init__(self, wsgi_app, token:str, directory:Optional[str]=None):
+        self.wsgi_app = wsgi_app
+        self.token = token
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def __call__(self, environ:dict, start_response):
+        query = parse_qsl(environ.get('QUERY_STRING', ''), keep_blank_values=True)
+        requested = [value for name, value in query if name == 'profile']
+        if not requested:
+            return self.wsgi_app(environ, start_response)
+        if not hmac.compare_digest(environ.get('HTTP_X_PROFILE_TOKEN', '').encode(), self.token.encode()):
+            return self._reply(start_response, '403 Forbidden', b"Error: Profiling requires the X-Profile-Token header \n")
+        if not self._lock.acquire(blocking=False):
+            return self._reply(start_response, '503 Service Unavailable', b"Error: Another request is being profiled \n")
+        try:
+            # The route sees the request without the profile parameter
+            environ = dict(environ, QUERY_STRING=urlencode([(name, value) for name, value in query if name != 'profile']))
+            profiler, status, elapsed = self._profile(environ)
+        finally:
+            self._lock.release()
+
+        stats = pstats.Stats(profiler)
+        saved = self._save(stats, environ) if self.directory is not None else None
+        if requested[-1] == 'pstats':
+            return self._reply(start_response, '200 OK', marshal.dumps(stats.stats), 'application/octet-stream')
+        text = io.StringIO()
+        text.write(f"{environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')}?{environ['QUERY_STRING']} -> {status} "
+                   f"in {elapsed * 1000:.1f} ms\n")
+        if saved is not None:
+            text.write(f"Saved to {saved}\n")
+        stats.stream = text
+        stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+        return self._reply(start_response, '200 OK', text.getvalue().encode())
+
+    def _profile(self, environ:dict) -> Tuple[cProfile.Profile, Optional[str], float]:
+        status = []
+
+        def capture(status_line, headers, exc_info=None):
+            status.append(status_line)
+            return lambda data: None
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            body = self.wsgi_app(environ, capture)
+            try:
+                for _ in body:
+                    if time.perf_counter() - started > PROFILE_MAX_SECONDS:
+                        break
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        finally:
+            profiler.disable()
+        return profiler, status[-1] if status else None, time.perf_counter() - started
+
+    def _save(self, stats:pstats.Stats, environ:dict) -> Optional[str]:
+        route = re.sub(r'[^A-Za-z0-9]+', '_', environ.get('PATH_INFO', '')).strip('_') or 'root'
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{route}.prof")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            stats.dump_stats(path)
+            return path
+        except OSError:
+            logging.exception(f"Failed to save the profile to {path}")
+            return None
+
+    @staticmethod
+    def _reply(start_response, status:str, body:bytes, content_type:str='text/plain; charset=utf-8') -> List[bytes]:
+        start_response(status, [('Content-Type', content_type), ('Content-Length', str(len(body)))])
+        return [body]
+
+if PROFILE_TOKEN:
+    app.wsgi_app = RequestProfiler(app.wsgi_app, PROFILE_TOKEN, PROFILE_DIR)
+
+def productionOptions() -> dict:
+    """Function builds the gunicorn settings of the production server. 
+    Returns:
+        dict: gunicorn setting name -> value
+    """
+    def post_fork(server, worker):
+        # Threads do not survive fork, so every worker starts a refresher. It first waits out the TTL of the 
+        # snapshot preloaded in the master. With a snapshot directory only the one holding its refresher 
+        # lock downloads, the others load the snapshots it saves.
+        ephemeris.start()
+
+    return {
+        'bind': f'0.0.0.0:{PORT}', 
+        'workers': WORKERS, 
+        'threads': THREADS, 
+        'worker_class': 'gthread', 
+        'preload_app': True, 
+        'graceful_timeout': GRACEFUL_TIMEOUT, 
+        'post_fork': post_fork, 
+    }
+
+def serveProduction() -> None:
+    """Function serves the app with gunicorn, WORKERS processes with THREADS threads each. The 
+        snapshot is loaded once before the workers are forked, so they start serving immediately 
+        and share its memory. Sending SIGHUP to the master replaces the workers gracefully, 
+        SIGTERM stops it once in-flight requests are done. 
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            for name, value in productionOptions().items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            return app
+
+    if SNAPSHOT_DIR is None and WORKERS > 1:
+        logging.warning("ISS_SNAPSHOT_DIR is not set, so once the preloaded OEM expires every worker downloads and keeps its own copy")
+    ephemeris.get()
+    ProductionServer().run()
+
 if __name__ == "__main__":
-    app.run(debug=True,  host='0.0.0.0')
+    if SERVER == 'production':
+        serveProduction()
+    else:
+        # With debug=True Werkzeug re-runs this module in a child process; only that process serves requests
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            ephemeris.start()
+        app.run(debug=True,  host='0.0.0.0', port=PORT)
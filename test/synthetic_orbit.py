@@ -0,0 +1,47 @@
+"""Synthetic OEM of a circular orbit with the ISS's radius and inclination, shared by the tests and
+    the benchmarks so both run against the same documents. It does not import iss_tracker, since
+    the benchmarks configure the tracker through environment variables before importing it.
+"""
+import math
+from datetime import datetime, timezone
+from typing import Optional
+
+ORBIT_RADIUS = 6778.0 # km
+ORBIT_RATE = math.sqrt(398600.4418 / ORBIT_RADIUS**3) # rad/s
+ORBIT_INCLINATION = math.radians(51.6)
+ORBIT_START = datetime(2024, 2, 18, 12, tzinfo=timezone.utc).timestamp()
+
+def orbitEpoch(timestamp:float) -> str:
+    """Function formats a Unix time as an OEM epoch (2024-049T12:00:00.000Z)"""
+    return datetime.fromtimestamp(round(timestamp, 3), timezone.utc).strftime('%Y-%jT%H:%M:%S.%f')[:-3] + 'Z'
+
+def orbitState(t:float) -> list:
+    """Function returns the exact position and velocity of the orbit t seconds after its first state vector"""
+    angle = ORBIT_RATE * t
+    cos_i, sin_i = math.cos(ORBIT_INCLINATION), math.sin(ORBIT_INCLINATION)
+    x, y = ORBIT_RADIUS*math.cos(angle), ORBIT_RADIUS*math.sin(angle)
+    vx, vy = -ORBIT_RADIUS*ORBIT_RATE*math.sin(angle), ORBIT_RADIUS*ORBIT_RATE*math.cos(angle)
+    return [x, y*cos_i, y*sin_i, vx, vy*cos_i, vy*sin_i]
+
+def orbitXML(count:int, step:float=240.0, start:float=ORBIT_START, created:Optional[float]=None) -> str:
+    """Function builds an OEM document of the orbit, the same arguments always give the same document.
+    Args:
+        count (int): Number of state vectors
+        step (float): Seconds between state vectors
+        start (float): Unix time of the first state vector
+        created (float): Unix time of the CREATION_DATE, defaults to six hours before start
+    Returns:
+        str: OEM XML document
+    """
+    created = start - 6*3600 if created is None else created
+    vectors = []
+    for row in range(count):
+        x, y, z, vx, vy, vz = orbitState(row * step)
+        vectors.append(f'<stateVector><EPOCH>{orbitEpoch(start + row*step)}</EPOCH>'
+                       f'<X units="km">{x!r}</X><Y units="km">{y!r}</Y><Z units="km">{z!r}</Z>'
+                       f'<X_DOT units="km/s">{vx!r}</X_DOT><Y_DOT units="km/s">{vy!r}</Y_DOT><Z_DOT units="km/s">{vz!r}</Z_DOT></stateVector>')
+    return ('<ndm><oem id="CCSDS_OEM_VERS" version="2.0"><header><CREATION_DATE>' + orbitEpoch(created) +
+            '</CREATION_DATE><ORIGINATOR>JSC</ORIGINATOR></header><body><segment><metadata>'
+            '<OBJECT_NAME>ISS</OBJECT_NAME><OBJECT_ID>1998-067-A</OBJECT_ID><CENTER_NAME>EARTH</CENTER_NAME>'
+            '<REF_FRAME>EME2000</REF_FRAME><TIME_SYSTEM>UTC</TIME_SYSTEM></metadata><data>'
+            '<COMMENT>Synthetic orbit</COMMENT>' + ''.join(vectors) + '</data></segment></body></oem></ndm>')
@@ -1,4 +1,10 @@
 from iss_tracker import *
+from synthetic_orbit import *
+import atexit
+import multiprocessing
+import subprocess
+import sys
+import tempfile
 import unittest
 from flask import Flask
 from unittest.mock import MagicMock, patch
@@ -43,57 +49,62 @@ data = [{
         }
     ]
 
+# Small OEM document used by tests that should not reach NASA
+OEM_XML = '''<ndm><oem id="CCSDS_OEM_VERS" version="2.0">
+<header><CREATION_DATE>2024-048T19:42:49.488Z</CREATION_DATE><ORIGINATOR>JSC</ORIGINATOR></header>
+<body><segment>
+<metadata><OBJECT_NAME>ISS</OBJECT_NAME><OBJECT_ID>1998-067-A</OBJECT_ID><CENTER_NAME>EARTH</CENTER_NAME><REF_FRAME>EME2000</REF_FRAME><TIME_SYSTEM>UTC</TIME_SYSTEM><START_TIME>2024-049T12:00:00.000Z</START_TIME><STOP_TIME>2024-049T12:12:00.000Z</STOP_TIME></metadata>
+<data>
+<COMMENT>Units are in kg and m^2</COMMENT>
+<COMMENT>MASS=459325.00</COMMENT>
+<COMMENT/>
+<stateVector><EPOCH>2024-049T12:00:00.000Z</EPOCH><X units="km">-4796.4389037341698</X><Y units="km">-4363.3713205600798</Y><Z units="km">2028.7075926579801</Z><X_DOT units="km/s">4.0</X_DOT><Y_DOT units="km/s">-2.5</Y_DOT><Z_DOT units="km/s">5.5</Z_DOT></stateVector>
+<stateVector><EPOCH>2024-049T12:04:00.000Z</EPOCH><X units="km">-3706.7447298429998</X><Y units="km">-5051.8347165812002</Y><Z units="km">3302.2071634003002</Z><X_DOT units="km/s">5.0</X_DOT><Y_DOT units="km/s">-3.0</Y_DOT><Z_DOT units="km/s">4.5</Z_DOT></stateVector>
+<stateVector><EPOCH>2024-049T12:08:00.000Z</EPOCH><X units="km">-2502.1170235577002</X><Y units="km">-5556.2474620999003</Y><Z units="km">4306.3319472451</Z><X_DOT units="km/s">5.5</X_DOT><Y_DOT units="km/s">-2.0</Y_DOT><Z_DOT units="km/s">3.5</Z_DOT></stateVector>
+<stateVector><EPOCH>2024-049T12:12:00.000Z</EPOCH><X units="km">-1160.3013283659</X><Y units="km">-5867.2109928713004</Y><Z units="km">4915.6605539017003</Z><X_DOT units="km/s">5.8</X_DOT><Y_DOT units="km/s">-1.0</Y_DOT><Z_DOT units="km/s">2.0</Z_DOT></stateVector>
+</data></segment></body></oem></ndm>'''
+
+def geocodeCells(path:str, worker:int) -> None:
+    """Function caches 50 cells of its own from a child process, saving the cache after every lookup"""
+    backend = MagicMock()
+    backend.reverse.return_value = {'country': 'Testland'}
+    cache = GeocodeCache(backend, precision=5, size=1000, ttl=60, path=path)
+    for cell in range(50):
+        cache.reverse(worker * 10.0, cell * 0.5)
+        cache.save()
+
+def saveSnapshots(directory:str, count:int) -> None:
+    """Function publishes the small OEM count times from a child process"""
+    snapshot = parseEphemeris(OEM_XML)
+    for _ in range(count):
+        saveSnapshot(snapshot, directory)
+
+def archiveRevisions(directory:str, revisions:range) -> None:
+    """Function archives revisions of the test orbit from a child process. Revision r is created r hours 
+        after the first one, covers rows r to r+29, and has r as the text of every X. 
+    """
+    archive = EphemerisArchive(directory)
+    for revision in revisions:
+        xml = orbitXML(revision + 30, created=ORBIT_START + revision*3600)
+        xml = re.sub(r'<X units="km">[^<]*</X>', f'<X units="km">{revision}</X>', xml)
+        snapshot = parseEphemeris(xml)
+        archive.add(buildEphemeris(snapshot.header, {}, [], snapshot.epochs[revision:], snapshot.text[revision:], snapshot.units))
+
 class TestGetStateVectorData(unittest.TestCase):
+    def setUp(self):
+        ephemeris.clear()
+
+    def tearDown(self):
+        ephemeris.clear()
+
     @patch('requests.get')
-    @patch('xmltodict.parse')
-    def test_get_state_vector_data(self, mock_xmltodict_parse, mock_requests_get):
+    def test_get_state_vector_data(self, mock_requests_get):
         # Mock the response from requests.get
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.text = '<ndm><oem><body><segment><data><stateVector><EPOCH>2024-059T13:04:00.000Z</EPOCH><X units="km">-1678.6226199341099</X><Y units="km">5429.50109555156</Y><Z units="km">-3727.33126342164</Z><X_DOT units="km/s">-6.25282193719364</X_DOT><Y_DOT units="km/s">1.0191494035819</Y_DOT><Z_DOT units="km/s">4.3033190811508302</Z_DOT></stateVector></data></segment></body></oem></ndm>'
+        mock_response.iter_content.return_value = [mock_response.text.encode()]
         mock_requests_get.return_value = mock_response
-       
-        mock_xml_data = {
-            'ndm': {
-                'oem': {
-                    'body': {
-                        'segment': {
-                            'data': {
-                                'stateVector': [{
-                                    "EPOCH": "2024-059T13:04:00.000Z",
-                                    "X": {
-                                        "@units": "km",
-                                        "#text": "-1678.6226199341099"
-                                    },
-                                    "X_DOT": {
-                                        "@units": "km/s",
-                                        "#text": "-6.25282193719364"
-                                    },
-                                    "Y": {
-                                        "@units": "km",
-                                        "#text": "5429.50109555156"
-                                    },
-                                    "Y_DOT": {
-                                        "@units": "km/s",
-                                        "#text": "1.0191494035819"
-                                    },
-                                    "Z": {
-                                        "@units": "km",
-                                        "#text": "-3727.33126342164"
-                                    },
-                                    "Z_DOT": {
-                                        "@units": "km/s",
-                                        "#text": "4.3033190811508302"
-                                    }
-                                }]
-                            }
-                        }
-                    }
-                }
-            }
-        }
-
-        mock_xmltodict_parse.return_value = mock_xml_data
 
         # Call the function with limit and offset
         result = getStateVectorData(limit=1, offset=0)
@@ -131,6 +142,1257 @@ class TestGetStateVectorData(unittest.TestCase):
         
         self.assertDictEqual(result[0], expected_state_vector)
 
+class TestEphemerisCache(unittest.TestCase):
+    def setUp(self):
+        ephemeris.clear()
+
+    def tearDown(self):
+        ephemeris.clear()
+
+    @patch('requests.get')
+    def test_single_download(self, mock_requests_get):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [OEM_XML.encode()]
+        mock_response.headers = {'ETag': '"abc"', 'Last-Modified': 'Sat, 17 Feb 2024 12:00:00 GMT'}
+        mock_requests_get.return_value = mock_response
+
+        getStateVectorData()
+        getStateVectorData()
+        # Every route reads the same cached document
+        self.assertEqual(mock_requests_get.call_count, 1)
+
+    @patch('requests.get')
+    def test_routes_without_data(self, mock_requests_get):
+        mock_requests_get.side_effect = requests.ConnectionError("NASA unreachable")
+        client = app.test_client()
+        for route in ('/comment', '/header', '/metadata', '/epochs?limit=2'):
+            response = client.get(route)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_data(as_text=True), "Epoch not available \n")
+        # Asking for no rows does not need any data
+        self.assertEqual(client.get('/epochs?limit=0').get_json(), [])
+        self.assertEqual(client.get('/epochs?limit=0&format=ndjson').get_data(), b'')
+
+    @patch('requests.get')
+    def test_failed_download_shared(self, mock_requests_get):
+        release = threading.Event()
+        def unreachable(*args, **kwargs):
+            release.wait(5)
+            raise requests.ConnectionError("NASA unreachable")
+        mock_requests_get.side_effect = unreachable
+
+        client = app.test_client()
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(client.get('/now').get_data(as_text=True))) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        # The requests that waited on the failing download share its outcome instead of retrying it one by one
+        self.assertEqual(mock_requests_get.call_count, 1)
+        self.assertEqual(responses, ["Epoch not available \n"] * 20)
+        self.assertIsNone(ephemeris.get())
+        self.assertEqual(mock_requests_get.call_count, 1)
+
+        # After DOWNLOAD_RETRY the next request tries again
+        with patch('iss_tracker.DOWNLOAD_RETRY', 0):
+            ephemeris.get()
+        self.assertEqual(mock_requests_get.call_count, 2)
+
+    @patch('requests.get')
+    def test_conditional_refresh(self, mock_requests_get):
+        ok_response = MagicMock()
+        ok_response.status_code = 200
+        ok_response.iter_content.return_value = [OEM_XML.encode()]
+        ok_response.headers = {'ETag': '"abc"', 'Last-Modified': 'Sat, 17 Feb 2024 12:00:00 GMT'}
+        not_modified = MagicMock()
+        not_modified.status_code = 304
+        not_modified.headers = {}
+        mock_requests_get.side_effect = [ok_response, not_modified]
+
+        first = getStateVectorData()
+        ephemeris.fetched_at -= ephemeris.ttl
+        second = getStateVectorData()
+
+        self.assertEqual(mock_requests_get.call_count, 2)
+        headers = mock_requests_get.call_args.kwargs['headers']
+        self.assertEqual(headers['If-None-Match'], '"abc"')
+        self.assertEqual(headers['If-Modified-Since'], 'Sat, 17 Feb 2024 12:00:00 GMT')
+        self.assertEqual(first, second)
+
+class TestEphemerisRefresher(unittest.TestCase):
+    def setUp(self):
+        ephemeris.clear()
+
+    def tearDown(self):
+        ephemeris.stop()
+        ephemeris.clear()
+
+    @patch('requests.get')
+    def test_stale_while_error(self, mock_requests_get):
+        ok_response = MagicMock()
+        ok_response.status_code = 200
+        ok_response.iter_content.return_value = [OEM_XML.encode()]
+        ok_response.headers = {}
+        mock_requests_get.side_effect = [ok_response, requests.ConnectionError("NASA unreachable"), MagicMock(status_code=503)]
+
+        self.assertTrue(ephemeris.refresh())
+        snapshot = ephemeris.snapshot
+        # Failed downloads keep serving the previous snapshot
+        self.assertFalse(ephemeris.refresh())
+        self.assertFalse(ephemeris.refresh())
+        self.assertIs(ephemeris.snapshot, snapshot)
+        self.assertEqual(len(getStateVectorData()), 4)
+
+    @patch('requests.get')
+    def test_background_refresh(self, mock_requests_get):
+        ok_response = MagicMock()
+        ok_response.status_code = 200
+        ok_response.iter_content.return_value = [OEM_XML.encode()]
+        ok_response.headers = {}
+        mock_requests_get.return_value = ok_response
+
+        ephemeris.start()
+        self.assertTrue(ephemeris.running())
+        data = getStateVectorData()
+        self.assertEqual(data[0]['EPOCH'], '2024-049T12:00:00.000Z')
+        self.assertIsInstance(ephemeris.snapshot, Ephemeris)
+        self.assertEqual(ephemeris.snapshot.comments[:2], ['Units are in kg and m^2', 'MASS=459325.00'])
+        ephemeris.stop()
+        self.assertFalse(ephemeris.running())
+
+    @patch('requests.get')
+    def test_inherited_snapshot(self, mock_requests_get):
+        not_modified = MagicMock(status_code=304, headers={})
+        mock_requests_get.return_value = not_modified
+        # A worker forked from the master starts with the snapshot it preloaded
+        ephemeris.snapshot = parseEphemeris(OEM_XML)
+        ephemeris.fetched_at = time.monotonic()
+        ephemeris.start()
+        time.sleep(0.1)
+        ephemeris.stop()
+        self.assertEqual(mock_requests_get.call_count, 0)
+
+        # Once its TTL is up the refresher revalidates it
+        ephemeris.fetched_at -= ephemeris.ttl
+        ephemeris.start()
+        for _ in range(50):
+            if mock_requests_get.call_count:
+                break
+            time.sleep(0.01)
+        self.assertEqual(mock_requests_get.call_count, 1)
+
+class TestSnapshotPersistence(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = temporary.name
+
+    def okResponse(self):
+        response = MagicMock()
+        response.status_code = 200
+        response.iter_content.return_value = [OEM_XML.encode()]
+        response.headers = {'ETag': '"v1"'}
+        return response
+
+    def test_round_trip(self):
+        snapshot = parseEphemeris(OEM_XML, '"v1"', 'Sun, 18 Feb 2024 12:00:00 GMT')
+        version = saveSnapshot(snapshot, self.directory)
+        self.assertEqual(currentSnapshotVersion(self.directory), version)
+
+        loaded, saved_at = loadSnapshot(self.directory)
+        self.assertAlmostEqual(saved_at, time.time(), delta=60)
+        self.assertIsInstance(loaded.times, np.memmap)
+        self.assertFalse(loaded.positions.flags.writeable)
+        for name in SNAPSHOT_COLUMNS:
+            np.testing.assert_array_equal(getattr(loaded, name), getattr(snapshot, name))
+        self.assertEqual((loaded.header, loaded.metadata, loaded.comments, loaded.units), 
+                         (snapshot.header, snapshot.metadata, snapshot.comments, snapshot.units))
+        self.assertEqual((loaded.etag, loaded.last_modified), ('"v1"', 'Sun, 18 Feb 2024 12:00:00 GMT'))
+        self.assertEqual(loaded.find('2024-049T12:04:00.000Z'), 1)
+        self.assertEqual(loaded.stateVector(2), snapshot.stateVector(2))
+
+    def test_old_versions_removed(self):
+        snapshot = parseEphemeris(OEM_XML)
+        versions = [saveSnapshot(snapshot, self.directory) for _ in range(SNAPSHOT_KEEP + 2)]
+        self.assertEqual(sorted(name for name in os.listdir(self.directory) if name not in ('CURRENT', '.lock')), versions[-SNAPSHOT_KEEP:])
+        self.assertEqual(currentSnapshotVersion(self.directory), versions[-1])
+
+    def test_processes_share_directory(self):
+        # Four processes keep publishing into the same directory at once
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=saveSnapshots, args=(self.directory, 10)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual([worker.exitcode for worker in workers], [0] * 4)
+
+        # CURRENT points at a complete version that survived every prune
+        loaded, _ = loadSnapshot(self.directory)
+        self.assertEqual(loaded.find('2024-049T12:04:00.000Z'), 1)
+        names = os.listdir(self.directory)
+        self.assertLessEqual(len([name for name in names if os.path.isdir(os.path.join(self.directory, name))]), SNAPSHOT_KEEP + 1)
+        self.assertEqual([name for name in names if name.endswith('.tmp')], [])
+
+    @patch('requests.get')
+    def test_offline_boot(self, mock_requests_get):
+        mock_requests_get.return_value = self.okResponse()
+        self.assertTrue(EphemerisCache('http://oem', 600, self.directory).refresh())
+
+        # A new process serves the saved snapshot without touching the network while it is fresh
+        mock_requests_get.reset_mock()
+        mock_requests_get.side_effect = requests.ConnectionError("NASA unreachable")
+        cache = EphemerisCache('http://oem', 600, self.directory)
+        self.assertEqual(len(cache.get()), 4)
+        mock_requests_get.assert_not_called()
+
+        # Once it expires the download is attempted, and the saved snapshot keeps being served
+        stale = EphemerisCache('http://oem', 0, self.directory)
+        self.assertEqual(len(stale.get()), 4)
+        mock_requests_get.assert_called_once()
+        self.assertEqual(mock_requests_get.call_args.kwargs['headers']['If-None-Match'], '"v1"')
+
+    @patch('requests.get')
+    def test_shared_directory(self, mock_requests_get):
+        mock_requests_get.return_value = self.okResponse()
+        first = EphemerisCache('http://oem', 600, self.directory)
+        second = EphemerisCache('http://oem', 600, self.directory)
+        first.get()
+        second.get()
+        # The second cache picked up the first one's download
+        self.assertEqual(mock_requests_get.call_count, 1)
+        self.assertEqual(second.version, first.version)
+
+    @patch('iss_tracker.SNAPSHOT_POLL', 0.02)
+    @patch('requests.get')
+    def test_single_refresher(self, mock_requests_get):
+        mock_requests_get.return_value = self.okResponse()
+        caches = [EphemerisCache('http://oem', 600, self.directory) for _ in range(3)]
+        for cache in caches:
+            cache.start()
+            self.addCleanup(cache.stop)
+
+        def waitFor(condition):
+            deadline = time.monotonic() + 10
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(condition())
+
+        waitFor(lambda: all(cache.snapshot is not None for cache in caches))
+        # One refresher downloaded, the others loaded what it saved, and all of them serve the mapped files
+        self.assertEqual(mock_requests_get.call_count, 1)
+        self.assertEqual([cache._leader is not None for cache in caches].count(True), 1)
+        self.assertEqual(len({cache.version for cache in caches}), 1)
+        for cache in caches:
+            self.assertIsInstance(cache.snapshot.positions, np.memmap)
+
+        # Once the leader is gone and the snapshot expires, another process revalidates it
+        leader = next(cache for cache in caches if cache._leader is not None)
+        leader.stop()
+        expired = time.time() - 3600
+        os.utime(os.path.join(self.directory, 'CURRENT'), (expired, expired))
+        mock_requests_get.return_value = MagicMock(status_code=304, headers={})
+        for cache in caches:
+            cache.fetched_at -= 3600
+        waitFor(lambda: mock_requests_get.call_count == 2)
+        self.assertEqual([cache._leader is not None for cache in caches].count(True), 1)
+        # The 304 is shared through CURRENT, so the follower's snapshot counts as fresh again
+        follower = next(cache for cache in caches if cache is not leader and cache._leader is None)
+        waitFor(lambda: time.monotonic() - follower.fetched_at < 60)
+        self.assertEqual(mock_requests_get.call_count, 2)
+
+class TestColumnarEphemeris(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+        ephemeris.snapshot = parseEphemeris(OEM_XML)
+        ephemeris.fetched_at = time.monotonic()
+
+    def tearDown(self):
+        ephemeris.clear()
+
+    def test_columns(self):
+        snapshot = ephemeris.snapshot
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(snapshot.positions.shape, (4, 3))
+        self.assertEqual(snapshot.velocities.dtype, np.float64)
+        self.assertEqual(snapshot.times[1] - snapshot.times[0], 240.0)
+        self.assertEqual(snapshot.velocities[0].tolist(), [4.0, -2.5, 5.5])
+
+    def test_streaming_parse(self):
+        # Feeding the document in tiny chunks gives the same snapshot as parsing it whole
+        encoded = OEM_XML.encode()
+        snapshot = parseEphemeris(encoded[i:i + 7] for i in range(0, len(encoded), 7))
+        self.assertEqual(snapshot.epochs.tolist(), ephemeris.snapshot.epochs.tolist())
+        self.assertEqual(snapshot.text.tolist(), ephemeris.snapshot.text.tolist())
+        self.assertEqual(snapshot.header, {'CREATION_DATE': '2024-048T19:42:49.488Z', 'ORIGINATOR': 'JSC'})
+        self.assertEqual(snapshot.metadata['REF_FRAME'], 'EME2000')
+        self.assertEqual(snapshot.comments, ['Units are in kg and m^2', 'MASS=459325.00', None])
+        self.assertEqual(snapshot.units, ('km', 'km', 'km', 'km/s', 'km/s', 'km/s'))
+        with self.assertRaises(ValueError):
+            parseEphemeris('<ndm><oem>')
+
+    def test_epochs_filters(self):
+        response = self.app.get('/epochs?start=2024-049T12:04:00.000Z&end=2024-049T12:08:00.000Z')
+        self.assertEqual([row['EPOCH'] for row in response.get_json()], ['2024-049T12:04:00.000Z', '2024-049T12:08:00.000Z'])
+
+        # Cursor paging continues after the last epoch of the previous page
+        response = self.app.get('/epochs?limit=2&after=2024-049T12:04:00.000Z')
+        self.assertEqual([row['EPOCH'] for row in response.get_json()], ['2024-049T12:08:00.000Z', '2024-049T12:12:00.000Z'])
+
+        response = self.app.get('/epochs?limit=1&fields=x,Z_DOT')
+        self.assertEqual(list(response.get_json()[0]), ['EPOCH', 'X', 'Z_DOT'])
+
+        response = self.app.get('/epochs?fields=W')
+        self.assertEqual(response.get_data(as_text=True), "Error: Fields must be a comma separated list of X, Y, Z, X_DOT, Y_DOT, Z_DOT \n")
+        response = self.app.get('/epochs?start=soon')
+        self.assertEqual(response.get_data(as_text=True), "Error: Start must be a valid time \n")
+
+    def test_window(self):
+        snapshot = ephemeris.snapshot
+        self.assertEqual(snapshot.window(), range(0, 4))
+        self.assertEqual(snapshot.window(start=snapshot.times[1] + 1), range(2, 4))
+        self.assertEqual(snapshot.window(end=snapshot.times[0] - 1), range(0, 0))
+
+    def test_cached_responses(self):
+        response = self.app.get('/epochs')
+        self.assertEqual(response.get_json(), [ephemeris.snapshot.stateVector(index) for index in range(4)])
+        etag = response.headers['ETag']
+
+        # Clients that already have the payload get a 304
+        response = self.app.get('/epochs', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.app.get('/header', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.data)), {'CREATION_DATE': '2024-048T19:42:49.488Z', 'ORIGINATOR': 'JSC'})
+        self.assertNotEqual(response.headers['ETag'], self.app.get('/header').headers['ETag'])
+
+        self.assertEqual(self.app.get('/metadata').get_json()['OBJECT_NAME'], 'ISS')
+        self.assertEqual(self.app.get('/comment').get_json(), ['Units are in kg and m^2', 'MASS=459325.00', None])
+        # Payloads are serialized once per snapshot
+        self.assertIs(cachedResponse(ephemeris.snapshot, 'epochs'), cachedResponse(ephemeris.snapshot, 'epochs'))
+
+    def test_state_vector_round_trip(self):
+        # Row views serialize the exact text NASA published
+        row = ephemeris.snapshot.stateVector(0)
+        self.assertEqual(row['EPOCH'], '2024-049T12:00:00.000Z')
+        self.assertEqual(row['X'], {'@units': 'km', '#text': '-4796.4389037341698'})
+        self.assertEqual(row['Z_DOT'], {'@units': 'km/s', '#text': '5.5'})
+
+    def test_epoch_route(self):
+        response = self.app.get('/epochs/2024-049T12:04:00.000Z')
+        self.assertEqual(response.get_json(), ephemeris.snapshot.stateVector(1))
+        response = self.app.get('/epochs/2024-049T12:04:00.000Z/speed')
+        self.assertEqual(response.get_json(), {"INSTANTANEOUS SPEED": {"#text": round(math.sqrt(54.25), 3), "@units": "km/s"}})
+
+    def test_epoch_index(self):
+        snapshot = ephemeris.snapshot
+        self.assertEqual(snapshot.find('2024-049T12:08:00.000Z'), 2)
+        # Equivalent spellings of the same instant find the same row
+        self.assertEqual(snapshot.find('2024-49T12:08:00Z'), 2)
+        self.assertIsNone(snapshot.find('2024-049T12:09:00.000Z'))
+        self.assertIsNone(snapshot.find('invalid_epoch'))
+        response = self.app.get('/epochs/2024-49T12:04:00.000Z/speed')
+        self.assertIn("INSTANTANEOUS SPEED", response.get_json())
+
+    def test_nearest_epoch(self):
+        times = ephemeris.snapshot.times
+        start = times[0]
+        self.assertIsNone(nearestEpochIndex(times, start))
+        self.assertEqual(nearestEpochIndex(times, start + 1), 0)
+        self.assertEqual(nearestEpochIndex(times, start + 239, past_only=False), 1)
+        self.assertEqual(nearestEpochIndex(times, start + 10**6), 3)
+        self.assertEqual(getNowEpoch(ephemeris.snapshot, at=start + 300)['EPOCH'], '2024-049T12:04:00.000Z')
+
+    def test_now_time_at(self):
+        response = self.app.get('/now/time?at=2024-02-18T12:07:00Z')
+        data = response.get_json()
+        self.assertEqual(data['Current Time'], '2024-049T12:07:00.000Z')
+        self.assertEqual(data['Latest Epoch Time'], '2024-049T12:04:00.000Z')
+        self.assertEqual(data['Nearest Epoch Time'], '2024-049T12:08:00.000Z')
+        response = self.app.get('/now/time?at=yesterday')
+        self.assertEqual(response.get_data(as_text=True), "Error: at must be a valid time \n")
+
+    def test_non_finite_times(self):
+        geocoder = MagicMock(land_coverage=True)
+        geocoder.reverse.return_value = None
+        with patch('iss_tracker.geocoder', geocoder):
+            for at in ('nan', 'inf', '-inf', '1e20', '-1e20', '10000-01-01T00:00:00Z'):
+                for route in ('/now', '/now/time', '/position'):
+                    response = self.app.get(f'{route}?at={at}')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.get_data(as_text=True), "Error: at must be a valid time \n")
+        self.assertEqual(self.app.get('/epochs?start=nan').get_data(as_text=True), "Error: Start must be a valid time \n")
+        self.assertEqual(parseTime('0'), 0.0)
+
+    def test_epochs_paging(self):
+        response = self.app.get('/epochs?limit=2&offset=1')
+        data = response.get_json()
+        self.assertEqual([row['EPOCH'] for row in data], ['2024-049T12:04:00.000Z', '2024-049T12:08:00.000Z'])
+
+class TestPositionStream(unittest.TestCase):
+    def setUp(self):
+        # An orbit around the current time so the streamed positions are inside the data set
+        start = time.time() - 3600
+        text = [[repr(value) for value in orbitState(row * 240)] for row in range(30)]
+        epochs = [formatEpoch(start + row*240) for row in range(30)]
+        ephemeris.snapshot = buildEphemeris({}, {}, [], epochs, text, ('km',)*3 + ('km/s',)*3)
+        ephemeris.fetched_at = time.monotonic()
+        app.testing = True
+        self.app = app.test_client()
+
+    def tearDown(self):
+        # Let the producer notice it has no subscribers before the data set goes away
+        producer = position_stream._thread
+        if producer is not None:
+            producer.join()
+        ephemeris.clear()
+
+    def readEvent(self, events) -> dict:
+        fields = dict(line.split(': ', 1) for line in next(events).decode().strip().split('\n'))
+        return fields
+
+    def openStream(self, rate):
+        response = self.app.get(f'/now/stream?rate={rate}')
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        return response, iter(response.response)
+
+    def test_stream(self):
+        response, events = self.openStream(10)
+        first, second = self.readEvent(events), self.readEvent(events)
+        self.assertEqual(first['event'], 'position')
+        data = json.loads(first['data'])
+        self.assertAlmostEqual(data['Altitude [km]'], ORBIT_RADIUS - 6378, delta=30)
+        self.assertAlmostEqual(data['Instantaneous Speed [km/s]'], ORBIT_RADIUS * ORBIT_RATE, delta=0.01)
+        self.assertAlmostEqual(parseEpoch(json.loads(second['data'])['Epoch Time']) - parseEpoch(data['Epoch Time']), 0.1, delta=1e-3)
+        self.assertEqual(position_stream.subscribers, 1)
+        response.close()
+        self.assertEqual(position_stream.subscribers, 0)
+        self.assertEqual(position_stream.rates, {})
+
+    def test_ticks_shared(self):
+        with patch('iss_tracker.positionEvent', wraps=positionEvent) as mock_event, \
+                patch.object(position_stream, 'max_subscribers', 5):
+            subscribers = [self.openStream(10) for _ in range(5)]
+            ids = [[self.readEvent(events)['id'] for _, events in subscribers] for _ in range(3)]
+            for response, _ in subscribers:
+                response.close()
+        # Subscribers share ticks, and each tick is computed once however many receive it
+        ticks = {tick for round in ids for tick in round}
+        self.assertLess(len(ticks), 5*3)
+        self.assertLessEqual(mock_event.call_count, len(ticks) + 1)
+
+    def test_rate(self):
+        with patch('iss_tracker.positionEvent', wraps=positionEvent) as mock_event:
+            response, events = self.openStream(2)
+            times = [parseEpoch(json.loads(self.readEvent(events)['data'])['Epoch Time']) for _ in range(3)]
+            response.close()
+        # The first position is sent right away, the next ones on the half second
+        self.assertLessEqual(round(times[1] - times[0], 3), 0.5)
+        self.assertEqual(round(times[2] - times[1], 3), 0.5)
+        self.assertEqual(times[2] % 0.5, 0)
+        # With no faster subscriber the producer only computes the positions that are sent
+        self.assertLessEqual(mock_event.call_count, 4)
+
+    def test_subscriber_limit(self):
+        streams = [self.openStream(1) for _ in range(position_stream.max_subscribers)]
+        response = self.app.get('/now/stream')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_data(as_text=True), 'Error: Too many open position streams, try again later \n')
+        streams.pop()[0].close()
+        # A stream that was never read from still frees its place when closed
+        streams.append(self.openStream(1))
+        for response, _ in streams:
+            response.close()
+        self.assertEqual(position_stream.subscribers, 0)
+
+    def test_route(self):
+        self.assertEqual(self.app.get('/now/stream?rate=20').get_data(as_text=True), 'Error: rate must be a number of positions per second up to 10 \n')
+        self.assertTrue(self.app.get('/now/stream?rate=abc').get_data(as_text=True).startswith('Error'))
+        response, events = self.openStream(10)
+        self.assertTrue(next(events).startswith(b'id: '))
+        response.close()
+
+class TestPasses(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.snapshot = parseEphemeris(orbitXML(360))
+
+    def setUp(self):
+        ephemeris.snapshot = self.snapshot
+        ephemeris.fetched_at = time.monotonic()
+        app.testing = True
+        self.app = app.test_client()
+
+    def tearDown(self):
+        ephemeris.clear()
+
+    def elevations(self, latitude, longitude, times):
+        ecef = eciToEcef(interpolateStateVectors(self.snapshot, times)[0], times)
+        observer = geodeticToEcef(np.array([0.0]), np.array([latitude]), np.array([longitude]))[0]
+        return lookAngles(ecef, observer, topocentricFrames(np.array([latitude]), np.array([longitude]))[0])[0]
+
+    def test_matches_dense_sampling(self):
+        passes = predictPasses(self.snapshot, [(29.76, -95.37, 0.0)], 10.0)[0]
+        times = np.arange(self.snapshot.times[0], self.snapshot.times[-1], 1.0)
+        elevation = self.elevations(29.76, -95.37, times)
+        above = np.diff((elevation >= 10).astype(int))
+        rises, sets = times[np.flatnonzero(above == 1) + 1], times[np.flatnonzero(above == -1)]
+        self.assertEqual(len(passes), len(rises))
+        for found, rise, set_ in zip(passes, rises, sets):
+            self.assertAlmostEqual(parseEpoch(found['Rise Time']), rise, delta=1.0)
+            self.assertAlmostEqual(parseEpoch(found['Set Time']), set_, delta=1.0)
+            in_pass = (times >= rise) & (times <= set_)
+            self.assertAlmostEqual(found['Max Elevation [degrees]'], elevation[in_pass].max(), delta=0.1)
+            self.assertLess(parseEpoch(found['Rise Time']), parseEpoch(found['Culmination Time']))
+            self.assertLess(parseEpoch(found['Culmination Time']), parseEpoch(found['Set Time']))
+
+    def test_pass_in_progress(self):
+        # Directly below the ISS at the first epoch, so the window starts in the middle of a pass
+        _, latitude, longitude = calculateLocations(self.snapshot.positions[:1], self.snapshot.times[:1])
+        passes = predictPasses(self.snapshot, [(float(latitude[0]), float(longitude[0]), 0.0)], 10.0)[0]
+        self.assertIsNone(passes[0]['Rise Time'])
+        self.assertIsNone(passes[0]['Duration [s]'])
+        self.assertGreater(passes[0]['Max Elevation [degrees]'], 85)
+        self.assertIsNotNone(passes[1]['Rise Time'])
+
+    def test_batch(self):
+        observers = [(29.76, -95.37, 0.0), (51.5, -0.13, 0.05), (-33.9, 151.2, 0.0)]
+        batch = predictPasses(self.snapshot, observers, 20.0)
+        for observer, passes in zip(observers, batch):
+            self.assertEqual(passes, predictPasses(self.snapshot, [observer], 20.0)[0])
+        # The higher the minimum elevation, the fewer the passes
+        self.assertLessEqual(len(batch[0]), len(predictPasses(self.snapshot, observers[:1], 10.0)[0]))
+
+    def test_route(self):
+        data = self.app.get('/passes?lat=29.76&lon=-95.37').get_json()
+        self.assertEqual(data['Minimum Elevation [degrees]'], 10.0)
+        self.assertEqual(data['Passes'], predictPasses(self.snapshot, [(29.76, -95.37, 0.0)])[0])
+
+        data = self.app.get('/passes?lat=29.76&lon=-95.37&lat=51.5&lon=-0.13&alt=0.05&min_elevation=20').get_json()
+        self.assertEqual([observer['Latitude [degrees]'] for observer in data], [29.76, 51.5])
+        self.assertEqual(data[1]['Altitude [km]'], 0.05)
+
+        end = formatEpoch(self.snapshot.times[0] + 6*3600)
+        data = self.app.get(f'/passes?lat=29.76&lon=-95.37&end={end}').get_json()
+        self.assertTrue(all(parseEpoch(found['Culmination Time']) <= parseEpoch(end) for found in data['Passes']))
+
+        self.assertEqual(self.app.get('/passes?lat=29.76').get_data(as_text=True), 'Error: Every observer needs a lat and a lon \n')
+        self.assertEqual(self.app.get('/passes?lat=north&lon=1').get_data(as_text=True), 'Error: lat, lon, alt, and min_elevation must be numbers \n')
+        self.assertEqual(self.app.get('/passes?lat=91&lon=1').get_data(as_text=True), 'Error: lat must be within [-90, 90] and lon within [-180, 180] \n')
+
+    def test_non_finite_values(self):
+        for query in ('lat=nan&lon=1', 'lat=1&lon=inf', 'lat=1&lon=1&alt=nan', 'lat=1&lon=1&alt=-inf', 'lat=1&lon=1&min_elevation=nan'):
+            response = self.app.get(f'/passes?{query}')
+            self.assertEqual(response.get_data(as_text=True), 'Error: lat, lon, alt, and min_elevation must be numbers \n', query)
+        for query in ('start=nan', 'end=inf', 'start=-1e20'):
+            response = self.app.get(f'/passes?lat=1&lon=1&{query}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_data(as_text=True), 'Error: start and end must be valid times \n', query)
+
+class TestEphemerisArchive(unittest.TestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.archive = EphemerisArchive(temporary.name)
+        app.testing = True
+        self.app = app.test_client()
+
+    def tearDown(self):
+        ephemeris.clear()
+
+    def test_newer_revision_wins(self):
+        newer_xml = OEM_XML.replace('2024-048T19:42:49.488Z', '2024-049T19:42:49.488Z').replace('-4796.4389037341698', '-4796.5')
+        older, newer = parseEphemeris(OEM_XML), parseEphemeris(newer_xml)
+        self.archive.add(newer)
+        # Archiving an older revision afterwards does not overwrite the newer values
+        self.archive.add(older)
+        snapshot = self.archive.query()
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(snapshot.stateVector(0)['X']['#text'], '-4796.5')
+        self.assertEqual(snapshot.stateVector(1), older.stateVector(1))
+
+    def test_chunks(self):
+        # 400 samples 4 minutes apart from noon run past midnight into a second file
+        snapshot = parseEphemeris(orbitXML(400))
+        self.assertEqual(self.archive.add(snapshot), 2)
+        self.assertTrue(os.path.exists(os.path.join(self.archive.directory, '2024-049.npz')))
+        self.assertTrue(os.path.exists(os.path.join(self.archive.directory, '2024-050.npz')))
+        self.assertEqual(self.archive.bounds(), (snapshot.times[0], snapshot.times[-1]))
+
+        midnight = parseEpoch('2024-050T00:00:00.000Z')
+        history = self.archive.query(midnight - 3600, midnight + 3600)
+        self.assertEqual(len(history), 31)
+        np.testing.assert_array_equal(history.positions, snapshot.positions[165:196])
+        self.assertIsNone(self.archive.query(snapshot.times[-1] + 1))
+        # A new instance reads the index written by the first one
+        self.assertEqual(len(EphemerisArchive(self.archive.directory).query()), 400)
+
+    def test_processes_share_directory(self):
+        # Four processes archive twelve overlapping revisions at once, in no particular order
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=archiveRevisions, args=(self.archive.directory, range(worker, 12, 4))) for worker in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual([worker.exitcode for worker in workers], [0] * 4)
+
+        snapshot = self.archive.query()
+        self.assertEqual(len(snapshot), 41)
+        # No update was lost, every row holds the newest revision that covers it
+        self.assertEqual([snapshot.stateVector(row)['X']['#text'] for row in range(41)], [str(min(row, 11)) for row in range(41)])
+        self.assertEqual([name for name in os.listdir(self.archive.directory) if name.endswith('.tmp')], [])
+
+    def test_gaps_not_interpolated(self):
+        # Two revisions a day long with five days between them, the archive splices them into one snapshot
+        first, second = parseEphemeris(orbitXML(360)), parseEphemeris(orbitXML(360, start=ORBIT_START + 6*86400))
+        self.archive.add(first)
+        self.archive.add(second)
+        history = self.archive.query()
+        self.assertEqual(history.spacing, 240)
+        gap = ORBIT_START + 3*86400
+        with self.assertRaises(ValueError):
+            interpolateStateVectors(history, gap)
+        # The samples on either side of the gap are still exact
+        positions, _ = interpolateStateVectors(history, [first.times[-1], second.times[0]])
+        np.testing.assert_array_equal(positions, [first.positions[-1], second.positions[0]])
+
+        ephemeris.snapshot = second
+        ephemeris.fetched_at = time.monotonic()
+        with patch('iss_tracker.archive', self.archive):
+            response = self.app.get(f'/position?at={formatEpoch(gap)}')
+            self.assertEqual(response.get_data(as_text=True), "Error: Time outside of the ephemeris window \n")
+            response = self.app.get(f'/groundtrack?start={formatEpoch(ORBIT_START)}&end={formatEpoch(ORBIT_START + 7*86400 - 3600)}&step=86400')
+            self.assertEqual(response.get_data(as_text=True), "Error: Time outside of the ephemeris window \n")
+            self.assertAlmostEqual(self.app.get(f'/position?at={formatEpoch(ORBIT_START + 120)}').get_json()['X']['#text'], orbitState(120)[0], delta=0.2)
+
+        # Passes are predicted on each side of the gap, none inside it
+        observers = [(29.76, -95.37, 0.0)]
+        expected = predictPasses(first, observers)[0] + predictPasses(second, observers)[0]
+        self.assertEqual(predictPasses(history, observers)[0], expected)
+
+    def test_groundtrack_limit(self):
+        self.archive.add(parseEphemeris(orbitXML(720)))
+        ephemeris.snapshot = parseEphemeris(orbitXML(10))
+        ephemeris.fetched_at = time.monotonic()
+        # The files of days 049 and 050 lie inside the range, the one of day 051 does not
+        self.assertEqual(self.archive.countWithin(ORBIT_START, ORBIT_START + 600*240), 180 + 360)
+        end = formatEpoch(ORBIT_START + 719*240)
+        with patch('iss_tracker.archive', self.archive), patch('iss_tracker.GROUNDTRACK_MAX_POINTS', 300), \
+                patch.object(self.archive, 'query', wraps=self.archive.query) as query:
+            self.assertEqual(self.app.get(f'/groundtrack?end={end}').get_data(as_text=True), 'Error: A ground track is limited to 300 points \n')
+            query.assert_not_called()
+            self.assertEqual(len(self.app.get(f'/groundtrack?end={formatEpoch(ORBIT_START + 299*240)}').get_json()['Epoch Time']), 300)
+
+    def test_routes_use_archive(self):
+        self.archive.add(parseEphemeris(orbitXML(30)))
+        # Only the first 10 samples are still in the current file
+        ephemeris.snapshot = parseEphemeris(orbitXML(10))
+        ephemeris.fetched_at = time.monotonic()
+        rolled_off = formatEpoch(ORBIT_START + 20*240)
+
+        self.assertEqual(self.app.get(f'/epochs/{rolled_off}').get_data(as_text=True), 'Epoch not available \n')
+        with patch('iss_tracker.archive', self.archive):
+            self.assertEqual(self.app.get(f'/epochs/{rolled_off}').get_json()['EPOCH'], rolled_off)
+            self.assertIn('INSTANTANEOUS SPEED', self.app.get(f'/epochs/{rolled_off}/speed').get_json())
+
+            data = self.app.get(f'/epochs?start={formatEpoch(ORBIT_START + 5*240)}&end={rolled_off}').get_json()
+            self.assertEqual([row['EPOCH'] for row in data], [formatEpoch(ORBIT_START + row*240) for row in range(5, 21)])
+
+            at = ORBIT_START + 20*240 + 120
+            data = self.app.get(f'/position?at={formatEpoch(at)}').get_json()
+            self.assertAlmostEqual(data['X']['#text'], orbitState(20*240 + 120)[0], delta=0.2)
+
+            # Inside the current window the archive is not read, an open bound stands for its edge
+            with patch.object(self.archive, 'query') as mock_query:
+                self.app.get(f'/position?at={formatEpoch(ORBIT_START + 120)}')
+                data = self.app.get(f'/epochs?start={formatEpoch(ORBIT_START + 5*240)}').get_json()
+                self.assertEqual([row['EPOCH'] for row in data], [formatEpoch(ORBIT_START + row*240) for row in range(5, 10)])
+                self.assertEqual(len(self.app.get(f'/epochs?end={formatEpoch(ORBIT_START + 5*240)}').get_json()), 6)
+                mock_query.assert_not_called()
+
+    def test_files_read_once(self):
+        snapshot = parseEphemeris(orbitXML(400))
+        self.archive.add(snapshot)
+        with patch.object(self.archive, '_loadChunk', wraps=self.archive._loadChunk) as load, \
+                patch('iss_tracker.parseEpoch', side_effect=AssertionError) as parse:
+            history = self.archive.query()
+            self.archive.query(snapshot.times[10], snapshot.times[20])
+            self.assertEqual(load.call_count, 2)
+            parse.assert_not_called()
+        # The cached columns match a snapshot built from the text
+        for column in ('epochs', 'times', 'positions', 'velocities', 'altitudes', 'latitudes', 'longitudes'):
+            np.testing.assert_array_equal(getattr(history, column), getattr(snapshot, column))
+        self.assertEqual(history.index, snapshot.index)
+
+        # A file rewritten by another revision is read again
+        newer = orbitXML(10, created=ORBIT_START).replace(repr(orbitState(0)[0]), '1.5')
+        self.archive.add(parseEphemeris(newer))
+        with patch.object(self.archive, '_loadChunk', wraps=self.archive._loadChunk) as load:
+            self.assertEqual(self.archive.query().stateVector(0)['X']['#text'], '1.5')
+            self.assertEqual(load.call_count, 1)
+
+    @patch('requests.get')
+    def test_downloads_archived(self, mock_requests_get):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [OEM_XML.encode()]
+        mock_response.headers = {}
+        mock_requests_get.return_value = mock_response
+
+        self.assertTrue(EphemerisCache('http://oem', 600, archive=self.archive).refresh())
+        self.assertEqual(len(self.archive.query()), 4)
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+
+    def tearDown(self):
+        ephemeris.clear()
+
+    def test_histogram(self):
+        histogram = Histogram('test_seconds', 'Test.', ('route',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, '/a"b')
+        self.assertEqual(histogram.render()[2:], ['test_seconds_bucket{route="/a\\"b",le="0.1"} 1', 
+                                                  'test_seconds_bucket{route="/a\\"b",le="1.0"} 2', 
+                                                  'test_seconds_bucket{route="/a\\"b",le="+Inf"} 3', 
+                                                  'test_seconds_sum{route="/a\\"b"} 5.55', 
+                                                  'test_seconds_count{route="/a\\"b"} 3'])
+        with self.assertRaises(ValueError):
+            with histogram.time('/b'):
+                raise ValueError
+        self.assertEqual(histogram.count('/b'), 1)
+
+    @patch('requests.get')
+    def test_download(self, mock_requests_get):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [OEM_XML.encode()[:100], OEM_XML.encode()[100:]]
+        mock_response.headers = {}
+        mock_requests_get.return_value = mock_response
+        downloads, parses, sizes = UPSTREAM_RESPONSES.value('200'), STAGE_SECONDS.count('parse'), UPSTREAM_BYTES.count()
+
+        self.app.get('/epochs?limit=1')
+        self.assertEqual(UPSTREAM_RESPONSES.value('200'), downloads + 1)
+        self.assertEqual(STAGE_SECONDS.count('parse'), parses + 1)
+        self.assertEqual(UPSTREAM_BYTES.count(), sizes + 1)
+        text = self.app.get('/metrics').get_data(as_text=True)
+        self.assertIn('iss_dataset_state_vectors 4.0', text)
+        self.assertIn(f"iss_dataset_created_timestamp_seconds {parseEpoch('2024-048T19:42:49.488Z')!r}", text)
+        self.assertIn('# TYPE iss_upstream_response_bytes histogram', text)
+
+    def test_routes(self):
+        ephemeris.snapshot = parseEphemeris(OEM_XML)
+        ephemeris.fetched_at = time.monotonic()
+        geocoder = MagicMock(land_coverage=True)
+        geocoder.reverse.return_value = {'city': 'Houston', 'state': 'Texas', 'country': 'United States', 'country_code': 'us'}
+        geocodes, lookups = STAGE_SECONDS.count('geocode'), STAGE_SECONDS.count('lookup')
+        requests_before = REQUEST_SECONDS.count('/now', 'GET', '200')
+        with patch('iss_tracker.geocoder', geocoder):
+            self.app.get('/now?at=2024-049T12:05:00.000Z')
+        self.assertEqual(REQUEST_SECONDS.count('/now', 'GET', '200'), requests_before + 1)
+        self.assertEqual(STAGE_SECONDS.count('geocode'), geocodes + 1)
+        self.assertEqual(STAGE_SECONDS.count('lookup'), lookups + 1)
+
+        response = self.app.get('/metrics')
+        self.assertEqual(response.content_type, 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.get_data(as_text=True)
+        self.assertIn('# TYPE iss_request_duration_seconds histogram', text)
+        self.assertIn('iss_request_duration_seconds_count{route="/now",method="GET",status="200"}', text)
+        self.assertIn('iss_stage_duration_seconds_bucket{stage="locate",le="+Inf"}', text)
+        self.assertIn('iss_ephemeris_cache_lookups_total{result="hit"}', text)
+        self.assertIn('iss_ephemeris_cache_hit_ratio', text)
+        self.assertIn('iss_dataset_age_seconds', text)
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+        ephemeris.snapshot = parseEphemeris(OEM_XML)
+        ephemeris.fetched_at = time.monotonic()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.profiler = RequestProfiler(app.wsgi_app, 'secret', self.directory.name)
+        patcher = patch.object(app, 'wsgi_app', self.profiler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        ephemeris.clear()
+
+    def test_installed_with_token(self):
+        # The middleware is installed at import, so the module is imported afresh in a child process
+        script = 'import iss_tracker; print(type(iss_tracker.app.wsgi_app).__name__)'
+        directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for token, installed in (('secret', True), (None, False)):
+            env = {name: value for name, value in os.environ.items() if name != 'ISS_PROFILE_TOKEN'}
+            if token is not None:
+                env['ISS_PROFILE_TOKEN'] = token
+            output = subprocess.run([sys.executable, '-c', script], cwd=directory, env=env, 
+                                    capture_output=True, text=True, check=True).stdout
+            self.assertEqual(output.strip() == 'RequestProfiler', installed)
+
+    def test_text_profile(self):
+        response = self.app.get('/epochs?limit=2&profile=1', headers={'X-Profile-Token': 'secret'})
+        text = response.get_data(as_text=True)
+        self.assertEqual(response.status_code, 200)
+        # The route ran without the profile parameter and its streamed body was produced in the profiler
+        self.assertTrue(text.startswith('GET /epochs?limit=2 -> 200 OK in '))
+        self.assertIn('cumulative', text)
+        self.assertIn('streamStateVectors', text)
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+        # Requests without ?profile= are served as usual
+        self.assertEqual(len(self.app.get('/epochs?limit=2', headers={'X-Profile-Token': 'secret'}).get_json()), 2)
+
+    def test_pstats_profile(self):
+        response = self.app.get('/epochs/2024-049T12:04:00.000Z?profile=pstats', headers={'X-Profile-Token': 'secret'})
+        self.assertEqual(response.mimetype, 'application/octet-stream')
+        path = os.path.join(self.directory.name, 'response.prof')
+        with open(path, 'wb') as f:
+            f.write(response.get_data())
+        functions = [function for _, _, function in pstats.Stats(path).stats]
+        self.assertIn('epoch', functions)
+
+    def test_token(self):
+        self.assertEqual(self.app.get('/epochs?profile=1').status_code, 403)
+        self.assertEqual(self.app.get('/epochs?profile=1', headers={'X-Profile-Token': 'wrong'}).status_code, 403)
+        with self.profiler._lock:
+            response = self.app.get('/epochs?profile=1', headers={'X-Profile-Token': 'secret'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+class TestStreamedEpochs(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+        ephemeris.snapshot = parseEphemeris(OEM_XML)
+        ephemeris.fetched_at = time.monotonic()
+
+    def tearDown(self):
+        ephemeris.clear()
+
+    def test_json_array(self):
+        with patch('iss_tracker.STREAM_BATCH_ROWS', 1):
+            response = self.app.get('/epochs?offset=1')
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(response.get_json(), [ephemeris.snapshot.stateVector(index) for index in range(1, 4)])
+            self.assertEqual(self.app.get('/epochs?start=2024-049T12:06:00.000Z&fields=X').get_json(), 
+                             [ephemeris.snapshot.stateVector(index, ('X',)) for index in range(2, 4)])
+        self.assertEqual(self.app.get('/epochs?limit=0').get_json(), [])
+        self.assertEqual(self.app.get('/epochs?limit=-1').get_json(), [{}])
+        self.assertEqual(self.app.get('/epochs?start=2030-001T00:00:00.000Z').get_json(), [])
+
+    def test_ndjson(self):
+        with patch('iss_tracker.STREAM_BATCH_ROWS', 3):
+            response = self.app.get('/epochs', headers={'Accept': 'application/x-ndjson'})
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            lines = response.get_data(as_text=True).split('\n')
+        self.assertEqual(lines[-1], '')
+        self.assertEqual([json.loads(line) for line in lines[:-1]], [ephemeris.snapshot.stateVector(index) for index in range(4)])
+        self.assertEqual(self.app.get('/epochs?format=ndjson&limit=0').get_data(), b'')
+        self.assertEqual(self.app.get('/epochs?format=ndjson&limit=2&offset=3').get_data(as_text=True), 
+                         json.dumps(ephemeris.snapshot.stateVector(3), separators=(',', ':')) + '\n')
+
+
+class TestWireFormats(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+        ephemeris.snapshot = parseEphemeris(OEM_XML)
+        ephemeris.fetched_at = time.monotonic()
+
+    def tearDown(self):
+        ephemeris.clear()
+
+    def test_csv(self):
+        response = self.app.get('/epochs?format=csv&start=2024-049T12:04:00.000Z')
+        self.assertEqual(response.mimetype, 'text/csv')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], 'EPOCH,X,Y,Z,X_DOT,Y_DOT,Z_DOT')
+        # The numbers are the text NASA published
+        self.assertEqual(lines[1], '2024-049T12:04:00.000Z,-3706.7447298429998,-5051.8347165812002,3302.2071634003002,5.0,-3.0,4.5')
+        self.assertEqual(len(lines), 4)
+
+    def test_npy(self):
+        response = self.app.get('/epochs?fields=X,Z_DOT&limit=2&offset=1', headers={'Accept': 'application/x-npy'})
+        self.assertEqual(response.mimetype, 'application/x-npy')
+        table = np.load(io.BytesIO(response.get_data()))
+        self.assertEqual(table.dtype.names, ('EPOCH', 'X', 'Z_DOT'))
+        self.assertEqual(str(table['EPOCH'][0]), '2024-02-18T12:04:00.000')
+        np.testing.assert_array_equal(table['X'], ephemeris.snapshot.positions[1:3, 0])
+        np.testing.assert_array_equal(table['Z_DOT'], [4.5, 3.5])
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        response = self.app.get('/epochs', headers={'Accept': 'application/x-msgpack'})
+        table = msgpack.unpackb(response.get_data())
+        self.assertEqual(table['EPOCH'], [epoch.decode() for epoch in ephemeris.snapshot.epochs])
+        self.assertEqual(table['X_DOT'], [4.0, 5.0, 5.5, 5.8])
+        self.assertEqual(table['units']['X'], 'km')
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow(self):
+        response = self.app.get('/epochs?format=arrow')
+        self.assertEqual(response.mimetype, 'application/vnd.apache.arrow.stream')
+        table = pyarrow.ipc.open_stream(response.get_data()).read_all()
+        self.assertEqual(table.column_names, ['EPOCH'] + list(STATE_FIELDS))
+        np.testing.assert_array_equal(table.column('Y').to_numpy(), ephemeris.snapshot.positions[:, 1])
+        self.assertEqual(table.column('EPOCH')[0].value, int(ephemeris.snapshot.times[0] * 1000))
+        self.assertEqual(json.loads(table.schema.metadata[b'units'])['Z_DOT'], 'km/s')
+
+    def test_negotiation(self):
+        self.assertEqual(self.app.get('/epochs', headers={'Accept': '*/*'}).mimetype, 'application/json')
+        self.assertEqual(self.app.get('/epochs', headers={'Accept': 'text/csv;q=0.5, application/json;q=0.9'}).mimetype, 'application/json')
+        self.assertEqual(self.app.get('/epochs?format=xml').get_data(as_text=True), 'Error: Format must be one of json, csv, npy, msgpack, arrow, ndjson \n')
+        self.assertEqual(self.app.get('/groundtrack?format=ndjson').get_data(as_text=True), 'Error: Format must be one of json, csv, npy, msgpack, arrow \n')
+        with patch('iss_tracker.msgpack', None):
+            response = self.app.get('/epochs?format=msgpack')
+        self.assertEqual(response.status_code, 406)
+        self.assertEqual(response.get_data(as_text=True), 'Error: The msgpack format requires the msgpack package \n')
+
+    def test_groundtrack(self):
+        response = self.app.get('/groundtrack?format=csv&step=60&end=2024-049T12:02:00.000Z')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], 'Epoch Time,Altitude [km],Latitude [degrees],Longitude [degrees]')
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['2024-049T12:00:00.000Z', '2024-049T12:01:00.000Z', '2024-049T12:02:00.000Z'])
+        table = np.load(io.BytesIO(self.app.get('/groundtrack?format=npy').get_data()))
+        np.testing.assert_array_equal(table['Latitude [degrees]'], ephemeris.snapshot.latitudes)
+
+class TestBatchRoutes(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+        ephemeris.snapshot = parseEphemeris(OEM_XML)
+        ephemeris.fetched_at = time.monotonic()
+        self.geocoder = MagicMock(land_coverage=True)
+        self.geocoder.reverse.return_value = {'city': 'Houston', 'state': 'Texas', 'country': 'United States', 'country_code': 'us'}
+
+    def tearDown(self):
+        ephemeris.clear()
+
+    def test_calculateSpeeds(self):
+        speeds = calculateSpeeds(np.array([[3.0, 4.0, 0.0], [4.0, -2.5, 5.5]]))
+        self.assertEqual(speeds[0], 5.0)
+        self.assertAlmostEqual(speeds[1], calculateSpeed(4.0, -2.5, 5.5))
+
+    def test_speed_batch(self):
+        epochs = ['2024-049T12:04:00.000Z', '2024-049T12:00:00.000Z', '2024-049T13:00:00.000Z']
+        data = self.app.post('/epochs/batch/speed', json={'epochs': epochs}).get_json()
+        for epoch, entry in zip(epochs[:2], data):
+            expected = self.app.get(f'/epochs/{epoch}/speed').get_json()
+            self.assertEqual(entry, dict(expected, EPOCH=epoch))
+        self.assertEqual(data[2], {'EPOCH': '2024-049T13:00:00.000Z', 'Error': 'Epoch not available'})
+
+    def test_location_batch(self):
+        with patch('iss_tracker.geocoder', self.geocoder):
+            data = self.app.post('/epochs/batch/location', json={'start': '2024-049T12:04:00.000Z', 'geoposition': True}).get_json()
+            single = self.app.get('/epochs/2024-049T12:04:00.000Z/location').get_json()
+        self.assertEqual([entry['Epoch Time'] for entry in data], ['2024-049T12:04:00.000Z', '2024-049T12:08:00.000Z', '2024-049T12:12:00.000Z'])
+        for key in ('Altitude [km]', 'Latitude [degrees]', 'Longitude [degrees]', 'Geoposition'):
+            self.assertEqual(data[0][key], single[key])
+
+        # Without "geoposition" nothing is reverse geocoded
+        with patch('iss_tracker.geocoder', self.geocoder):
+            self.geocoder.reverse.reset_mock()
+            data = self.app.post('/epochs/batch/location', json={'epochs': ['2024-049T12:04:00.000Z']}).get_json()
+            self.geocoder.reverse.assert_not_called()
+        self.assertNotIn('Geoposition', data[0])
+        self.assertEqual(data[0]['Altitude [km]'], single['Altitude [km]'])
+
+    def test_epochs_batch(self):
+        data = self.app.post('/epochs/batch', json={'start': '2024-049T12:00:00.000Z', 'end': '2024-049T12:05:00.000Z'}).get_json()
+        self.assertEqual([entry['EPOCH'] for entry in data], ['2024-049T12:00:00.000Z', '2024-049T12:04:00.000Z'])
+        snapshot = ephemeris.snapshot
+        self.assertEqual(data[1]['Instantaneous Speed [km/s]'], round(calculateSpeed(5.0, -3.0, 4.5), 3))
+        self.assertEqual(data[1]['Latitude [degrees]'], round(float(snapshot.latitudes[1]), 3))
+        self.assertNotIn('Geoposition', data[1])
+
+    def test_invalid_body(self):
+        self.assertTrue(self.app.post('/epochs/batch', data='not json').get_data(as_text=True).startswith('Error: The body must be'))
+        self.assertEqual(self.app.post('/epochs/batch/speed', json={'epochs': [1, 2]}).get_data(as_text=True), 'Error: "epochs" must be a list of epoch strings \n')
+        self.assertEqual(self.app.post('/epochs/batch', json={'start': 'soon'}).get_data(as_text=True), 'Error: "start" and "end" must be valid times \n')
+        for flag in ('false', 1, None):
+            self.assertEqual(self.app.post('/epochs/batch', json={'epochs': [], 'geoposition': flag}).get_data(as_text=True), 
+                             'Error: "geoposition" must be true or false \n')
+
+    def test_archived_epochs(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        history = EphemerisArchive(directory.name)
+        history.add(parseEphemeris(orbitXML(30)))
+        ephemeris.snapshot = parseEphemeris(orbitXML(10))
+        epochs = [formatEpoch(ORBIT_START + row*240) for row in (25, 3, 12, 40, 29)] + ['not an epoch']
+        with patch('iss_tracker.archive', history), patch.object(history, 'query', wraps=history.query) as query:
+            data = self.app.post('/epochs/batch/speed', json={'epochs': epochs}).get_json()
+        # The rolled-off epochs are read from the archive at once
+        query.assert_called_once_with(ORBIT_START + 12*240, ORBIT_START + 40*240)
+        self.assertEqual([entry['EPOCH'] for entry in data], epochs)
+        self.assertEqual([('Error' in entry) for entry in data], [False, False, False, True, False, True])
+
+class TestInterpolation(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+        ephemeris.snapshot = parseEphemeris(orbitXML(30))
+        ephemeris.fetched_at = time.monotonic()
+
+    def tearDown(self):
+        ephemeris.clear()
+
+    def test_hermite_accuracy(self):
+        offsets = np.arange(0, 29*240, 7.5)
+        positions, velocities = interpolateStateVectors(ephemeris.snapshot, ORBIT_START + offsets)
+        expected = np.array([orbitState(offset) for offset in offsets])
+        # Between 4 minute samples the cubic stays within a few hundred meters of the true orbit
+        self.assertLess(np.max(np.linalg.norm(positions - expected[:, :3], axis=1)), 0.2)
+        self.assertLess(np.max(np.linalg.norm(velocities - expected[:, 3:], axis=1)), 0.005)
+        # Samples themselves are reproduced exactly
+        positions, _ = interpolateStateVectors(ephemeris.snapshot, ephemeris.snapshot.times)
+        np.testing.assert_allclose(positions, ephemeris.snapshot.positions, atol=1e-9)
+
+    def test_outside_window(self):
+        with self.assertRaises(ValueError):
+            interpolateStateVectors(ephemeris.snapshot, ORBIT_START - 1)
+
+    def test_position_route(self):
+        response = self.app.get('/position?at=2024-049T12:02:00.000Z')
+        data = response.get_json()
+        self.assertEqual(data['EPOCH'], '2024-049T12:02:00.000Z')
+        self.assertAlmostEqual(data['X']['#text'], orbitState(120)[0], delta=0.2)
+        self.assertEqual(data['X_DOT']['@units'], 'km/s')
+
+        response = self.app.get('/position?at=2024-049T12:02:00.000Z&at=2024-049T12:03:00.000Z')
+        self.assertEqual(len(response.get_json()), 2)
+
+        response = self.app.get('/position?at=2023-001T00:00:00.000Z')
+        self.assertEqual(response.get_data(as_text=True), "Error: Time outside of the ephemeris window \n")
+
+    def test_groundtrack_route(self):
+        snapshot = ephemeris.snapshot
+        response = self.app.get('/groundtrack')
+        data = response.get_json()
+        self.assertEqual(len(data['Epoch Time']), len(snapshot))
+        altitude, latitude, longitude = calculateLocations(snapshot.positions, snapshot.times)
+        self.assertEqual(data['Latitude [degrees]'], np.round(latitude, 3).tolist())
+
+        response = self.app.get('/groundtrack?start=2024-049T12:00:00.000Z&end=2024-049T12:10:00.000Z&step=60')
+        data = response.get_json()
+        self.assertEqual(len(data['Altitude [km]']), 11)
+        self.assertEqual(data['Epoch Time'][1], '2024-049T12:01:00.000Z')
+        for altitude in data['Altitude [km]']:
+            # A circular orbit sits higher above the ellipsoid near the poles than at the equator
+            self.assertTrue(ORBIT_RADIUS - WGS84_A - 0.2 < altitude < ORBIT_RADIUS - WGS84_A*(1 - WGS84_F) + 0.2)
+
+        for step in ('-5', 'inf', 'nan', '0'):
+            response = self.app.get(f'/groundtrack?step={step}')
+            self.assertEqual(response.get_data(as_text=True), "Error: step must be a number of seconds \n")
+        response = self.app.get('/groundtrack?step=1e-300')
+        self.assertEqual(response.get_data(as_text=True), f"Error: A ground track is limited to {GROUNDTRACK_MAX_POINTS} points \n")
+
+        # Every epoch of the range counts against the limit too
+        with patch('iss_tracker.GROUNDTRACK_MAX_POINTS', len(snapshot) - 1):
+            self.assertEqual(self.app.get('/groundtrack').get_data(as_text=True), f"Error: A ground track is limited to {len(snapshot) - 1} points \n")
+            self.assertEqual(len(self.app.get(f'/groundtrack?end={snapshot.epochs[-2].decode()}').get_json()['Epoch Time']), len(snapshot) - 1)
+
+# Two made up provinces of a made up country, the second with a lake cut out of it
+GEOJSON = {"type": "FeatureCollection", "features": [
+    {"type": "Feature", "properties": {"name": "West", "admin": "Testland", "iso_a2": "TL"}, 
+     "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]]}}, 
+    {"type": "Feature", "properties": {"name": "East", "admin": "Testland", "iso_a2": "TL"}, 
+     "geometry": {"type": "MultiPolygon", "coordinates": [[[[10, 0], [20, 0], [20, 10], [10, 10], [10, 0]], [[14, 4], [16, 4], [16, 6], [14, 6], [14, 4]]]]}}, 
+]}
+
+class TestLocalGeocoder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'regions.geojson')
+        with open(path, 'w') as f:
+            json.dump(GEOJSON, f)
+        self.geocoder = LocalGeocoder(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_reverse(self):
+        self.assertEqual(self.geocoder.reverse(5, 5), {'city': '', 'state': 'West', 'country': 'Testland', 'country_code': 'tl'})
+        self.assertEqual(self.geocoder.reverse(5.0, 12.5)['state'], 'East')
+        # Holes and points outside every polygon are not land
+        self.assertIsNone(self.geocoder.reverse(5, 15))
+        self.assertIsNone(self.geocoder.reverse(-30, -30))
+        self.assertTrue(self.geocoder.land_coverage)
+
+    def test_describe_location(self):
+        with patch('iss_tracker.geocoder', self.geocoder):
+            location = describeLocation(420.0, 5.0, 5.0, '2024-049T12:00:00.000Z')
+            self.assertEqual(location['Geoposition'], {"City": "", "State": "West", "Country": "Testland", "Country Code": "tl"})
+            location = describeLocation(420.0, 30.0, -40.0, '2024-049T12:00:00.000Z')
+            self.assertEqual(location['Geoposition'], {"Body of Water": "North Atlantic Ocean"})
+
+    def test_no_data(self):
+        with patch('iss_tracker.geocoder', LocalGeocoder(None)):
+            location = describeLocation(420.0, 30.0, -40.0, '2024-049T12:00:00.000Z')
+            self.assertEqual(location['Geoposition'], "No Location Data for the ISS at the moment")
+
+class TestGeocodeCache(unittest.TestCase):
+    def setUp(self):
+        self.backend = MagicMock()
+        self.backend.reverse.side_effect = lambda latitude, longitude: None if longitude < 0 else {'country': 'Testland'}
+
+    def test_buckets_and_counters(self):
+        cache = GeocodeCache(self.backend, precision=5, size=10, ttl=60)
+        self.assertEqual(cache.reverse(30.0001, 10.0001), {'country': 'Testland'})
+        # A nearby position in the same ~5 km cell is answered from the cache
+        self.assertEqual(cache.reverse(30.0002, 10.0002), {'country': 'Testland'})
+        # Water (None) is cached as well
+        self.assertIsNone(cache.reverse(30.0, -40.0))
+        self.assertIsNone(cache.reverse(30.0, -40.0))
+        self.assertEqual(self.backend.reverse.call_count, 2)
+        self.assertEqual(cache.stats(), {"size": 2, "hits": 2, "misses": 2, "hit ratio": 0.5})
+
+    def test_lru_eviction_and_ttl(self):
+        cache = GeocodeCache(self.backend, precision=5, size=2, ttl=60)
+        cache.reverse(0.0, 0.0)
+        cache.reverse(10.0, 10.0)
+        cache.reverse(0.0, 0.0)
+        cache.reverse(20.0, 20.0)  # evicts (10, 10), the least recently used cell
+        cache.reverse(10.0, 10.0)
+        self.assertEqual(self.backend.reverse.call_count, 4)
+
+        cache.ttl = 0
+        cache.reverse(10.0, 10.0)
+        self.assertEqual(self.backend.reverse.call_count, 5)
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'geocode.json')
+            cache = GeocodeCache(self.backend, precision=5, size=10, ttl=60, path=path)
+            cache.reverse(30.0, 10.0)
+            cache.save()
+
+            restarted = GeocodeCache(self.backend, precision=5, size=10, ttl=60, path=path)
+            self.assertEqual(restarted.reverse(30.0, 10.0), {'country': 'Testland'})
+            self.assertEqual(self.backend.reverse.call_count, 1)
+            atexit.unregister(cache.save)
+            atexit.unregister(restarted.save)
+
+    def test_processes_share_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'geocode.json')
+            context = multiprocessing.get_context('fork')
+            workers = [context.Process(target=geocodeCells, args=(path, worker)) for worker in range(4)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            self.assertEqual([worker.exitcode for worker in workers], [0] * 4)
+
+            # Every process kept the cells the others saved, and no staging file was left behind
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(len(json.load(f)), 4 * 50)
+            self.assertEqual(sorted(os.listdir(directory)), ['geocode.json', 'geocode.json.lock'])
+
+class TestUpstreamLimits(unittest.TestCase):
+    def test_single_flight(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        calls = []
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return 42
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.do('key', slow, timeout=5))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [(42, False)]*9 + [(42, True)])
+        # Once finished, the next call runs again
+        self.assertEqual(flights.do('key', lambda: 7), (7, True))
+
+    def test_single_flight_error(self):
+        flights = SingleFlight()
+        with self.assertRaises(ValueError):
+            flights.do('key', lambda: int('x'))
+        self.assertEqual(flights.do('key', lambda: 1), (1, True))
+
+    def test_geocode_misses_coalesced(self):
+        release = threading.Event()
+        backend = MagicMock()
+        backend.reverse.side_effect = lambda latitude, longitude: release.wait(5) and {'country': 'Testland'}
+        cache = GeocodeCache(backend, precision=5, size=10, ttl=60)
+
+        threads = [threading.Thread(target=cache.reverse, args=(30.0001, 10.0001)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        backend.reverse.assert_called_once()
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (7, 1))
+
+    def test_geocoder_busy(self):
+        backend = NominatimGeocoder(concurrency=1, timeout=0.01)
+        backend._slots.acquire()
+        try:
+            with self.assertRaises(GeocoderTimedOut):
+                backend.reverse(30.0, 10.0)
+        finally:
+            backend._slots.release()
+
+    def test_geocoder_failure(self):
+        failing = MagicMock(land_coverage=True)
+        failing.reverse.side_effect = GeocoderTimedOut("slow")
+        with patch('iss_tracker.geocoder', failing):
+            location = describeLocation(400.0, 30.0, -40.0, '2024-049T12:00:00.000Z')
+        self.assertEqual(location['Geoposition'], "No Location Data for the ISS at the moment")
+
+    @patch('requests.get')
+    def test_stale_while_revalidating(self, mock_requests_get):
+        mock_requests_get.return_value = MagicMock(status_code=304)
+        cache = EphemerisCache('http://oem', 0)
+        cache.snapshot = parseEphemeris(OEM_XML)
+
+        # While another request holds the lock to revalidate, the expired snapshot is served at once
+        with cache._lock:
+            self.assertIs(cache.get(), cache.snapshot)
+        mock_requests_get.assert_not_called()
+
+        cache.get()
+        self.assertEqual(mock_requests_get.call_args.kwargs['timeout'], (CONNECT_TIMEOUT, READ_TIMEOUT))
+
+def test_geohash():
+    """Function checks the geohash encoder against a well known value"""
+    assert(geohash(57.64911, 10.40744, 11) == 'u4pruydqqvj')
+
+def test_bodyOfWater():
+    """Function checks seas are named before the oceans containing them"""
+    assert(bodyOfWater(25.0, -90.0) == "Gulf of Mexico")
+    assert(bodyOfWater(-20.0, 80.0) == "Indian Ocean")
+    assert(bodyOfWater(10.0, -150.0) == "North Pacific Ocean")
+    assert(bodyOfWater(-70.0, 0.0) == "Southern Ocean")
+
+def test_parseEpoch():
+    """Function checks epoch strings convert to Unix seconds and back"""
+    timestamp = parseEpoch('2024-049T12:00:00.000Z')
+    assert(timestamp == datetime(2024, 2, 18, 12, tzinfo=timezone.utc).timestamp())
+    assert(formatEpoch(timestamp + 0.25) == '2024-049T12:00:00.250Z')
+
 def test_getNowEpoch():
     """Function ensures it's extracting the epoch closest to current time"""
     latest_epoch = getNowEpoch(data)
@@ -147,36 +1409,50 @@ def test_calculateSpeed_2():
     assert(speed == (math.sqrt(65)))
 
 def test_calculateLocation_latitude():
-    """Function tests latitude eqution"""
-    location = calculateLocation(float(data[-1]['X']['#text']), float(data[-1]['Y']['#text']), float(data[-1]['Z']['#text']), data[-1]['EPOCH'])
-    lat = location['Latitude [degrees]']
-    expected_latitude = math.degrees(math.atan2(float(data[-1]['Z']['#text']), math.sqrt(float(data[-1]['X']['#text'])*float(data[-1]['X']['#text']) + float(data[-1]['Y']['#text'])*float(data[-1]['Y']['#text'])))) 
-    assert(lat == round(expected_latitude,3))
+    """Function tests geodetic latitude on the WGS-84 ellipsoid"""
+    # At the J2000 epoch there is no precession, so the J2000 axes only differ from Earth-fixed by GMST
+    altitude, latitude, longitude = calculateLocations(np.array([[0.0, 0.0, 6356.752314245 + 400.0], [6378.137 + 400.0, 0.0, 0.0]]), np.array([J2000_EPOCH, J2000_EPOCH]))
+    assert(round(float(latitude[0]), 6) == 90.0)
+    assert(round(float(latitude[1]), 6) == 0.0)
+
+    # Geodetic latitude is further from the equator than geocentric latitude
+    x, y, z = (float(data[-1][axis]['#text']) for axis in 'XYZ')
+    altitude, latitude, longitude = calculateLocations(np.array([[x, y, z]]), np.array([parseEpoch(data[-1]['EPOCH'])]))
+    geocentric_latitude = math.degrees(math.atan2(z, math.sqrt(x*x + y*y)))
+    assert(geocentric_latitude < float(latitude[0]) < geocentric_latitude + 0.2)
 
 def test_calculateLocation_longitude():
-    """Function tests longitude equation"""
-    dt_object = datetime.strptime(data[-1]['EPOCH'], '%Y-%jT%H:%M:%S.%fZ')
+    """Function tests longitude follows Greenwich sidereal time"""
+    altitude, latitude, longitude = calculateLocations(np.array([[7000.0, 0.0, 0.0]]), np.array([J2000_EPOCH]))
+    expected_longitude = ((0 - 280.46061837) + 180) % 360 - 180
+    assert(round(float(longitude[0]), 6) == round(expected_longitude, 6))
 
-    hours = dt_object.hour
-    minutes = dt_object.minute
+    # One sidereal day later the Earth has turned once, so the longitude repeats
+    altitude, latitude, longitude = calculateLocations(np.array([[7000.0, 0.0, 0.0]]), np.array([J2000_EPOCH + 86164.0905]))
+    assert(abs(float(longitude[0]) - expected_longitude) < 0.01)
 
-    location = calculateLocation(float(data[-1]['X']['#text']), float(data[-1]['Y']['#text']), float(data[-1]['Z']['#text']), data[-1]['EPOCH'])
-    longitude = location['Longitude [degrees]']
-    
-    expected_longitude = math.degrees(math.atan2(float(data[-1]['Y']['#text']), float(data[-1]['X']['#text']))) - ((hours - 12) + (minutes/60))*(360/24) + 19
-    if expected_longitude > 180: 
-        expected_longitude = -180 + (expected_longitude- 180)
-    if expected_longitude < -180: 
-        expected_longitude = 180 + (expected_longitude + 180)
+def test_calculateLocation_altitude():
+    """Function tests altitude above the WGS-84 ellipsoid"""
+    altitude, latitude, longitude = calculateLocations(np.array([[0.0, 0.0, 6356.752314245 + 400.0], [6378.137 + 400.0, 0.0, 0.0]]), np.array([J2000_EPOCH, J2000_EPOCH]))
+    assert(round(float(altitude[0]), 6) == 400.0)
+    assert(round(float(altitude[1]), 6) == 400.0)
 
-    assert(longitude == round(expected_longitude,3))
+def test_precession():
+    """Function checks the J2000 pole drifts by the expected precession angle over 24 years"""
+    matrix = precessionMatrices(np.array([parseEpoch('2024-001T12:00:00.000Z')]))[0]
+    np.testing.assert_allclose(matrix @ matrix.T, np.eye(3), atol=1e-12)
+    pole_angle = math.degrees(math.acos(matrix[2, 2]))
+    assert(abs(pole_angle - 2004.31 * 0.24 / 3600) < 1e-4)
 
-def test_calculateLocation_altitude():
-    """Function tests altitude equation"""
-    location = calculateLocation(float(data[-1]['X']['#text']), float(data[-1]['Y']['#text']), float(data[-1]['Z']['#text']), data[-1]['EPOCH'])
-    altitude = location['Altitude [km]']
-    expected_altitude = math.sqrt(float(data[-1]['X']['#text'])*float(data[-1]['X']['#text']) + float(data[-1]['Y']['#text'])*float(data[-1]['Y']['#text']) + float(data[-1]['Z']['#text'])*float(data[-1]['Z']['#text'])) - 6371.0 
-    assert(altitude == round(expected_altitude ,3)) 
+def test_productionOptions():
+    """Function checks the production server preloads the app and starts a refresher in every worker"""
+    options = productionOptions()
+    assert(options['preload_app'] is True)
+    assert(options['workers'] == WORKERS and options['threads'] == THREADS)
+    assert(options['bind'] == f'0.0.0.0:{PORT}')
+    with patch.object(ephemeris, 'start') as mock_start:
+        options['post_fork'](MagicMock(), MagicMock())
+        mock_start.assert_called_once()
 
 class TestEpochRoute(unittest.TestCase):
     def setUp(self):